@@ -0,0 +1,45 @@
+# gunicorn settings for the dashboard (read from the working directory)
+
+import gc
+import importlib
+
+# import the app, its memory-mapped data and the derived rate cube once in
+# the master; the forked workers share these pages through copy-on-write,
+# along with the views a synchronous warm-up (OBESITY_WARM_UP) renders into
+# the result cache, so new workers start warm
+preload_app = True
+
+# each worker serves several requests at once on threads, which the sharing of
+# a chart between the requests computing it (OBESITY_FLIGHT_TIMEOUT) and the
+# skipping of stale requests (OBESITY_STALE_REQUESTS) rely on; the thread
+# count can be overridden with GUNICORN_CMD_ARGS="--threads N"
+worker_class = "gthread"
+threads = 4
+
+
+def dashboard(app):
+    """Return the Module of the Dashboard App, Imported Once When Preloaded"""
+    return importlib.import_module(app.app_uri.rsplit(":", 1)[0])
+
+
+def when_ready(server):
+    """Warm the Preloaded App Up and Freeze it Before the Workers are Forked
+
+    The master reports ready once the synchronous warm-up is done, so that no
+    worker takes traffic cold. Moving everything loaded so far out of the
+    garbage collector's reach keeps collections in the workers from writing to
+    (and so copying) shared pages.
+    """
+    if server.cfg.preload_app:
+        module = dashboard(server.app)
+        if module.config.warm_up == "sync":
+            module.start_warm_up("sync")
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    """Warm a Worker Up Before it Accepts Requests, or in a Background Thread"""
+    module = dashboard(worker.app)
+    if module.config.warm_up == "background" or not worker.cfg.preload_app:
+        module.start_warm_up()
@@ -1,34 +1,172 @@
 # Load modules
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
 import dash
 import dash_html_components as html
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import altair as alt
+import flask
 import numpy as np
 import pandas as pd
 import helper as he
-from vega_datasets import data
+import config
+import datasets
+import compression
+import geo
+import inflight
+import metrics
+import serialize
+import templates
+import cache
+from cache import LRUCache, freeze, memoize
+
+# disable Altair limits; the data of the charts is only encoded for the pages
+# within serialize.rendering, see chart_data
+alt.data_transformers.enable("rendering")
+
+# serve chart data from the dataset endpoint instead of inlining it
+chart_data = (
+    datasets.to_dataset_url if config.data_mode == "url" else serialize.to_inline_json
+)
 
-# disable Altair limits
-alt.data_transformers.disable_max_rows()
+# obesity data, shared with the helper module
+ob = he.ob
+
+# bundled world geometry, with the obesity country names joined in, and the
+# position of each feature's country among the obesity countries
+geo_variants, geo_index = geo.make_variants(ob)
+geojson = alt.Data(
+    url="/geo/{}.json?v={}".format(
+        config.map_detail, geo_variants[config.map_detail][1]
+    ),
+    format=alt.DataFormat(type="json", property="features"),
+)
 
-# read-in obesity data
-file = "data/processed/obesity-combo.csv"
-ob = pd.read_csv(file)
-ob = ob[ob["region"] != "Aggregates"]
 
+def result_nbytes(result):
+    """Estimate the Memory Held by a Data Frame, an Altair Chart, an Html Page
+    or the Parts of a Delta Response"""
+    if isinstance(result, str):
+        return len(result)
+    if isinstance(result, tuple):
+        return sum(result_nbytes(part) for part in result)
+    if isinstance(result, dict):
+        return sum(len(k) + result_nbytes(v) for k, v in result.items())
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=True, deep=True).sum())
+    nbytes = 4096
+    if isinstance(result.data, pd.DataFrame):
+        nbytes += result_nbytes(result.data)
+    for sub in getattr(result, "layer", []):
+        nbytes += result_nbytes(sub)
+    return nbytes
+
+
+# cache of the individual charts and their data, keyed on their normalized
+# arguments
+chart_cache = LRUCache(
+    int(config.cache_mb * 2**20),
+    sizeof=result_nbytes,
+    flight_timeout=config.flight_timeout,
+)
 
-# read-in the countries taxonomy
-cy_ids = pd.read_csv("data/country-ids.csv").rename(columns={"world_bank": "country"})
+# the callback requests in flight of each page, see skip_superseded
+in_flight = inflight.RequestTracker()
 
-# load the geojson data
-geojson = alt.topo_feature(data.world_110m.url, "countries")
+# True until the module has loaded, see panel_pool
+loading = True
 
-# Instantiate the app
-app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Instantiate the app, compressing its responses in the negotiated encoding
+app = dash.Dash(external_stylesheets=[dbc.themes.BOOTSTRAP], compress=False)
 
 server = app.server
+compression.install(server)
+
+
+@server.route(config.dataset_url + "<name>.json")
+def serve_dataset(name):
+    """Serve a Chart Dataset With Long-Lived Caching and an ETag"""
+    body = datasets.get_dataset(name) if re.fullmatch(r"data-[0-9a-f]+", name) else None
+    if body is None:
+        flask.abort(404)
+    return compression.immutable_response(body, name, "application/json")
+
+
+@server.route("/metrics")
+def serve_metrics():
+    """Serve the Callback Timings and Cache Statistics of This Worker for Prometheus"""
+    body = metrics.render(
+        metrics.counter(
+            "obesity_chart_cache_hits", "Chart cache hits.", chart_cache.hits
+        ),
+        metrics.counter(
+            "obesity_chart_cache_misses", "Chart cache misses.", chart_cache.misses
+        ),
+        metrics.gauge(
+            "obesity_chart_cache_bytes", "Chart cache size.", chart_cache.nbytes
+        ),
+        metrics.counter(
+            "obesity_chart_cache_shared",
+            "Chart cache misses served by a concurrent computation.",
+            chart_cache.flights.shared,
+        ),
+        metrics.counter(
+            "obesity_chart_cache_flight_timeouts",
+            "Chart cache misses that stopped waiting for a concurrent computation.",
+            chart_cache.flights.timeouts,
+        ),
+        metrics.counter(
+            "obesity_superseded_requests",
+            "Callback requests dropped for a newer one of their page.",
+            in_flight.superseded,
+        ),
+    )
+    return flask.Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@server.route("/geo/<detail>.json")
+def serve_geometry(detail):
+    """Serve a World Geometry Variant With Long-Lived Caching and an ETag"""
+    if detail not in geo_variants:
+        flask.abort(404)
+    body, etag = geo_variants[detail]
+    return compression.immutable_response(body, etag, "application/json")
+
+
+@server.route("/vega/<name>")
+def serve_vega(name):
+    """Serve a Local Copy of a Vega Script of the Chart Pages, see config.vega_url"""
+    path = os.path.join(config.vega_dir, name + ".js")
+    script = re.fullmatch(r"vega(-lite|-embed)?@[0-9.]+", name)
+    if not script or not os.path.exists(path):
+        flask.abort(404)
+    with open(path, "rb") as f:
+        body = f.read()
+    return compression.immutable_response(body, name, "application/javascript")
+
+
+# page showing the combined chart in delta mode, see plot_delta
+shell_page = templates.shell_html().encode()
+shell_etag = hashlib.md5(shell_page).hexdigest()
+shell_url = "/chart-shell.html?v=" + shell_etag
+
+
+@server.route("/chart-shell.html")
+def serve_shell():
+    """Serve the Page Showing the Combined Chart in Delta Mode"""
+    return compression.immutable_response(shell_page, shell_etag, "text/html")
+
 
 # CSS Styles
 css_dd = {
@@ -39,7 +177,83 @@ css_sources = {
     "font-size": "xx-small",
 }
 
-app.layout = dbc.Container(
+
+def plot_frame(id, height, src=None):
+    """Return an Iframe Holding an Altair Chart"""
+    return html.Iframe(
+        id=id,
+        src=src,
+        srcDoc=None,
+        style={
+            "border-width": "0",
+            "width": "100%",
+            "height": height,
+        },
+    )
+
+
+if config.layout == "split":
+    plot_frames = [
+        plot_frame("time_plot", "420px"),
+        plot_frame("factor_plot", "260px"),
+        plot_frame("map_plot", "380px"),
+        plot_frame("bar_plot", "240px"),
+    ]
+else:
+    plot_frames = [plot_frame("combo_plot", "1250px")]
+
+# the charts filter the rate cube in the browser, see plot_client; the store
+# holds the last filter values sent to them
+client_filtering = (
+    config.filter_mode == "client"
+    and config.layout != "split"
+    and config.serve_mode == "compute"
+)
+if client_filtering:
+    plot_frames.append(dcc.Store(id="client_filters"))
+
+# the combined chart is drawn by a page the browser keeps, which is only sent
+# the datasets it does not hold, see plot_delta
+delta_responses = (
+    config.response_mode == "delta"
+    and config.layout != "split"
+    and config.serve_mode == "compute"
+    and not client_filtering
+)
+if delta_responses:
+    plot_frames = [
+        plot_frame("combo_plot", "1250px", src=shell_url),
+        dcc.Store(id="chart_delta"),
+        dcc.Store(id="chart_held", data=[]),
+        dcc.Store(id="chart_resync"),
+    ]
+
+# the map and bar plot can be played through the years, see play_years; the
+# frame is shown once played
+playback = config.playback == "on" and config.serve_mode == "compute"
+if playback:
+    playback_frame = plot_frame("playback_plot", "620px")
+    playback_style = playback_frame.style
+    playback_frame.style = dict(playback_style, display="none")
+    plot_frames.insert(0, playback_frame)
+    play_controls = [
+        dbc.Button(
+            "Play Years",
+            id="input_play",
+            n_clicks=0,
+            size="sm",
+            outline=True,
+            color="secondary",
+        )
+    ]
+else:
+    play_controls = []
+
+# the requests of a page that a newer one of the same callback superseded are
+# dropped, see skip_superseded
+skip_stale = config.stale_requests == "skip" and config.serve_mode == "compute"
+
+page = dbc.Container(
     [
         html.H1("Obesity Dashboard"),
         html.P(
@@ -81,6 +295,7 @@ app.layout = dbc.Container(
                             included=False,
                             marks={i: f"{str(i)}" for i in range(1975, 2017, 5)},
                         ),
+                        *play_controls,
                         html.Br(),
                         html.Label(
                             [
@@ -200,19 +415,7 @@ app.layout = dbc.Container(
                 ),
                 dbc.Col(
                     [
-                        dbc.Row(
-                            [
-                                html.Iframe(
-                                    id="combo_plot",
-                                    srcDoc=None,
-                                    style={
-                                        "border-width": "0",
-                                        "width": "100%",
-                                        "height": "1250px",
-                                    },
-                                ),
-                            ],
-                        )
+                        dbc.Row(plot_frames),
                     ]
                 ),
             ],
@@ -221,8 +424,117 @@ app.layout = dbc.Container(
     ]
 )
 
+
+def serve_layout():
+    """Function to return the layout, with an id of its own for each page load"""
+    return html.Div([page, dcc.Store(id="session_id", data=uuid.uuid4().hex)])
+
+
+app.layout = serve_layout if skip_stale else page
+
+# number of countries shown in the bar plot
+top_n = 10
+
+# labels of the regressors and groupers
+label_dict = {
+    "primedu": "Primary Education Completion Rate",
+    "smoke": "Smoking Rate",
+    "unemployed": "Unemployment Rate",
+    "income": "Income Group",
+    "sex": "Sex",
+    "region": "Region",
+}
+
+# options of the scatter plot dropdowns
+regressors = ["smoke", "primedu", "unemployed"]
+groupers = ["income", "sex", "region", "none"]
+
+
+def chart_title(text, sub_label):
+
+    """Function to create the title of a plot with its subtitle
+
+    Vega-Lite takes no expression as the subtitle, so a subtitle following a
+    param is drawn as the second line of the title instead.
+
+    Args:
+        text ([str]): title of the plot
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plot, or an expression
+                                          of it over the params
+
+    Returns:
+        [alt.TitleParams]: the title of the plot
+    """
+    if isinstance(sub_label, alt.ExprRef):
+        lines = "[{}, {}]".format(json.dumps(text), sub_label.expr)
+        return alt.TitleParams(text=alt.ExprRef(lines))
+    return alt.TitleParams(text=text, subtitle=sub_label)
+
+
+# Bar data
+@memoize(chart_cache)
+def bar_data(filters):
+
+    """Function to compute the obesity rates of the top 10 countries
+
+    Args:
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the bar plot
+
+    Returns:
+        [pd.DataFrame]: The countries with the highest obesity rates, in order
+    """
+    with metrics.stage_seconds.time(stage="rate_data", chart="bar"):
+        temp = he.make_rate_data(["country"], ["obese"], filters)
+        return (
+            temp.sort_values("obese", ascending=False)
+            .head(top_n)
+            .reset_index(drop=True)
+        )
+
+
+# Bar chart
+def bar_chart(ob_sorted, sub_label):
+
+    """Function to create the altair bar plot of the top 10 countries from its data
+
+    Args:
+        ob_sorted ([pd.DataFrame]): the data returned by bar_data
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plot, see chart_title
+
+    Returns:
+        [altair chart]: An altair bar plot of the top 10 countries
+    """
+
+    title_label = "Top " + str(top_n) + " Countries"
+
+    with metrics.stage_seconds.time(stage="chart", chart="bar"):
+        chart = (
+            alt.Chart(ob_sorted, title=chart_title(title_label, sub_label))
+            .mark_bar()
+            .encode(
+                x=alt.X(
+                    "obese",
+                    type="quantitative",
+                    title="Obesity Rate",
+                    scale=alt.Scale(domain=[0.1, 0.8]),
+                    axis=alt.Axis(format="%", grid=False),
+                ),
+                y=alt.Y("country:N", sort="-x", title=""),
+                color="obese:Q",
+                tooltip=alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
+            )
+            .properties(width=450, height=150)
+            .interactive()
+        )
+    return chart
+
+
 # Bar plot
-def plot_bar(query_string, year):
+@memoize(chart_cache)
+def plot_bar(filters, year):
     """Function to create an altair bar plot of the top 10 countries
 
     Function to create an altair chart of the top 10 countries
@@ -230,101 +542,221 @@ def plot_bar(query_string, year):
     user inputs received through the app dropdown filters.
 
     Args:
-        query_string ([str]): string containing the attributes to be used in a pandas query
-                               for filtering the data for the bar plot
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the bar plot
 
         year ([float]): year
 
     Returns:
         [altair chart]: An altair bar plot of the top 10 countries
     """
+    return bar_chart(bar_data(filters), str(year))
 
-    n = 10
 
-    title_label = "Top " + str(n) + " Countries"
-    sub_label = str(year)
+# Map data
+@memoize(chart_cache)
+def map_data(filters):
 
-    n = 10
-    temp = he.make_rate_data(["country"], ["obese"], query_string)
-    ob_sorted = temp.sort_values("obese", ascending=False).head(n).reset_index()
-    chart = (
-        alt.Chart(
-            ob_sorted, title=alt.TitleParams(text=title_label, subtitle=sub_label)
-        )
-        .mark_bar()
-        .encode(
-            x=alt.X(
-                "obese",
-                type="quantitative",
-                title="Obesity Rate",
-                scale=alt.Scale(domain=[0.1, 0.8]),
-                axis=alt.Axis(format="%", grid=False),
-            ),
-            y=alt.Y("country", sort="-x", title=""),
-            color="obese",
-            tooltip=alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
+    """Function to compute the obesity rate of each country on the map
+
+    Args:
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the map
+
+    Returns:
+        [pd.DataFrame]: The obesity rate ("obese") of each map feature ("id")
+                        for which it is known
+    """
+    # gather the country rates in feature order, keeping features with a rate
+    with metrics.stage_seconds.time(stage="rate_data", chart="map"):
+        rates = np.append(he.country_rates("obese", filters), np.nan)[geo_index]
+        ids = np.flatnonzero(~np.isnan(rates))
+        return pd.DataFrame({"id": ids, "obese": rates[ids]})
+
+
+# Map chart
+def map_chart(df, sub_label):
+
+    """Function to create the altair chloropleth world map plot from its data
+
+    Args:
+        df ([pd.DataFrame]): the data returned by map_data, or any data of the
+                             map features ("id") whose columns are looked up
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plot, see chart_title
+
+    Returns:
+        [altair chart]: An altair chloropleth world map plot showing the global obesity rates
+    """
+
+    title_label = "Obesity Rates"
+
+    with metrics.stage_seconds.time(stage="chart", chart="map"):
+        world = (
+            (
+                alt.Chart(geojson, title=chart_title(title_label, sub_label))
+                .mark_geoshape()
+                .transform_lookup(
+                    lookup="properties.id",
+                    from_=alt.LookupData(
+                        df, "id", [col for col in df.columns if col != "id"]
+                    ),
+                )
+                .encode(
+                    color=alt.Color(
+                        "obese:Q",
+                        scale=alt.Scale(scheme="viridis"),
+                        title="Obesity",
+                        legend=alt.Legend(format=".0%"),
+                    ),
+                    stroke=alt.value("black"),
+                    tooltip=[
+                        alt.Tooltip("properties.country:N", title="Country"),
+                        alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
+                    ],
+                )
+            )
+            .project("naturalEarth1")
+            .properties(width=450, height=300)
         )
-        .properties(width=450, height=150)
-        .interactive()
-    )
-    return chart
+    return world
 
 
 # Map plot
-def plot_map(query_string, year):
+@memoize(chart_cache)
+def plot_map(filters, year):
 
     """Fuction to create an altair chloropleth world map plot showing the global obesity rates
 
     Args:
-        query_string ([str]): string containing the attributes to be used in a pandas query
-                               for filtering the data for the bar plot
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the bar plot
 
         year ([float]): year
 
     Returns:
         [altair chart]: An altair chloropleth world map plot showing the global obesity rates
     """
+    return map_chart(map_data(filters), str(year))
 
-    title_label = "Obesity Rates"
-    sub_label = str(year)
 
-    df = (
-        he.make_rate_data(["country"], ["obese"], query_string)
-        .merge(cy_ids, "right", on="country")
-        .sort_values("obese", ascending=False)
-    )
-    world = (
-        (
-            alt.Chart(
-                geojson, title=alt.TitleParams(text=title_label, subtitle=sub_label)
-            )
-            .mark_geoshape()
-            .transform_lookup(
-                lookup="id",
-                from_=alt.LookupData(df, "id", ["country", "obese"]),
+# Time Series data
+@memoize(chart_cache)
+def time_data(filters):
+
+    """Function to compute the country-wise obesity rates of each year
+
+    The result is cached per filter set, so that changing the highlighted
+    countries reuses it.
+
+    Args:
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the time series plot
+
+    Returns:
+        [pd.DataFrame]: The obesity rate of each country and year
+    """
+    with metrics.stage_seconds.time(stage="rate_data", chart="time"):
+        return he.make_rate_data(["country", "year"], ["obese"], filters)
+
+
+# Time Series chart
+def time_chart(ob_yr, highlight_country, sub_label):
+
+    """Function to create the altair time series plot from its data
+
+    Args:
+        ob_yr ([pd.DataFrame]): the data returned by time_data
+
+        highlight_country ([list, ExprRef]): names of the countries to be highlighted,
+                                             or a vega expression of them
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plot, see chart_title
+
+    Returns:
+        [altair chart]: An altair time series plot showing the country-wise global obesity rates
+    """
+
+    # Create labels
+    title_label = "World Obesity"
+
+    # Highlighted countries are drawn from the same data, so it is only
+    # serialized once and unchanged when the highlight changes
+    if isinstance(highlight_country, alt.ExprRef):
+        is_highlighted = "indexof({}, datum.country) >= 0".format(
+            highlight_country.expr
+        )
+    else:
+        is_highlighted = alt.FieldOneOfPredicate(
+            field="country", oneOf=highlight_country
+        )
+
+    # Create chart
+    with metrics.stage_seconds.time(stage="chart", chart="time"):
+        country_time_chart = (
+            alt.Chart(ob_yr, title=chart_title(title_label, sub_label))
+            .mark_line()
+            .encode(
+                x=alt.X(
+                    "year:O",
+                    scale=alt.Scale(zero=False),
+                    title="Years",
+                    axis=alt.Axis(grid=False),
+                ),
+                y=alt.Y(
+                    "obese:Q",
+                    title="Obesity Rate",
+                    axis=alt.Axis(format="%"),
+                ),
+                color=alt.condition(
+                    alt.Predicate(is_highlighted),
+                    "country:N",
+                    alt.value("lightgray"),
+                    # legend=None,
+                ),
+                opacity=alt.condition(
+                    alt.Predicate(is_highlighted),
+                    alt.value(1),
+                    alt.value(0.2),
+                ),
+                tooltip="country:N",
             )
+            .properties(width=450, height=300)
+            .interactive()
+        )
+
+        highlighted_time_chart = (
+            alt.Chart(ob_yr)
+            .transform_filter(is_highlighted)
+            .transform_calculate(highlighted="datum.country")
+            .mark_line()
             .encode(
-                color=alt.Color(
+                x=alt.X(
+                    "year:O",
+                    scale=alt.Scale(zero=False),
+                    title="Years",
+                    axis=alt.Axis(grid=False),
+                ),
+                y=alt.Y(
                     "obese:Q",
-                    scale=alt.Scale(scheme="viridis"),
-                    title="Obesity",
-                    legend=alt.Legend(format=".0%"),
+                    title="Obesity Rate",
+                    axis=alt.Axis(format="%"),
                 ),
-                stroke=alt.value("black"),
-                tooltip=[
-                    alt.Tooltip("country:N", title="Country"),
-                    alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
-                ],
+                color=alt.Color(
+                    "highlighted:N",
+                    legend=alt.Legend(title="Countries", values=highlight_country),
+                ),
+                tooltip="country:N",
             )
         )
-        .project("naturalEarth1")
-        .properties(width=450, height=300)
-    )
-    return world
+
+        # return country_time_chart
+        return country_time_chart + highlighted_time_chart
 
 
 # Time Series plot
-def plot_time(query_string, highlight_country, year_range):
+@memoize(chart_cache)
+def plot_time(filters, highlight_country, year_range):
 
     """Function to create a time series plot showing the country-wise global obesity rates
 
@@ -332,8 +764,8 @@ def plot_time(query_string, highlight_country, year_range):
     for all the countries for a range of years as selected by the user
 
     Args:
-        query_string ([str]): string containing the attributes to be used in a pandas query
-                               for filtering the data for the bar plot
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the bar plot
 
         highlight_country ([str]): name of the country to be highlighted in the time series plot
 
@@ -342,208 +774,1604 @@ def plot_time(query_string, highlight_country, year_range):
     Returns:
         [altair chart]: An altair time series plot showing the country-wise global obesity rates
     """
+    sub_label = str(year_range[0]) + "-" + str(year_range[1])
+    highlight_country = he.highlight_selection(highlight_country)
+    return time_chart(time_data(filters), highlight_country, sub_label)
 
-    # Filter data
-    ob_yr = he.make_rate_data(["country", "year"], ["obese"], query_string)
 
-    # Create labels
-    title_label = "World Obesity"
-    sub_label = str(year_range[0]) + "-" + str(year_range[1])
+# Scatter data
+@memoize(chart_cache)
+def factor_data(grouper, filters):
 
-    # Format country
-    highlight_country = (
-        [highlight_country] if type(highlight_country) == str else highlight_country
-    )
+    """Function to compute the country-wise rates of obesity and the other factors
 
-    # Get data for highlighted countries
-    highlighted_data = ob_yr[ob_yr["country"].isin(highlight_country)]
-    highlighted_data.loc[:, "highlighted"] = [
-        country if country in highlight_country else "other"
-        for country in highlighted_data["country"]
-    ]
+    Args:
+        grouper ([str]): the attribute to be used for grouping the data in the scatter plot
 
-    # Create chart
-    country_time_chart = (
-        alt.Chart(ob_yr, title=alt.TitleParams(text=title_label, subtitle=sub_label))
-        .mark_line()
-        .encode(
-            x=alt.X(
-                "year:O",
-                scale=alt.Scale(zero=False),
-                title="Years",
-                axis=alt.Axis(grid=False),
-            ),
-            y=alt.Y(
-                "obese:Q",
-                title="Obesity Rate",
-                axis=alt.Axis(format="%"),
-            ),
-            color=alt.condition(
-                alt.Predicate(
-                    alt.FieldOneOfPredicate(field="country", oneOf=highlight_country)
-                ),
-                "country",
-                alt.value("lightgray"),
-                # legend=None,
-            ),
-            opacity=alt.condition(
-                alt.Predicate(
-                    alt.FieldOneOfPredicate(field="country", oneOf=highlight_country)
-                ),
-                alt.value(1),
-                alt.value(0.2),
-            ),
-            tooltip="country",
-        )
-        .properties(width=450, height=300)
-        .interactive()
-    )
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the scatter plot
 
-    highlighted_time_chart = (
-        alt.Chart(highlighted_data)
-        .mark_line()
-        .encode(
-            x=alt.X(
-                "year:O",
-                scale=alt.Scale(zero=False),
-                title="Years",
-                axis=alt.Axis(grid=False),
-            ),
-            y=alt.Y(
-                "obese:Q",
-                title="Obesity Rate",
-                axis=alt.Axis(format="%"),
-            ),
-            color=alt.Color(
-                "highlighted",
-                legend=alt.Legend(title="Countries", values=highlight_country),
-            ),
-            tooltip="country",
-        )
-    )
+    Returns:
+        [pd.DataFrame]: The rates of each country and group
+    """
+    with metrics.stage_seconds.time(stage="rate_data", chart="factor"):
+        return he.group_rates(grouper, filters)
 
-    # return country_time_chart
-    return country_time_chart + highlighted_time_chart
 
+def factor_fields(regressor, grouper):
+    """Function to list the columns of the scatter plot data used by its chart"""
+    return ["country", grouper, "obese", regressor]
 
-# Scatter plot
-def plot_factor(regressor, grouper, query_string):
 
-    """Function to create a scatter plot showing the association of obesity rate vs other factors
+# Trend line data
+@memoize(chart_cache)
+def factor_fits(grouper, filters):
 
-    Function to create a scatter plot showing the association of obesity rate
-    vs other factors and grouped by different aggregators as selected by the user
-    through the different dropdown filters.
+    """Function to fit the obesity rate on every regressor within each group of the scatter plot
+
+    Args:
+        grouper ([str]): the attribute to be used for grouping the data in the scatter plot
+
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the scatter plot
+
+    Returns:
+        [pd.DataFrame]: The fitted line of each group and regressor, see he.group_fits
+    """
+    temp = factor_data(grouper, filters)
+    with metrics.stage_seconds.time(stage="rate_data", chart="trend"):
+        return he.group_fits(temp, grouper, regressors)
+
+
+def trend_data(fits, regressor, grouper):
+    """Function to select the fitted lines of the scatter plot's regressor"""
+    return fits.loc[
+        fits["variable"] == regressor,
+        [grouper, "n", "r", "slope", "x1", "y1", "x2", "y2"],
+    ]
+
+
+# Scatter chart
+def factor_chart(temp, regressor, grouper):
+
+    """Function to create the altair scatter plot from its data
 
     Args:
+        temp ([pd.DataFrame, altair data]): the data returned by factor_data, or
+                                             data whose rates the chart computes
+
         regressor ([str]): the regressor to be used in the scatter plot
 
         grouper ([str]): the attribute to be used for grouping the data in the scatter plot
 
-        query_string ([str]): string containing the attributes to be used in a pandas query
-                               for filtering the data for the bar plot
-
     Returns:
         [altair chart]: An altair scatter plot showing the association of obesity rate vs other factors
     """
 
-    label_dict = {
-        "primedu": "Primary Education Completion Rate",
-        "smoke": "Smoking Rate",
-        "unemployed": "Unemployment Rate",
-        "income": "Income Group",
-        "sex": "Sex",
-        "region": "Region",
-    }
-
     title_label = "Obesity Rate vs " + label_dict[regressor]
     sub_label = "" if grouper == "none" else "by " + label_dict[grouper]
 
-    temp = he.make_rate_data(
-        ["country", grouper], ["primedu", "smoke", "unemployed", "obese"], query_string
-    )
-
-    chart = (
-        alt.Chart(temp, title=alt.TitleParams(text=title_label, subtitle=sub_label))
-        .mark_circle(opacity=0.25)
-        .encode(
-            x=alt.X(
-                regressor,
-                type="quantitative",
-                title=label_dict[regressor],
-                axis=alt.Axis(format="%", grid=False),
-            ),
-            y=alt.Y(
-                "obese", title="Obesity Rate", axis=alt.Axis(format="%", grid=False)
-            ),
-            color=alt.Color(grouper, type="nominal", title="Legend"),
-            tooltip=[
-                alt.Tooltip("country:N", title="Country"),
-                alt.Tooltip(grouper, title="Grouping Variable"),
-                alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
-            ],
+    with metrics.stage_seconds.time(stage="chart", chart="factor"):
+        if isinstance(temp, pd.DataFrame):
+            temp = temp[factor_fields(regressor, grouper)]
+        chart = (
+            alt.Chart(temp, title=alt.TitleParams(text=title_label, subtitle=sub_label))
+            .mark_circle(opacity=0.25)
+            .encode(
+                x=alt.X(
+                    regressor,
+                    type="quantitative",
+                    title=label_dict[regressor],
+                    axis=alt.Axis(format="%", grid=False),
+                ),
+                y=alt.Y(
+                    "obese:Q",
+                    title="Obesity Rate",
+                    axis=alt.Axis(format="%", grid=False),
+                ),
+                color=alt.Color(grouper, type="nominal", title="Legend"),
+                tooltip=[
+                    alt.Tooltip("country:N", title="Country"),
+                    alt.Tooltip(grouper, type="nominal", title="Grouping Variable"),
+                    alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
+                ],
+            )
+            .properties(width=450, height=150)
+            .interactive()
         )
-        .properties(width=450, height=150)
-        .interactive()
-    )
 
     factor_chart = chart
 
     return factor_chart
 
 
-@app.callback(
-    Output("combo_plot", "srcDoc"),
-    Input("input_year", "value"),
-    Input("input_year_range", "value"),
-    Input("input_sex", "value"),
-    Input("input_region", "value"),
-    Input("input_highlight_country", "value"),
-    Input("input_income", "value"),
-    Input("input_regressor", "value"),
-    Input("input_grouper", "value"),
-)
-def plot_all(
-    year, year_range, sex, region, highlight_country, income, regressor, grouper
-):
+# Trend lines
+def trend_chart(trend, regressor, grouper):
 
-    """Function to combine all the different plots generated for the dashboard
+    """Function to create the altair trend lines of the scatter plot groups
 
     Args:
-        year ([int]): year
-
-        year_range ([list]): range of years to be selected for the time series plot
-
-        sex ([list]): sex
-
-        region ([list]): region
-
-        highlight_country ([list]): name of the country to be highlighted in the time series plot
-
-        income ([list]): income atribute in the data
+        trend ([pd.DataFrame, altair data]): the fitted lines returned by trend_data,
+                                              or the data the chart fits itself
 
         regressor ([str]): the regressor to be used in the scatter plot
 
         grouper ([str]): the attribute to be used for grouping the data in the scatter plot
 
     Returns:
-        [altair chart]: An altair combination plot showing 4 charts: bar plot, chloropleth, time series, and scatter plot
+        [altair chart]: An altair chart drawing the least squares line of each group,
+                        to be layered over the scatter plot
     """
-    # Create query strings
-    query_string_bar = he.gen_query_string(year, sex, region, income)
-    query_string_ts = he.gen_query_string(year_range, sex, region, income)
-
-    # Create plots
-    bar_plot = plot_bar(query_string_bar, year)
-    world_plot = plot_map(query_string_bar, year)
-    ts_plot = plot_time(query_string_ts, highlight_country, year_range)
-    factor_plot = plot_factor(regressor, grouper, query_string_bar)
-
-    # Combine plots
-    combo_plot = (ts_plot & factor_plot) & (world_plot & bar_plot)
+    # the axes are those of the scatter plot, with which they are merged
+    x_axis = alt.Axis(format="%", grid=False, title=label_dict[regressor])
+    y_axis = alt.Axis(format="%", grid=False, title="Obesity Rate")
+    color = alt.Color(grouper, type="nominal", title="Legend")
+    group_tooltip = alt.Tooltip(grouper, type="nominal", title="Grouping Variable")
+
+    with metrics.stage_seconds.time(stage="chart", chart="trend"):
+        if not isinstance(trend, pd.DataFrame):
+            return (
+                alt.Chart(trend)
+                .transform_regression(regressor, "obese", groupby=[grouper])
+                .mark_line()
+                .encode(
+                    x=alt.X(regressor, type="quantitative", axis=x_axis),
+                    y=alt.Y("obese:Q", axis=y_axis),
+                    color=color,
+                    tooltip=[group_tooltip],
+                )
+            )
+        return (
+            alt.Chart(trend)
+            .mark_rule(strokeWidth=2)
+            .encode(
+                x=alt.X("x1:Q", axis=x_axis),
+                x2="x2",
+                y=alt.Y("y1:Q", axis=y_axis),
+                y2="y2",
+                color=color,
+                tooltip=[
+                    group_tooltip,
+                    alt.Tooltip("r:Q", format=".2f", title="Correlation"),
+                    alt.Tooltip("slope:Q", format=".2f", title="Slope"),
+                    alt.Tooltip("n:Q", title="Countries"),
+                ],
+            )
+        )
+
+
+# Scatter plot
+@memoize(chart_cache)
+def plot_factor(regressor, grouper, filters):
+
+    """Function to create a scatter plot showing the association of obesity rate vs other factors
+
+    Function to create a scatter plot showing the association of obesity rate
+    vs other factors and grouped by different aggregators as selected by the user
+    through the different dropdown filters.
+
+    Args:
+        regressor ([str]): the regressor to be used in the scatter plot
+
+        grouper ([str]): the attribute to be used for grouping the data in the scatter plot
+
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data for the bar plot
+
+    Returns:
+        [altair chart]: An altair scatter plot showing the association of obesity rate vs other factors,
+                        with the trend line of each group
+    """
+    factor = factor_chart(factor_data(grouper, filters), regressor, grouper)
+    fits = factor_fits(grouper, filters)
+    trend = trend_chart(trend_data(fits, regressor, grouper), regressor, grouper)
+    return factor + trend
+
+
+# Spec templates
+def build_templates():
+
+    """Function to build and validate the chart spec templates
+
+    The templates are built from the data of the default view, which fixes the
+    field types, with slots for the subtitles and the highlighted countries.
+
+    Returns:
+        [dict]: the SpecTemplate of each chart, the scatter plot and combined
+                ones keyed by regressor and grouper
+    """
+    filters = he.gen_filter(
+        2016,
+        "Both",
+        list(ob["region"].dropna().unique()),
+        list(ob["income"].dropna().unique()),
+    )
+    year = templates.slot("year")
+    parts = {
+        "time": time_chart(
+            time_data(filters), [templates.slot("highlight")], templates.slot("years")
+        ),
+        "map": map_chart(map_data(filters), year),
+        "bar": bar_chart(bar_data(filters), year),
+    }
+    spec_templates = {
+        name: templates.SpecTemplate(chart, {name: chart})
+        for name, chart in parts.items()
+    }
+    for regressor in regressors:
+        for grouper in groupers:
+            factor = factor_chart(factor_data(grouper, filters), regressor, grouper)
+            trend = trend_chart(
+                trend_data(factor_fits(grouper, filters), regressor, grouper),
+                regressor,
+                grouper,
+            )
+            combo = (parts["time"] & (factor + trend)) & (parts["map"] & parts["bar"])
+            spec_templates[regressor, grouper] = templates.SpecTemplate(
+                factor + trend, {"factor": factor, "trend": trend}
+            )
+            spec_templates["combo", regressor, grouper] = templates.SpecTemplate(
+                combo, dict(parts, factor=factor, trend=trend)
+            )
+    return spec_templates
+
+
+spec_templates = (
+    build_templates()
+    if config.spec_mode == "template"
+    and (config.serve_mode == "compute" or config.static_fallback == "compute")
+    else {}
+)
+
+
+def template_html(template, name, data, **labels):
+
+    """Function to fill in a spec template and render it as an html document
+
+    Args:
+        template ([SpecTemplate]): the template of the chart
+
+        name ([str]): the name of the chart, used as the metrics label
+
+        data ([dict]): the data frame of each dataset of the chart, by name
+
+        labels: the value of each slot of the template, by name
+
+    Returns:
+        [str]: the html document showing the chart
+    """
+    return spec_html(template_spec(template, name, data, **labels), name)
+
+
+def template_spec(template, name, data, **labels):
+
+    """Function to fill in a spec template, see template_html
+
+    Returns:
+        [dict]: the Vega-Lite spec of the chart, its inline datasets held as
+                placeholder strings (see serialize.wrap)
+    """
+    with metrics.stage_seconds.time(stage="template", chart=name):
+        spec = template.render(
+            {k: serialize.wrap(serialize.to_json(v)) for k, v in data.items()},
+            **labels,
+        )
+        if config.data_mode == "url":
+            datasets.externalize(spec)
+    return spec
+
+
+def spec_html(spec, name, **options):
+
+    """Function to render a spec to html, recording the time and payload size
+
+    Args:
+        spec ([dict]): the Vega-Lite spec, as returned by template_spec
+
+        name ([str]): the name of the chart, used as the metrics label
+
+        options: the page options of templates.spec_html
+
+    Returns:
+        [str]: the html document showing the chart
+    """
+    with metrics.stage_seconds.time(stage="to_html", chart=name):
+        html = serialize.splice(templates.spec_html(spec, **options))
+    metrics.payload_bytes.observe(len(html), chart=name)
+    return html
+
+
+def chart_html(chart, name):
+    """Function to render a chart to html, recording the time and payload size
+
+    Args:
+        chart ([altair chart]): the chart to render
+
+        name ([str]): the name of the chart, used as the metrics label
+
+    Returns:
+        [str]: the html document showing the chart
+    """
+    with metrics.stage_seconds.time(stage="to_html", chart=name):
+        with serialize.rendering(chart_data):
+            html = serialize.splice(chart.to_html(base_url=config.vega_url))
+    metrics.payload_bytes.observe(len(html), chart=name)
+    return html
+
+
+# Panel pool
+# the pool of each process, created on first use so forked workers never
+# inherit the threads of the master
+panel_pools = {}
+panel_pools_lock = threading.Lock()
+
+# flags the threads building the panels in turn, such as the warm-up, which
+# the gunicorn master runs before forking the workers
+serial_panels = threading.local()
+
+
+def panel_pool():
+    """Function to return the pool building the panels of the combined chart
+
+    The panels are built on threads, so that the results they cache and the
+    timings they record stay with the worker serving the request. No pool is
+    used while the module loads, nor by the threads flagged in serial_panels,
+    so that a preloading master forks the workers without pool threads.
+
+    Returns:
+        [Executor]: the thread pool of the current process, None when the
+                    panels are built in turn
+    """
+    if config.panel_pool != "thread":
+        return None
+    if loading or getattr(serial_panels, "active", False):
+        return None
+    with panel_pools_lock:
+        pool = panel_pools.get(os.getpid())
+        if pool is None:
+            pool = panel_pools[os.getpid()] = ThreadPoolExecutor(config.panel_workers)
+    return pool
+
+
+def drop_panel_pool(pool):
+    """Function to discard a broken pool, so that the next call creates another"""
+    with panel_pools_lock:
+        if panel_pools.get(os.getpid()) is pool:
+            del panel_pools[os.getpid()]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def check_superseded():
+
+    """Function to stop a request that a newer one of its page superseded
+
+    The computations other requests share, which may wait for them, are never
+    stopped, so the requests check between the shared computations they call.
+
+    Raises:
+        inflight.Superseded: if the request of the current thread was
+                             superseded
+    """
+    if not cache.sharing():
+        in_flight.check()
+
+
+def build_panels(calls):
+
+    """Function to build the panels of the combined chart, concurrently if set up
+
+    The panels a pool has not built within config.panel_timeout seconds, or
+    that a broken pool cannot build, are built in turn instead.
+
+    Args:
+        calls ([list]): the function building each panel followed by its
+                        arguments, as tuples
+
+    Returns:
+        [list]: the panels, in the order of the calls
+    """
+    pool = panel_pool()
+    futures = []
+    if pool is not None:
+        check_superseded()
+        try:
+            futures = [pool.submit(func, *args) for func, *args in calls]
+        except BrokenExecutor:
+            drop_panel_pool(pool)
+    if not futures:
+        panels = []
+        for func, *args in calls:
+            check_superseded()
+            panels.append(func(*args))
+        return panels
+    deadline = time.monotonic() + config.panel_timeout
+    panels = []
+    for future, (func, *args) in zip(futures, calls):
+        try:
+            panels.append(future.result(timeout=max(0, deadline - time.monotonic())))
+        except TimeoutError:
+            future.cancel()
+            panels.append(func(*args))
+        except BrokenExecutor:
+            drop_panel_pool(pool)
+            panels.append(func(*args))
+    return panels
+
+
+def combo_panels(
+    year, year_range, sex, region, highlight_country, income, regressor, grouper
+):
+
+    """Function to list the panels of the combined chart, see build_panels
+
+    Args:
+        see combo_spec
+
+    Returns:
+        [list]: the function building each panel followed by its arguments, as
+                tuples: the data of each chart with spec templates, the charts
+                otherwise
+    """
+    # Create filters
+    with metrics.stage_seconds.time(stage="filters", chart="combo"):
+        filters_bar = he.gen_filter(year, sex, region, income)
+        filters_ts = he.gen_filter(year_range, sex, region, income)
+
+    if config.spec_mode == "template":
+        return [
+            (time_data, filters_ts),
+            (factor_data, grouper, filters_bar),
+            (factor_fits, grouper, filters_bar),
+            (map_data, filters_bar),
+            (bar_data, filters_bar),
+        ]
+    return [
+        (plot_bar, filters_bar, year),
+        (plot_map, filters_bar, year),
+        (plot_time, filters_ts, he.highlight_selection(highlight_country), year_range),
+        (plot_factor, regressor, grouper, filters_bar),
+    ]
+
+
+def combo_spec(
+    year, year_range, sex, region, highlight_country, income, regressor, grouper
+):
+
+    """Function to combine all the different plots generated for the dashboard
+
+    Args:
+        year ([int]): year
+
+        year_range ([list]): range of years to be selected for the time series plot
+
+        sex ([list]): sex
+
+        region ([list]): region
+
+        highlight_country ([list]): name of the country to be highlighted in the time series plot
+
+        income ([list]): income atribute in the data
+
+        regressor ([str]): the regressor to be used in the scatter plot
+
+        grouper ([str]): the attribute to be used for grouping the data in the scatter plot
+
+    Returns:
+        [dict]: The spec of an altair combination plot showing 4 charts: bar plot, chloropleth,
+                time series, and scatter plot, its inline datasets held as placeholder strings
+    """
+    # Fill in the templates
+    if config.spec_mode == "template":
+        ob_yr, temp, fits, df, ob_sorted = build_panels(
+            combo_panels(
+                year,
+                year_range,
+                sex,
+                region,
+                highlight_country,
+                income,
+                regressor,
+                grouper,
+            )
+        )
+        return template_spec(
+            spec_templates["combo", regressor, grouper],
+            "combo",
+            {
+                "time": ob_yr,
+                "factor": temp[factor_fields(regressor, grouper)],
+                "trend": trend_data(fits, regressor, grouper),
+                "map": df,
+                "bar": ob_sorted,
+            },
+            year=str(year),
+            years=str(year_range[0]) + "-" + str(year_range[1]),
+            highlight=he.highlight_selection(highlight_country),
+        )
+
+    # Create plots
+    bar_plot, world_plot, ts_plot, factor_plot = build_panels(
+        combo_panels(
+            year, year_range, sex, region, highlight_country, income, regressor, grouper
+        )
+    )
+
+    # Combine plots
+    with metrics.stage_seconds.time(stage="compose", chart="combo"):
+        combo_plot = (ts_plot & factor_plot) & (world_plot & bar_plot)
+        with serialize.rendering(chart_data):
+            return combo_plot.to_dict()
+
+
+@metrics.profiled("plot_all")
+@memoize(chart_cache)
+def plot_all(
+    year, year_range, sex, region, highlight_country, income, regressor, grouper
+):
+    """Function to render the combined plots of the dashboard, see combo_spec"""
+    spec = combo_spec(
+        year, year_range, sex, region, highlight_country, income, regressor, grouper
+    )
+    return spec_html(spec, "combo")
+
+
+# Delta responses
+@memoize(chart_cache)
+def delta_parts(
+    year, year_range, sex, region, highlight_country, income, regressor, grouper
+):
+
+    """Function to split the combined plots into their spec and inline datasets
+
+    Args:
+        see combo_spec
+
+    Returns:
+        [tuple]: the JSON text of the spec, whose datasets are replaced by the
+                 names of their content, and the JSON text of each dataset by
+                 that name
+    """
+    spec = combo_spec(
+        year, year_range, sex, region, highlight_country, income, regressor, grouper
+    )
+    data = {}
+    for name, value in spec.get("datasets", {}).items():
+        body = serialize.unwrap(value)
+        spec["datasets"][name] = datasets.content_name(body)
+        data[spec["datasets"][name]] = body
+    return json.dumps(spec), data
+
+
+@metrics.profiled("plot_delta")
+def plot_delta(
+    year,
+    year_range,
+    sex,
+    region,
+    highlight_country,
+    income,
+    regressor,
+    grouper,
+    resync,
+    held,
+):
+
+    """Function to send the combined plots as a change from the page's last render
+
+    The datasets are named after their content, so those the page already
+    holds, such as the time series data when only the year changes, are left
+    out.
+
+    Args:
+        year, year_range, sex, region, highlight_country, income, regressor,
+        grouper: see combo_spec
+
+        resync ([int]): changed by the page to get the datasets it misses
+
+        held ([list]): the names of the datasets of the page's last render
+
+    Returns:
+        [str]: JSON text of the spec ("spec") and of the datasets the page does
+               not hold, by name ("data")
+    """
+    spec, data = delta_parts(
+        year, year_range, sex, region, highlight_country, income, regressor, grouper
+    )
+    held = set(held or [])
+    sent = ",".join(
+        json.dumps(name) + ":" + body for name, body in data.items() if name not in held
+    )
+    delta = '{"spec":' + spec + ',"data":{' + sent + "}}"
+    metrics.payload_bytes.observe(len(delta), chart="delta")
+    return delta
+
+
+# rebuilds the spec of a delta from the datasets it holds and shows it in the
+# chart page, now or once it loads, or asks for every dataset again if one
+# is missing; the page shares the dashboard's origin, so no other gets it
+delta_apply = """
+function (delta) {
+    var no_update = window.dash_clientside.no_update;
+    if (!delta) {
+        return [no_update, no_update];
+    }
+    var message = JSON.parse(delta);
+    var spec = message.spec;
+    var last = window.chartDatasets || {};
+    var held = {};
+    var values = {};
+    var names = spec.datasets || {};
+    for (var name in names) {
+        var key = names[name];
+        held[key] = key in message.data ? message.data[key] : last[key];
+        if (held[key] === undefined) {
+            window.chartDatasets = {};
+            return [[], Date.now()];
+        }
+        values[name] = held[key];
+    }
+    window.chartDatasets = held;
+    if (spec.datasets) {
+        spec.datasets = values;
+    }
+    var frame = document.getElementById("combo_plot");
+    var post = function () {
+        frame.contentWindow.postMessage({spec: spec}, window.location.origin);
+    };
+    frame.onload = post;
+    post();
+    return [Object.keys(held), no_update];
+}
+"""
+
+
+@metrics.profiled("frame_bar")
+@memoize(chart_cache)
+def frame_bar(year, sex, region, income):
+    """Function to render the bar plot on its own for the split layout"""
+    filters = he.gen_filter(year, sex, region, income)
+    if config.spec_mode == "template":
+        return template_html(
+            spec_templates["bar"], "bar", {"bar": bar_data(filters)}, year=str(year)
+        )
+    return chart_html(plot_bar(filters, year), "bar")
+
+
+@metrics.profiled("frame_map")
+@memoize(chart_cache)
+def frame_map(year, sex, region, income):
+    """Function to render the chloropleth on its own for the split layout"""
+    filters = he.gen_filter(year, sex, region, income)
+    if config.spec_mode == "template":
+        return template_html(
+            spec_templates["map"], "map", {"map": map_data(filters)}, year=str(year)
+        )
+    return chart_html(plot_map(filters, year), "map")
+
+
+@metrics.profiled("frame_time")
+@memoize(chart_cache)
+def frame_time(year_range, sex, region, income, highlight_country):
+    """Function to render the time series plot on its own for the split layout"""
+    filters = he.gen_filter(year_range, sex, region, income)
+    highlight_country = he.highlight_selection(highlight_country)
+    if config.spec_mode == "template":
+        return template_html(
+            spec_templates["time"],
+            "time",
+            {"time": time_data(filters)},
+            years=str(year_range[0]) + "-" + str(year_range[1]),
+            highlight=highlight_country,
+        )
+    return chart_html(plot_time(filters, highlight_country, year_range), "time")
+
+
+@metrics.profiled("frame_factor")
+@memoize(chart_cache)
+def frame_factor(year, sex, region, income, regressor, grouper):
+    """Function to render the scatter plot on its own for the split layout"""
+    filters = he.gen_filter(year, sex, region, income)
+    if config.spec_mode == "template":
+        return template_html(
+            spec_templates[regressor, grouper],
+            "factor",
+            {
+                "factor": factor_data(grouper, filters)[
+                    factor_fields(regressor, grouper)
+                ],
+                "trend": trend_data(factor_fits(grouper, filters), regressor, grouper),
+            },
+        )
+    return chart_html(plot_factor(regressor, grouper, filters), "factor")
+
+
+# Client-side filtering
+# the filter inputs, which the charts follow through params of the same names
+client_inputs = [
+    "input_year",
+    "input_year_range",
+    "input_sex",
+    "input_region",
+    "input_income",
+    "input_highlight_country",
+]
+
+# vega expression of the sex, region and income filters
+client_filter = (
+    "(input_sex == 'Both' || datum.sex == input_sex)"
+    " && indexof(input_region, datum.region) >= 0"
+    " && indexof(input_income, datum.income) >= 0"
+)
+
+
+def client_cube():
+
+    """Function to select the rate cube rows and columns the browser filters
+
+    Returns:
+        [pd.DataFrame]: the rate cube within the years of the sliders, without
+                        the rows that no filter keeps or that hold no population
+    """
+    cube = he.cube
+    pops = [var + "_pop" for var in he.rate_vars]
+    keep = (
+        cube["year"].between(1975, 2016)
+        & cube["region"].notna()
+        & cube["income"].notna()
+        & (cube[pops].sum(axis=1) > 0)
+    )
+    return cube.loc[
+        keep, ["country", "year", "sex", "region", "income"] + he.rate_vars + pops
+    ]
+
+
+def client_rates(chart, where, groupby, rates):
+
+    """Function to add the browser-side filtering and rates to a chart of the rate cube
+
+    Args:
+        chart ([altair chart]): a chart of the rate cube
+
+        where ([str]): vega expression of the year filter
+
+        groupby ([list]): the fields to aggregate the rates by
+
+        rates ([list]): the rates to compute, as in make_rate_data
+
+    Returns:
+        [altair chart]: the chart, drawing the rates instead of the cube
+    """
+    totals = {var: "sum(" + var + ")" for var in rates}
+    totals.update({var + "_pop": "sum(" + var + "_pop)" for var in rates})
+    ratios = {
+        var: "datum.{0}_pop > 0 ? datum.{0} / datum.{0}_pop : null".format(var)
+        for var in rates
+    }
+    # as in make_rate_data, the groups without any rate are left out
+    valid = " || ".join("isValid(datum.{})".format(var) for var in rates)
+    return (
+        chart.transform_filter(where + " && " + client_filter)
+        .transform_aggregate(groupby=groupby, **totals)
+        .transform_calculate(**ratios)
+        .transform_filter(valid)
+    )
+
+
+def client_map_chart(data, sub_label):
+
+    """Function to create the chloropleth world map plot of the rate cube
+
+    The countries are drawn with the geometry looked up from their name, as
+    the lookup data of a chart cannot depend on its params.
+
+    Args:
+        data ([altair data]): the rate cube
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plot, see chart_title
+
+    Returns:
+        [altair chart]: An altair chloropleth world map plot showing the global obesity rates
+    """
+    chart = client_rates(
+        alt.Chart(data, title=chart_title("Obesity Rates", sub_label)),
+        "datum.year == input_year",
+        ["country"],
+        ["obese"],
+    )
+    return (
+        chart.transform_lookup(
+            lookup="country",
+            from_=alt.LookupData(geojson, "properties.country"),
+            as_="geo",
+        )
+        .mark_geoshape()
+        .encode(
+            shape="geo:G",
+            color=alt.Color(
+                "obese:Q",
+                scale=alt.Scale(scheme="viridis"),
+                title="Obesity",
+                legend=alt.Legend(format=".0%"),
+            ),
+            stroke=alt.value("black"),
+            tooltip=[
+                alt.Tooltip("country:N", title="Country"),
+                alt.Tooltip("obese:Q", format=".1%", title="Obesity Rate"),
+            ],
+        )
+        .project("naturalEarth1")
+        .properties(width=450, height=300)
+    )
+
+
+def build_client_templates():
+
+    """Function to build the spec templates of the client-side filtering mode
+
+    Each template shows the four charts of the rate cube for a regressor and
+    grouper, with slots for the initial values of the params. The subtitles
+    are expressions of the params, so they follow the filters in the browser.
+
+    Returns:
+        [dict]: the SpecTemplate of the combined chart, by regressor and grouper
+    """
+    data = alt.UrlData(**datasets.url_data(serialize.to_json(client_cube())))
+    year = alt.ExprRef("'' + input_year")
+    years = alt.ExprRef("input_year_range[0] + '-' + input_year_range[1]")
+    in_year = "datum.year == input_year"
+    in_range = "datum.year >= input_year_range[0] && datum.year <= input_year_range[1]"
+
+    time = client_rates(
+        time_chart(
+            data,
+            alt.ExprRef("input_highlight_country"),
+            years,
+        ),
+        in_range,
+        ["country", "year"],
+        ["obese"],
+    )
+    map_plot = client_map_chart(data, year)
+    bar = (
+        client_rates(bar_chart(data, year), in_year, ["country"], ["obese"])
+        .transform_window(
+            rank="row_number()", sort=[alt.SortField("obese", "descending")]
+        )
+        .transform_filter("datum.rank <= " + str(top_n))
+    )
+    params = [
+        alt.param(name="input_year", value=templates.slot("input_year")),
+        alt.param(name="input_year_range", value=[templates.slot("input_year_range")]),
+        alt.param(name="input_sex", value=templates.slot("input_sex")),
+        alt.param(name="input_region", value=[templates.slot("input_region")]),
+        alt.param(name="input_income", value=[templates.slot("input_income")]),
+        alt.param(
+            name="input_highlight_country",
+            value=[templates.slot("input_highlight_country")],
+        ),
+    ]
+
+    client_templates = {}
+    for regressor in regressors:
+        for grouper in groupers:
+            factor = factor_chart(data, regressor, grouper) + trend_chart(
+                data, regressor, grouper
+            )
+            if grouper == "none":
+                factor = factor.transform_calculate(none="'All'")
+            factor = client_rates(
+                factor, in_year, ["country", grouper], ["obese", regressor]
+            )
+            combo = ((time & factor) & (map_plot & bar)).add_params(*params)
+            client_templates[regressor, grouper] = templates.SpecTemplate(combo, {})
+    return client_templates
+
+
+client_templates = build_client_templates() if client_filtering else {}
+
+
+@metrics.profiled("plot_client")
+@memoize(chart_cache)
+def plot_client(
+    regressor, grouper, year, year_range, sex, region, highlight_country, income
+):
+
+    """Function to render the charts of the rate cube, filtered in the browser
+
+    Only the regressor and grouper trigger the callback; the filters set the
+    initial values of the params, which the browser updates as they change.
+
+    Args:
+        regressor ([str]): the regressor to be used in the scatter plot
+
+        grouper ([str]): the attribute to be used for grouping the data in the scatter plot
+
+        year ([int]): year
+
+        year_range ([list]): range of years to be selected for the time series plot
+
+        sex ([list]): sex
+
+        region ([list]): region
+
+        highlight_country ([list]): name of the country to be highlighted in the time series plot
+
+        income ([list]): income atribute in the data
+
+    Returns:
+        [str]: the html document showing the charts
+    """
+    with metrics.stage_seconds.time(stage="template", chart="client"):
+        spec = client_templates[regressor, grouper].render(
+            {},
+            input_year=year,
+            input_year_range=list(year_range),
+            input_sex=sex,
+            input_region=list(region),
+            input_income=list(income),
+            input_highlight_country=he.highlight_selection(highlight_country),
+        )
+    with metrics.stage_seconds.time(stage="to_html", chart="client"):
+        html = templates.spec_html(spec, listen=True)
+    metrics.payload_bytes.observe(len(html), chart="client")
+    return html
+
+
+# posts the filter inputs to the chart frame, now and whenever it reloads;
+# the frame's page shares the dashboard's origin, so no other page gets them
+client_post = """
+function (year, year_range, sex, region, income, highlight_country) {
+    var values = {
+        input_year: year,
+        input_year_range: year_range,
+        input_sex: sex,
+        input_region: [].concat(region || []),
+        input_income: [].concat(income || []),
+        input_highlight_country: [].concat(highlight_country || [])
+    };
+    var frame = document.getElementById("combo_plot");
+    var post = function () {
+        frame.contentWindow.postMessage(values, window.location.origin);
+    };
+    frame.onload = post;
+    post();
+    return values;
+}
+"""
+
+
+# Year playback
+# the years played back, those of the year slider
+playback_years = [1975, 2016]
+
+
+@memoize(chart_cache)
+def playback_data(filters):
+
+    """Function to compute the map and bar plot data of every year at once
+
+    The rates of all the years are those of the time series plot over the
+    full year range, aggregated in one pass and shared with it.
+
+    Args:
+        filters ([FilterSpec]): filter spec containing the attributes to be used
+                                for filtering the data, over the years played back
+
+    Returns:
+        [tuple]: The obesity rate of each map feature ("id") in a column per
+                 year, for the map, and the obesity rate of each country and
+                 year with the rank of the country within its year ("rank"),
+                 for the top countries of the bar plot
+    """
+    ob_yr = time_data(filters)
+    with metrics.stage_seconds.time(stage="rate_data", chart="playback"):
+        temp = ob_yr.loc[ob_yr["obese"].notna(), ["country", "year", "obese"]]
+        rank = temp.groupby("year")["obese"].rank(method="first", ascending=False)
+        bars = temp.assign(rank=rank.astype(int))
+        # the bar plot shows the top countries only, so only those are sent
+        bars = bars[bars["rank"] <= top_n].reset_index(drop=True)
+        # gather the country rates of each year in feature order, as map_data
+        years = range(playback_years[0], playback_years[1] + 1)
+        rates = temp.pivot(index="country", columns="year", values="obese")
+        rates = rates.reindex(index=he.countries, columns=years).to_numpy()
+        rates = np.vstack([rates, np.full(len(years), np.nan)])[geo_index]
+        ids = np.flatnonzero(~np.isnan(rates).all(axis=1))
+        areas = pd.DataFrame(rates[ids], columns=[str(year) for year in years])
+        return areas.assign(id=ids)[["id", *areas.columns]], bars
+
+
+def playback_chart(areas, bars, sub_label):
+
+    """Function to create the map and bar plot of the year played back
+
+    Args:
+        areas, bars ([pd.DataFrame]): the data returned by playback_data
+
+        sub_label ([str or alt.ExprRef]): subtitle of the plots, see chart_title
+
+    Returns:
+        [altair chart]: The map and the bar plot of the top 10 countries, showing the
+                        year of a param bound to a slider
+    """
+    year = alt.param(
+        name="playback_year",
+        value=playback_years[0],
+        bind=alt.binding_range(
+            min=playback_years[0], max=playback_years[1], step=1, name="Year "
+        ),
+    )
+    in_year = "datum.year == playback_year"
+    with metrics.stage_seconds.time(stage="chart", chart="playback"):
+        map_plot = map_chart(areas, sub_label).transform_calculate(
+            obese="datum['' + playback_year]"
+        )
+        bar = bar_chart(bars, sub_label).transform_filter(in_year)
+        return (map_plot & bar).add_params(year)
+
+
+def build_playback_template():
+
+    """Function to build the spec template of the year playback
+
+    Returns:
+        [SpecTemplate]: the template of playback_chart, its subtitles following the year,
+                        taking the map and bar plot data of playback_data
+    """
+    filters = he.gen_filter(
+        playback_years,
+        "Both",
+        list(ob["region"].dropna().unique()),
+        list(ob["income"].dropna().unique()),
+    )
+    year = alt.ExprRef("'' + playback_year")
+    chart = playback_chart(*playback_data(filters), year)
+    map_plot, bar = chart.vconcat
+    return templates.SpecTemplate(chart, {"map": map_plot, "bar": bar})
+
+
+# the map and bar plot are played through the years in the browser, see
+# play_years
+playback_template = build_playback_template() if playback else None
+
+
+@metrics.profiled("plot_playback")
+@memoize(chart_cache)
+def plot_playback(sex, region, income):
+
+    """Function to render the map and bar plot of every year, played back in the browser
+
+    Args:
+        sex ([list]): sex
+
+        region ([list]): region
+
+        income ([list]): income atribute in the data
+
+    Returns:
+        [str]: the html document playing the charts through the years
+    """
+    filters = he.gen_filter(playback_years, sex, region, income)
+    areas, bars = playback_data(filters)
+    spec = template_spec(playback_template, "playback", {"map": areas, "bar": bars})
+    return spec_html(spec, "playback", play=True)
+
+
+def play_years(n_clicks, sex, region, income):
+
+    """Function to show the year playback once the play button is clicked
+
+    The playback follows the filters from then on, each change being a single
+    request for all the years.
+
+    Args:
+        n_clicks ([int]): the number of clicks of the play button
+
+        sex, region, income: see plot_playback
+
+    Returns:
+        [tuple]: the html document of the playback and the style of its frame
+    """
+    if not n_clicks:
+        raise PreventUpdate
+    return plot_playback(sex, region, income), playback_style
+
+
+# Exported pages
+def view_key(name, args):
+
+    """Function to return the key of a callback's page in the export manifest
+
+    Every argument is keyed as a sorted list, as the order of the values
+    selected does not change the charts and the dropdowns send a single value
+    or none alike as a scalar, a one-element list or an empty one.
+
+    Args:
+        name ([str]): the name of the callback function
+
+        args ([list]): the arguments of the callback
+
+    Returns:
+        [str]: the key
+    """
+    return json.dumps([name] + [view_values(arg) for arg in args])
+
+
+def view_values(arg):
+    """Function to return a callback argument as a sorted list of its values"""
+    if arg is None:
+        return []
+    return sorted(arg) if isinstance(arg, (list, tuple)) else [arg]
+
+
+def write_file(path, body):
+
+    """Function to write a file atomically, so a running server never reads
+    it partially
+
+    Each writer has a temporary file of its own, so the processes exporting
+    and the workers rendering the same page never interleave.
+
+    Args:
+        path ([str]): the path of the file
+
+        body ([bytes]): the content of the file
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_page(out, html, name=None):
+
+    """Function to write a gzipped page, by default under the md5 of its html
+
+    Args:
+        out ([str]): the export directory
+
+        html ([str]): the html document of the page
+
+        name ([str]): the name of the page
+
+    Returns:
+        [str]: the name of the page
+    """
+    name = name or hashlib.md5(html.encode()).hexdigest()
+    path = os.path.join(out, name + ".html.gz")
+    if not os.path.exists(path):
+        write_file(path, gzip.compress(html.encode(), mtime=0))
+    return name
+
+
+# the views rendered by the workers when static serving, appended next to the
+# manifest as a JSON [view_key, name] pair per line, so every worker finds them
+rendered_log = "rendered.jsonl"
+
+
+def read_rendered(out=None):
+    """Function to read the name of each page rendered by the workers, by view_key"""
+    rendered = {}
+    try:
+        with open(os.path.join(out or config.export_dir, rendered_log)) as f:
+            for line in f:
+                # a line being appended is read once complete
+                if line.endswith("\n"):
+                    key, name = json.loads(line)
+                    rendered[key] = name
+    except FileNotFoundError:
+        pass
+    return rendered
+
+
+def record_rendered(key, name):
+    """Function to append a page rendered by this worker to the rendered log
+
+    The line is written in a single append, so the lines of the workers never
+    interleave.
+    """
+    line = (json.dumps([key, name]) + "\n").encode()
+    path = os.path.join(config.export_dir, rendered_log)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def load_manifest(out=None):
+    """Function to read the name of each exported or rendered page, by view_key"""
+    try:
+        with open(os.path.join(out or config.export_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    manifest.update(read_rendered(out))
+    return manifest
+
+
+manifest = load_manifest() if config.serve_mode == "static" else {}
+
+
+@server.route(config.export_url + "<name>.html")
+def serve_exported(name):
+    """Serve an Exported Chart Page, Gzipped, With Long-Lived Caching"""
+    path = os.path.join(config.export_dir, name + ".html.gz")
+    if not re.fullmatch(r"[0-9a-f]+|missing", name) or not os.path.exists(path):
+        flask.abort(404)
+    with open(path, "rb") as f:
+        body = f.read()
+    if "gzip" in flask.request.accept_encodings:
+        response = flask.Response(body, mimetype="text/html")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = flask.Response(gzip.decompress(body), mimetype="text/html")
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(name)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    return response.make_conditional(flask.request)
+
+
+def static_callback(func):
+
+    """Function to make a callback looking up the exported pages of another
+
+    Args:
+        func ([function]): the callback function whose pages were exported
+
+    Returns:
+        [function]: a callback returning the url of the page exported for its
+                    arguments; views that were not exported are rendered,
+                    written next to the exported pages and appended to the
+                    rendered log for the other workers, or shown the page
+                    saying so (see config.static_fallback)
+    """
+
+    def callback(*args):
+        key = view_key(func.__name__, args)
+        name = manifest.get(key)
+        if name is None:
+            # another worker may have rendered the view since
+            manifest.update(read_rendered())
+            name = manifest.get(key)
+        if name is None and config.static_fallback == "compute":
+            os.makedirs(config.export_dir, exist_ok=True)
+            name = manifest[key] = write_page(config.export_dir, func(*args))
+            record_rendered(key, name)
+        return config.export_url + (name or "missing") + ".html"
+
+    return callback
+
+
+def cached_panels(cached):
+
+    """Function to list the panels of the combined chart a callback renders
+
+    Args:
+        cached ([function]): the cached computation of the chart, taking the
+                             first arguments of the callback
+
+    Returns:
+        [function]: a function returning the panels of the chart, see
+                    combo_panels, or none if the chart is cached
+    """
+
+    def panels(*args):
+        view = args[:8]
+        if (cached.__name__,) + freeze(view) in chart_cache:
+            return []
+        return combo_panels(*view)
+
+    return panels
+
+
+# the panels built ahead of the callbacks of the combined chart by the
+# requests that may be superseded, see skip_superseded
+callback_panels = {
+    plot_all: cached_panels(plot_all),
+    plot_delta: cached_panels(delta_parts),
+}
+
+
+def skip_superseded(func):
+
+    """Function to make a callback drop the requests that a newer one superseded
+
+    A burst of requests from a page, as when dragging a slider, is only shown
+    as its last response, so the earlier requests stop computing at their next
+    stage once a newer one has started, leaving the output unchanged. The
+    stages are the cached computations the request calls, which other
+    requests may share and are never stopped midway: the panels of the
+    combined chart are built one by one, see callback_panels, before the
+    chart is rendered from them.
+
+    Args:
+        func ([function]): the callback function
+
+    Returns:
+        [function]: a callback taking the page's session id after the
+                    arguments of the function
+    """
+
+    def callback(*args):
+        *args, session = args
+        token = in_flight.start((session, func.__name__))
+        try:
+            if func in callback_panels:
+                build_panels(callback_panels[func](*args))
+            check_superseded()
+            return func(*args)
+        except inflight.Superseded:
+            raise PreventUpdate
+        finally:
+            in_flight.finish(token)
+
+    return callback
+
+
+def serve(func):
+    """Function to return the callback serving a chart function's pages"""
+    if config.serve_mode == "static":
+        return static_callback(func)
+    return skip_superseded(func) if skip_stale else func
+
+
+# the frames show the html of the charts, or load the exported pages
+frame_property = "src" if config.serve_mode == "static" else "srcDoc"
+
+# the session id passed last to the callbacks dropping superseded requests
+session_states = [State("session_id", "data")] if skip_stale else []
+
+# the sex, region and income inputs shared by every chart
+filter_inputs = [
+    Input("input_sex", "value"),
+    Input("input_region", "value"),
+    Input("input_income", "value"),
+]
+
+if config.layout == "split":
+    app.callback(
+        Output("bar_plot", frame_property),
+        Input("input_year", "value"),
+        *filter_inputs,
+        *session_states,
+    )(serve(frame_bar))
+    app.callback(
+        Output("map_plot", frame_property),
+        Input("input_year", "value"),
+        *filter_inputs,
+        *session_states,
+    )(serve(frame_map))
+    app.callback(
+        Output("time_plot", frame_property),
+        Input("input_year_range", "value"),
+        *filter_inputs,
+        Input("input_highlight_country", "value"),
+        *session_states,
+    )(serve(frame_time))
+    app.callback(
+        Output("factor_plot", frame_property),
+        Input("input_year", "value"),
+        *filter_inputs,
+        Input("input_regressor", "value"),
+        Input("input_grouper", "value"),
+        *session_states,
+    )(serve(frame_factor))
+elif client_filtering:
+    app.callback(
+        Output("combo_plot", frame_property),
+        Input("input_regressor", "value"),
+        Input("input_grouper", "value"),
+        State("input_year", "value"),
+        State("input_year_range", "value"),
+        State("input_sex", "value"),
+        State("input_region", "value"),
+        State("input_highlight_country", "value"),
+        State("input_income", "value"),
+        *session_states,
+    )(serve(plot_client))
+    app.clientside_callback(
+        client_post,
+        Output("client_filters", "data"),
+        *[Input(id, "value") for id in client_inputs],
+    )
+elif delta_responses:
+    app.callback(
+        Output("chart_delta", "data"),
+        Input("input_year", "value"),
+        Input("input_year_range", "value"),
+        Input("input_sex", "value"),
+        Input("input_region", "value"),
+        Input("input_highlight_country", "value"),
+        Input("input_income", "value"),
+        Input("input_regressor", "value"),
+        Input("input_grouper", "value"),
+        Input("chart_resync", "data"),
+        State("chart_held", "data"),
+        *session_states,
+    )(serve(plot_delta))
+    app.clientside_callback(
+        delta_apply,
+        Output("chart_held", "data"),
+        Output("chart_resync", "data"),
+        Input("chart_delta", "data"),
+    )
+else:
+    app.callback(
+        Output("combo_plot", frame_property),
+        Input("input_year", "value"),
+        Input("input_year_range", "value"),
+        Input("input_sex", "value"),
+        Input("input_region", "value"),
+        Input("input_highlight_country", "value"),
+        Input("input_income", "value"),
+        Input("input_regressor", "value"),
+        Input("input_grouper", "value"),
+        *session_states,
+    )(serve(plot_all))
+
+if playback:
+    app.callback(
+        Output("playback_plot", "srcDoc"),
+        Output("playback_plot", "style"),
+        Input("input_play", "n_clicks"),
+        *filter_inputs,
+        *session_states,
+    )(serve(play_years))
+
+
+# Warm-up
+# the inputs of the layout when the dashboard opens
+default_view = {
+    "year": 2016,
+    "year_range": [1975, 2016],
+    "sex": "Both",
+    "region": list(ob["region"].dropna().unique()),
+    "highlight_country": "Canada",
+    "income": list(ob["income"].dropna().unique()),
+    "regressor": "smoke",
+    "grouper": "none",
+}
+
+
+def warm_views(path=config.warm_views):
+
+    """Function to list the views to render ahead of the first requests
+
+    Args:
+        path ([str]): a JSON file listing popular views, each as an object
+                      holding the inputs that differ from the default view
+
+    Returns:
+        [list]: the inputs of the default view and of the popular views
+    """
+    views = [default_view]
+    if path:
+        with open(path) as f:
+            views += [dict(default_view, **view) for view in json.load(f)]
+    return views
+
+
+def view_calls(view):
+
+    """Function to list the callbacks of the layout rendering a view
+
+    The callbacks take their positional arguments in input order, as Dash
+    calls them, so the results are cached under the same keys.
+
+    Args:
+        view ([dict]): the value of each input, keyed as in default_view
+
+    Returns:
+        [list]: the function of each callback followed by its arguments, as tuples
+    """
+    year, year_range, sex, region, highlight_country, income, regressor, grouper = [
+        view[k] for k in default_view
+    ]
+    if client_filtering:
+        return [
+            (
+                plot_client,
+                regressor,
+                grouper,
+                year,
+                year_range,
+                sex,
+                region,
+                highlight_country,
+                income,
+            )
+        ]
+    if delta_responses:
+        return [
+            (
+                delta_parts,
+                year,
+                year_range,
+                sex,
+                region,
+                highlight_country,
+                income,
+                regressor,
+                grouper,
+            )
+        ]
+    if config.layout == "split":
+        return [
+            (frame_bar, year, sex, region, income),
+            (frame_map, year, sex, region, income),
+            (frame_time, year_range, sex, region, income, highlight_country),
+            (frame_factor, year, sex, region, income, regressor, grouper),
+        ]
+    return [
+        (
+            plot_all,
+            year,
+            year_range,
+            sex,
+            region,
+            highlight_country,
+            income,
+            regressor,
+            grouper,
+        )
+    ]
+
+
+def render_view(view):
+    """Function to render a view through the callbacks of the layout"""
+    for func, *args in view_calls(view):
+        func(*args)
+
+
+def warm_up(views):
+    """Function to render views into the result cache, see warm_views
+
+    The panels are built in turn, as the warm-up may run in the gunicorn
+    master, whose pools the forked workers could not use.
+    """
+    serial_panels.active = True
+    try:
+        for view in views:
+            render_view(view)
+    finally:
+        serial_panels.active = False
+
+
+def start_warm_up(mode=config.warm_up):
+
+    """Function to warm the result cache up with the views of warm_views
+
+    It is called by the gunicorn hooks (gunicorn.conf.py) and before running
+    the development server, not on import, so that the tools importing the
+    app do not render views.
+
+    Args:
+        mode ([str]): "sync" renders the views before returning, "background"
+                      renders them in a thread, "off" skips the warm-up
+
+    Returns:
+        [threading.Thread]: the thread of a background warm-up, else None
+    """
+    if config.serve_mode != "compute" or mode not in ["sync", "background"]:
+        return None
+    if mode == "sync":
+        warm_up(warm_views())
+        return None
+    thread = threading.Thread(target=warm_up, args=(warm_views(),), daemon=True)
+    thread.start()
+    return thread
 
-    return combo_plot.to_html()
 
+loading = False
 
 if __name__ == "__main__":
+    start_warm_up()
     app.run_server(debug=True)
@@ -0,0 +1,267 @@
+# benchmarks of the helper functions and charts, with regression tracking
+#
+# Usage (from the repository root):
+#   python src/bench.py --compare --threshold 0.25   # against the committed baseline
+#   python src/bench.py --save benchmarks/baseline.json   # to update it
+#
+# The baseline is only comparable on the machine it was saved on; save one of
+# your own before comparing elsewhere.
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import app
+import helper as he
+import serialize
+
+# baseline the results are compared against by default
+baseline_file = "benchmarks/baseline.json"
+
+# default dashboard inputs
+regions = list(app.ob["region"].dropna().unique())
+incomes = list(app.ob["income"].dropna().unique())
+default = {
+    "year": 2016,
+    "year_range": [1975, 2016],
+    "sex": "Both",
+    "region": regions,
+    "highlight_country": "Canada",
+    "income": incomes,
+    "regressor": "smoke",
+    "grouper": "none",
+}
+
+
+def scenarios():
+    """Return a Realistic Mix of Dashboard Inputs
+
+    The mix covers the default view, scrubbing the year slider one year at a
+    time, the full year range for each sex, every regressor and grouper, and
+    subsets of the regions and income groups.
+    """
+    views = [dict(default)]
+    views += [dict(default, year=year) for year in range(1975, 2017)]
+    views += [dict(default, sex=sex) for sex in ["Male", "Female"]]
+    views += [
+        dict(default, regressor=regressor, grouper=grouper)
+        for regressor in ["smoke", "primedu", "unemployed"]
+        for grouper in ["income", "sex", "region", "none"]
+    ]
+    views += [
+        dict(default, year_range=[1990, 2000], region=regions[:3]),
+        dict(default, income=incomes[:2], highlight_country=["Canada", "Chile"]),
+    ]
+    return views
+
+
+def nbytes(result):
+    """Return the Size of a Function Result as Sent to a Client
+
+    Charts are measured as the html page serving them, data frames as the
+    JSON of their Vega-Lite dataset and strings (html pages) as their UTF-8
+    encoding.
+    """
+    if isinstance(result, pd.DataFrame):
+        result = serialize.to_json(result)
+    elif isinstance(result, alt.TopLevelMixin):
+        result = app.chart_html(result, "bench")
+    if isinstance(result, str):
+        return len(result.encode())
+    return 0
+
+
+def benchmarks(views):
+    """Return the Benchmarked Calls, Keyed by Name
+
+    The chart cache is cleared before each chart function call, so the
+    numbers measure the computation itself; "plot_all (cached)" measures the
+    combined callback with a warm cache.
+    """
+
+    def cold(func):
+        def call(view):
+            app.chart_cache.clear()
+            return func(view)
+
+        return call
+
+    def inputs(view, year_key="year"):
+        return view[year_key], view["sex"], view["region"], view["income"]
+
+    def filters(view, year_key="year"):
+        return he.gen_filter(*inputs(view, year_key))
+
+    def plot_all(view):
+        return app.plot_all(
+            view["year"],
+            view["year_range"],
+            view["sex"],
+            view["region"],
+            view["highlight_country"],
+            view["income"],
+            view["regressor"],
+            view["grouper"],
+        )
+
+    return {
+        "gen_query_string": lambda v: he.gen_query_string(*inputs(v)),
+        "gen_filter": lambda v: filters(v),
+        "make_rate_data (bar)": lambda v: he.make_rate_data(
+            ["country"], ["obese"], filters(v)
+        ),
+        "make_rate_data (time)": lambda v: he.make_rate_data(
+            ["country", "year"], ["obese"], filters(v, "year_range")
+        ),
+        "make_rate_data (factor)": lambda v: he.make_rate_data(
+            ["country", v["grouper"]], he.rate_vars, filters(v)
+        ),
+        "group_rates (factor)": lambda v: he.group_rates(v["grouper"], filters(v)),
+        "group_fits (trend)": lambda v: he.group_fits(
+            he.group_rates(v["grouper"], filters(v)), v["grouper"], app.regressors
+        ),
+        "plot_bar": cold(lambda v: app.plot_bar(filters(v), v["year"])),
+        "plot_map": cold(lambda v: app.plot_map(filters(v), v["year"])),
+        "plot_time": cold(
+            lambda v: app.plot_time(
+                filters(v, "year_range"),
+                he.highlight_selection(v["highlight_country"]),
+                v["year_range"],
+            )
+        ),
+        "plot_factor": cold(
+            lambda v: app.plot_factor(v["regressor"], v["grouper"], filters(v))
+        ),
+        "plot_all": cold(plot_all),
+        "plot_all (cached)": plot_all,
+    }
+
+
+def measure(func, views, repeat):
+    """Times a Function Over the Views, Then Measures its Allocations
+
+    Args:
+        func ([function]): the function to call with each view
+        views ([list]): the dashboard inputs to replay
+        repeat ([int]): the number of passes over the views
+
+    Returns:
+        [dict]: latency percentiles (ms), peak allocations per call (KiB) and
+            mean result size (bytes)
+    """
+    times = []
+    for _ in range(repeat):
+        for view in views:
+            start = time.perf_counter()
+            func(view)
+            times.append(time.perf_counter() - start)
+
+    # allocations are traced in a separate pass, as tracing slows calls down
+    peaks, sizes = [], []
+    tracemalloc.start()
+    for view in views:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = func(view)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        sizes.append(nbytes(result))
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(np.array(times) * 1000, [50, 95, 99])
+    return {
+        "calls": len(times),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "alloc_kib": round(float(np.mean(peaks)) / 1024, 1),
+        "bytes": int(np.mean(sizes)),
+    }
+
+
+# smallest change of each metric that can count as a regression
+noise = {"p50_ms": 0.1, "p95_ms": 0.1, "alloc_kib": 4, "bytes": 64}
+
+
+def compare(results, baseline, threshold):
+    """Lists the Metrics That Regressed Past a Relative Threshold
+
+    Args:
+        results ([dict]): the current results, keyed by benchmark name
+        baseline ([dict]): the baseline results, keyed by benchmark name
+        threshold ([float]): the tolerated relative increase, e.g. 0.25
+
+    Returns:
+        [list]: a description of each regression
+    """
+    regressions = []
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        for metric in ["p50_ms", "p95_ms", "alloc_kib", "bytes"]:
+            before, after = baseline[name][metric], current[metric]
+            # ignore changes too small to be more than timer or allocator noise
+            if after > before * (1 + threshold) and after - before > noise[metric]:
+                regressions.append(
+                    "{}: {} {} -> {} (+{:.0%})".format(
+                        name, metric, before, after, after / max(before, 1e-9) - 1
+                    )
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard.")
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the views")
+    parser.add_argument("--only", nargs="*", help="names of benchmarks to run")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=baseline_file,
+        help="baseline JSON file to compare against (default %(const)s)",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="tolerated relative regression"
+    )
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter("ignore")
+    views = scenarios()
+    results = {}
+    for name, func in benchmarks(views).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(func, views, args.repeat)
+        print(
+            "{:<26} p50 {p50_ms:>9.2f} ms  p95 {p95_ms:>9.2f} ms  p99 {p99_ms:>9.2f} ms"
+            "  alloc {alloc_kib:>9.1f} KiB  bytes {bytes:>8}".format(
+                name, **results[name]
+            )
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {"python": platform.python_version(), "results": results}, f, indent=2
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
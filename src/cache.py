@@ -0,0 +1,166 @@
+# bounded result caches for the dashboard
+
+import functools
+import sys
+import threading
+from collections import OrderedDict
+
+
+def freeze(value):
+    """Return a Hashable Version of a Callback Argument"""
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+# the number of shared computations each thread is running
+_leading = threading.local()
+
+
+def sharing():
+    """Return True While the Current Thread Computes a Result Other Calls Share"""
+    return getattr(_leading, "depth", 0) > 0
+
+
+class SingleFlight:
+    """Coalesces Concurrent Calls for the Same Key Into One Computation
+
+    While a call for a key runs, the other calls for that key wait for its
+    result rather than computing it again. Should the running call fail, or
+    not finish within the timeout, the waiting calls compute the result
+    themselves.
+
+    Args:
+        timeout ([float]): seconds a call waits for the running one, or None
+            to wait for as long as it runs
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.shared = 0
+        self.timeouts = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        """Return func(*args), or the Result of a Running Call for the Same Key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+        if not leader:
+            if not call["done"].wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                return func(*args)
+            if "result" not in call:
+                return func(*args)
+            with self._lock:
+                self.shared += 1
+            return call["result"]
+        _leading.depth = getattr(_leading, "depth", 0) + 1
+        try:
+            call["result"] = func(*args)
+            return call["result"]
+        finally:
+            _leading.depth -= 1
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+class LRUCache:
+    """A Thread-Safe Least-Recently-Used Cache With a Memory Ceiling
+
+    Entries are evicted, least recently used first, once the summed size of
+    the cached values exceeds the ceiling. The values missing from the cache
+    are computed once however many threads ask for them together, see
+    SingleFlight.
+
+    Args:
+        max_bytes ([int]): the memory ceiling of the cache, in bytes
+        sizeof ([function]): a function returning the size of a value in bytes
+        flight_timeout ([float]): seconds a call waits for another computing
+            the same value, see SingleFlight
+    """
+
+    def __init__(self, max_bytes, sizeof=sys.getsizeof, flight_timeout=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.flights = SingleFlight(flight_timeout)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the Cached Value for a Key, Marking it as Recently Used"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        """Cache a Value, Evicting Old Entries to Stay Under the Ceiling"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        """Remove All Entries From the Cache"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def memoize(cache):
+    """Decorator Caching a Function's Results in an LRUCache
+
+    The cache key is the function name together with the frozen positional
+    arguments, so lists and sets passed by Dash callbacks can be used.
+    Concurrent calls missing the cache for the same key share one computation.
+
+    Args:
+        cache ([LRUCache]): the cache to store results in
+
+    Returns:
+        [function]: the decorator
+    """
+
+    def decorator(func):
+        def compute(key, args):
+            result = func(*args)
+            cache.put(key, result)
+            return result
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (func.__name__,) + freeze(args)
+            result = cache.get(key)
+            if result is None:
+                result = cache.flights.do(key, compute, key, args)
+            return result
+
+        return wrapper
+
+    return decorator
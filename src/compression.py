@@ -0,0 +1,73 @@
+# compression of the server's responses in the encoding each client accepts
+
+import gzip
+
+import flask
+import flask_compress
+
+import config
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, the clients then get gzip
+    brotli = None
+
+# the encodings offered, in order of preference
+encodings = [e for e in config.compression if e != "br" or brotli is not None]
+
+# levels of the responses compressed once for all requests; the others are
+# compressed at the faster flask-compress defaults
+levels = {"br": 9, "gzip": 9}
+
+# compressed bodies of the immutable responses, by ETag and encoding
+compressed_cache = LRUCache(int(config.cache_mb * 2**20), sizeof=len)
+
+
+def install(server):
+    """Compress Every Response of a Flask Server That Allows it"""
+    if encodings:
+        server.config["COMPRESS_ALGORITHM"] = encodings
+        flask_compress.Compress(server)
+
+
+def compress(body, encoding):
+    """Return a Body Compressed in an Encoding"""
+    if encoding == "br":
+        return brotli.compress(body, quality=levels["br"])
+    return gzip.compress(body, levels["gzip"], mtime=0)
+
+
+def immutable_response(body, etag, mimetype):
+
+    """Return a Response That Never Changes Under its ETag, Cached for Long
+
+    The body is compressed once per encoding and reused for every request.
+
+    Args:
+        body ([bytes]): the body of the response
+        etag ([str]): the ETag of the body
+        mimetype ([str]): the mimetype of the body
+
+    Returns:
+        [flask.Response]: the response, compressed in the best encoding the
+                          client accepts, or 304 if the client has it
+    """
+    encoding = flask.request.accept_encodings.best_match(encodings)
+    if encoding is not None:
+        key = (etag, encoding)
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            compressed_cache.put(key, compressed)
+        body = compressed
+        etag = etag + "-" + encoding
+    response = flask.Response(body, mimetype=mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    return response.make_conditional(flask.request)
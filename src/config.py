@@ -0,0 +1,120 @@
+# deployment settings for the dashboard, read from environment variables
+
+import os
+import tempfile
+
+# memory ceiling (in megabytes) of the per-chart result cache
+cache_mb = float(os.environ.get("OBESITY_CACHE_MB", 64))
+
+# seconds a request waits for another computing the same chart before it
+# computes the chart itself; only requests served by the threads of the same
+# worker share a chart, see the threads of gunicorn.conf.py
+flight_timeout = float(os.environ.get("OBESITY_FLIGHT_TIMEOUT", 60))
+
+# "combo" renders all charts in one frame from a single callback; "split"
+# gives each chart its own frame and callback wired only to its inputs
+layout = os.environ.get("OBESITY_LAYOUT", "combo")
+
+# "inline" embeds chart data in the html; "url" serves it from the
+# content-addressed dataset endpoint so browsers can cache it. The datasets are
+# only stored on the box that rendered the page, so "url" needs all the
+# requests of a browser to reach that box: a single box (dyno), or sticky
+# sessions; elsewhere the dataset requests fail with 404
+data_mode = os.environ.get("OBESITY_DATA_MODE", "inline")
+
+# directory shared by the workers of a box for the served datasets (not by
+# other boxes, see data_mode)
+dataset_dir = os.environ.get(
+    "OBESITY_DATASET_DIR", os.path.join(tempfile.gettempdir(), "obesity-datasets")
+)
+
+# size on disk (in megabytes) the datasets are pruned to, least recently used
+# first
+dataset_dir_mb = float(os.environ.get("OBESITY_DATASET_DIR_MB", 256))
+
+# url path the datasets are served under
+dataset_url = os.environ.get("OBESITY_DATASET_URL", "/datasets/")
+
+# url the chart pages load the vega, vega-lite and vega-embed scripts from.
+# The default CDN needs the browsers to reach it; "/vega" serves them from
+# vega_dir instead, for networks without internet access. The scripts are not
+# bundled: download them under their CDN names with a .js suffix, e.g.
+#   curl -L -o data/vega/vega-lite@6.4.1.js https://cdn.jsdelivr.net/npm/vega-lite@6.4.1
+# at the versions of the installed altair (alt.VEGA_VERSION and the like)
+vega_url = os.environ.get("OBESITY_VEGA_URL", "https://cdn.jsdelivr.net/npm")
+vega_dir = os.environ.get("OBESITY_VEGA_DIR", "data/vega")
+
+# "full" or "simple" (a lighter geometry for small screens) world map
+map_detail = os.environ.get("OBESITY_MAP_DETAIL", "full")
+
+# fraction of plot callbacks to run under cProfile (0 disables profiling)
+# and the directory the profiles are written to
+profile_rate = float(os.environ.get("OBESITY_PROFILE_RATE", 0))
+profile_dir = os.environ.get(
+    "OBESITY_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "obesity-profiles")
+)
+
+# "altair" builds the charts with altair on every request; "template" fills
+# chart specs that were built and validated once at start-up
+spec_mode = os.environ.get("OBESITY_SPEC_MODE", "altair")
+
+# "sync" renders the default view and the popular views into the result cache
+# before gunicorn starts the workers (gunicorn.conf.py), "background" renders
+# them in a thread of each worker, "off" skips it; importing the app never
+# renders them
+warm_up = os.environ.get("OBESITY_WARM_UP", "off")
+
+# JSON file listing the popular views to warm up, each as an object holding
+# the inputs that differ from the default view, e.g. [{"sex": "Male"}]
+warm_views = os.environ.get("OBESITY_WARM_VIEWS")
+
+# "thread" builds the four panels of the combined chart concurrently on a pool
+# of panel_workers threads; "off" builds them in turn
+panel_pool = os.environ.get("OBESITY_PANEL_POOL", "off")
+panel_workers = int(os.environ.get("OBESITY_PANEL_WORKERS", 4))
+
+# seconds the panels of a request may wait for the pool before they are built
+# in turn
+panel_timeout = float(os.environ.get("OBESITY_PANEL_TIMEOUT", 30))
+
+# "compute" renders the charts per request; "static" only looks up the pages
+# written by export.py, which the frames load from export_url
+serve_mode = os.environ.get("OBESITY_SERVE_MODE", "compute")
+
+# directory of the exported pages and url path they are served under
+export_dir = os.environ.get("OBESITY_EXPORT_DIR", "data/exported")
+export_url = os.environ.get("OBESITY_EXPORT_URL", "/exported/")
+
+# "compute" renders the views that were not exported when static serving and
+# writes them with the exported pages, listed for all the workers of the box
+# (the export directory is not shared between boxes); "missing" shows a page
+# saying so
+static_fallback = os.environ.get("OBESITY_STATIC_FALLBACK", "compute")
+
+# "client" sends the rate cube to the browser once, where the charts filter it
+# on the year, sex, region, income and highlighted countries, so that only the
+# regressor and grouper are rendered by the server (combo layout, compute
+# serve mode); "server" renders every change
+filter_mode = os.environ.get("OBESITY_FILTER_MODE", "server")
+
+# "skip" drops the callback requests of a page once a newer request of the
+# same callback has started (compute serve mode); "off" serves them all. A
+# newer request is only seen by the worker serving it, so this takes threaded
+# workers (gunicorn.conf.py)
+stale_requests = os.environ.get("OBESITY_STALE_REQUESTS", "off")
+
+# encodings the responses are compressed in, in order of preference, for the
+# clients accepting them ("br" needs the brotli package); empty disables it
+compression = [
+    e for e in os.environ.get("OBESITY_COMPRESSION", "br,gzip").split(",") if e
+]
+
+# "full" sends each render of the combined chart as a whole page; "delta"
+# sends its spec and only the datasets the page does not hold yet, to a chart
+# page the browser keeps (combo layout, compute serve mode, server filtering)
+response_mode = os.environ.get("OBESITY_RESPONSE_MODE", "full")
+
+# "on" adds a button playing the map and bar plot through the years in the
+# browser, from the rates of every year sent at once (compute serve mode);
+# "off" leaves it out
+playback = os.environ.get("OBESITY_PLAYBACK", "off")
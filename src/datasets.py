@@ -0,0 +1,175 @@
+# content-addressed chart datasets served separately from the chart specs
+
+import hashlib
+import os
+import tempfile
+
+import altair as alt
+import config
+import serialize
+from cache import LRUCache
+
+# recently stored datasets, shared on disk with the other workers
+dataset_cache = LRUCache(int(config.cache_mb * 2**20), sizeof=len)
+
+
+def dataset_path(name):
+    """Return the Path of a Stored Dataset on Disk"""
+    return os.path.join(config.dataset_dir, name + ".json")
+
+
+def content_name(body):
+    """Return the Name of a Dataset, Derived From its Content"""
+    return "data-" + hashlib.md5(body.encode()).hexdigest()
+
+
+def write_dataset(path, body):
+    """Write a Dataset Atomically, so Other Workers Never Read a Partial File
+
+    Each writer has a temporary file of its own, so threads writing the same
+    dataset never interleave; the last rename wins, with the same content.
+    """
+    os.makedirs(config.dataset_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=config.dataset_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def prune_datasets(max_bytes):
+    """Removes the Least Recently Used Datasets Beyond a Size on Disk
+
+    Args:
+        max_bytes ([int]): the size the stored datasets are kept under
+
+    Returns:
+        [int]: the number of datasets removed
+    """
+    files = []
+    with os.scandir(config.dataset_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            # another worker removed it first
+            pass
+        total -= size
+    return removed
+
+
+def put_dataset(body):
+    """Store Chart Data Under a Name Derived From its Content
+
+    The file of the dataset is marked as recently used, or written if it is
+    missing, so that pruning keeps the datasets of the pages being served.
+
+    Args:
+        body ([str]): the JSON records of the dataset
+
+    Returns:
+        [str]: the name of the dataset, which doubles as its ETag
+    """
+    name = content_name(body)
+    body = body.encode()
+    if name not in dataset_cache:
+        dataset_cache.put(name, body)
+    path = dataset_path(name)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        write_dataset(path, body)
+        prune_datasets(int(config.dataset_dir_mb * 2**20))
+    return name
+
+
+def get_dataset(name):
+    """Return the Body of a Stored Dataset, or None if it is Unknown
+
+    The file of the dataset is marked as recently used, or written back if
+    another worker pruned it, so that pruning keeps the datasets still being
+    fetched, such as those stored once at start-up.
+    """
+    body = dataset_cache.get(name)
+    path = dataset_path(name)
+    if body is None:
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        dataset_cache.put(name, body)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        write_dataset(path, body)
+    return body
+
+
+def url_data(body):
+    """Store Records, Returning a Vega-Lite Url Data Model Pointing at Them"""
+    name = put_dataset(body)
+    return {"url": config.dataset_url + name + ".json", "format": {"type": "json"}}
+
+
+def to_dataset_url(data):
+    """Altair Data Transformer Replacing Inline Data by a Dataset URL
+
+    Args:
+        data ([pd.DataFrame, dict]): the data of a chart
+
+    Returns:
+        [dict]: a Vega-Lite url data model pointing at the dataset endpoint
+    """
+    return url_data(serialize.to_json(data))
+
+
+def externalize(spec):
+    """Moves the Named Datasets of a Vega-Lite Spec to the Dataset Endpoint
+
+    Args:
+        spec ([dict]): a spec with top-level "datasets" held by placeholder
+                       strings (see serialize.wrap), modified in place
+
+    Returns:
+        [dict]: the spec, with its named data references replaced by urls
+    """
+    urls = {
+        name: url_data(serialize.unwrap(values))
+        for name, values in spec.pop("datasets").items()
+    }
+
+    def replace(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "data" and isinstance(value, dict) and "name" in value:
+                    node[key] = urls.get(value["name"], value)
+                else:
+                    replace(value)
+        elif isinstance(node, list):
+            for value in node:
+                replace(value)
+
+    replace(spec)
+    return spec
+
+
+alt.data_transformers.register("dataset_url", to_dataset_url)
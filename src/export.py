@@ -0,0 +1,160 @@
+# offline export of the chart pages of the dashboard, for static serving
+#
+# Usage (from the repository root):
+#   python src/export.py --subsets 1 --workers 4
+#   OBESITY_SERVE_MODE=static gunicorn src.app:server ...
+#
+# Every year, sex, regressor and grouper is exported with the full region and
+# income selections (and their subsets of at most --subsets values), the full
+# year range and the default highlighted country. Pages are written gzipped
+# under the md5 of their html, next to a manifest naming the page of each
+# callback's arguments. Run it with the OBESITY_LAYOUT and OBESITY_SPEC_MODE
+# the pages will be served with. Views left out, such as other highlighted
+# countries or year ranges, are rendered by the server when first requested
+# and listed in rendered.jsonl next to the manifest, where every worker finds
+# them (see OBESITY_STATIC_FALLBACK); a new export starts that list afresh.
+
+import argparse
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# whole pages are rendered on demand, with their data inlined and filtered by
+# the server
+os.environ["OBESITY_WARM_UP"] = "off"
+os.environ["OBESITY_DATA_MODE"] = "inline"
+os.environ["OBESITY_SERVE_MODE"] = "compute"
+os.environ["OBESITY_FILTER_MODE"] = "server"
+os.environ["OBESITY_RESPONSE_MODE"] = "full"
+
+import app
+import config
+
+# shown in the frames for the views that were not exported
+missing_page = """<!DOCTYPE html>
+<html><body style="font-family: sans-serif; font-size: smaller">
+This selection has not been exported, please choose another one.
+</body></html>
+"""
+
+
+def subsets(values, limit):
+    """Return a Full Selection, Then its Subsets of at Most limit Values"""
+    selections = [values]
+    for n in range(1, min(limit, len(values) - 1) + 1):
+        selections += [list(c) for c in itertools.combinations(values, n)]
+    return selections
+
+
+def views(years, limit):
+    """Return the Views to Export
+
+    Args:
+        years ([range]): the years of the year slider to export
+        limit ([int]): the largest region and income subsets to export
+
+    Returns:
+        [list]: the inputs of each view, keyed as in app.default_view
+    """
+    default = app.default_view
+    return [
+        dict(
+            default,
+            year=year,
+            sex=sex,
+            region=region,
+            income=income,
+            regressor=regressor,
+            grouper=grouper,
+        )
+        for year in years
+        for sex in ["Male", "Female", "Both"]
+        for region in subsets(default["region"], limit)
+        for income in subsets(default["income"], limit)
+        for regressor in app.regressors
+        for grouper in app.groupers
+    ]
+
+
+def calls(views):
+    """Return the Distinct Callback Calls Rendering the Views, by view_key"""
+    return {
+        app.view_key(func.__name__, args): (func.__name__, *args)
+        for view in views
+        for func, *args in app.view_calls(view)
+    }
+
+
+def export_page(out, call):
+    """Render and Write the Page of a Callback Call
+
+    Args:
+        out ([str]): the export directory
+        call ([tuple]): the name of the callback function followed by its
+            arguments
+
+    Returns:
+        [str]: the name of the page
+    """
+    name, *args = call
+    return app.write_page(out, getattr(app, name)(*args))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the chart pages.")
+    parser.add_argument("--out", default=config.export_dir, help="export directory")
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs=2,
+        default=[1975, 2016],
+        metavar=("FIRST", "LAST"),
+        help="years of the year slider to export",
+    )
+    parser.add_argument(
+        "--subsets",
+        type=int,
+        default=0,
+        help="also export the region and income subsets of up to this many values",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="rendering processes"
+    )
+    args = parser.parse_args(argv)
+
+    todo = calls(views(range(args.years[0], args.years[1] + 1), args.subsets))
+    os.makedirs(args.out, exist_ok=True)
+    start = time.time()
+    # forked, so that the processes share the loaded data
+    with ProcessPoolExecutor(
+        args.workers, mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        names = pool.map(
+            functools.partial(export_page, args.out), todo.values(), chunksize=8
+        )
+        manifest = dict(zip(todo, names))
+    app.write_page(args.out, missing_page, "missing")
+    app.write_file(
+        os.path.join(args.out, "manifest.json"),
+        json.dumps(manifest, separators=(",", ":")).encode(),
+    )
+    # the pages rendered by the server for an earlier export may differ
+    try:
+        os.remove(os.path.join(args.out, app.rendered_log))
+    except FileNotFoundError:
+        pass
+    print(
+        "{} pages ({} distinct) in {:.0f} s".format(
+            len(manifest), len(set(manifest.values())), time.time() - start
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
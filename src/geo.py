@@ -0,0 +1,133 @@
+# bundled world geometry for the chloropleth map
+
+import copy
+import hashlib
+import json
+
+import numpy as np
+
+# Natural Earth 1:110m countries, with clockwise exterior rings as d3 expects
+geo_file = "data/geo/world-110m.geojson"
+
+
+def load_geometry(path=geo_file):
+    """Read the Bundled World Geometry as a GeoJSON Feature Collection"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def join_countries(geometry, ob):
+    """Annotates Each Country Feature With its Name in the Obesity Data
+
+    Features are matched on their ISO alpha-3 code, falling back on their
+    name; unmatched features get a null country. Each feature also gets its
+    position in the collection as "id", to key map values on.
+
+    Args:
+        geometry ([dict]): a GeoJSON feature collection of the countries
+        ob ([pd.DataFrame]): the obesity dataset
+
+    Returns:
+        [dict]: a copy of the feature collection with a "country" property
+    """
+    countries = ob[["iso3c", "country"]].dropna().drop_duplicates()
+    by_iso = dict(zip(countries["iso3c"].astype(str), countries["country"].astype(str)))
+    names = set(ob["country"].astype(str))
+
+    geometry = copy.deepcopy(geometry)
+    for i, feature in enumerate(geometry["features"]):
+        props = feature["properties"]
+        props["id"] = i
+        country = by_iso.get(props["iso_a3"])
+        if country is None and props["name"] in names:
+            country = props["name"]
+        props["country"] = country
+    return geometry
+
+
+def feature_index(geometry, countries):
+    """Aligns the Obesity Countries With the Features of a Collection
+
+    Args:
+        geometry ([dict]): a feature collection annotated by join_countries
+        countries ([pd.Index]): the countries of the obesity data
+
+    Returns:
+        [np.ndarray]: for each feature, the position of its country in
+            `countries`, or -1 for features without a country
+    """
+    names = [f["properties"]["country"] for f in geometry["features"]]
+    return countries.get_indexer(names)
+
+
+def simplify_ring(ring, tolerance):
+    """Simplifies a Closed Ring With the Ramer-Douglas-Peucker Algorithm
+
+    Args:
+        ring ([list]): the [lon, lat] points of the ring, first equal to last
+        tolerance ([float]): the largest deviation (in degrees) to drop
+
+    Returns:
+        [list]: the simplified ring, keeping at least four points
+    """
+    points = np.asarray(ring, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, len(points) // 2, -1]] = True
+    stack = [(0, len(points) // 2), (len(points) // 2, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = points[end] - points[start]
+        rel = points[start + 1 : end] - points[start]
+        norm = np.hypot(*seg)
+        if norm == 0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            keep[start + 1 + i] = True
+            stack += [(start, start + 1 + i), (start + 1 + i, end)]
+    if keep.sum() < 4:
+        return ring
+    return points[keep].tolist()
+
+
+def simplify(geometry, tolerance):
+    """Return a Copy of a Feature Collection With Simplified Polygons"""
+    geometry = copy.deepcopy(geometry)
+    for feature in geometry["features"]:
+        geom = feature["geometry"]
+        polygons = (
+            [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+        )
+        for polygon in polygons:
+            polygon[:] = [simplify_ring(ring, tolerance) for ring in polygon]
+    return geometry
+
+
+def encode(geometry):
+    """Serialize a Feature Collection, Returning its Body and a Content Hash"""
+    body = json.dumps(geometry, separators=(",", ":")).encode()
+    return body, hashlib.md5(body).hexdigest()
+
+
+def make_variants(ob, path=geo_file):
+    """Builds the Served Geometry Variants
+
+    Args:
+        ob ([pd.DataFrame]): the obesity dataset, used to join the countries
+        path ([str]): path of the bundled geometry
+
+    Returns:
+        [dict]: the body and content hash of the full geometry ("full") and
+            of a simplified geometry for small screens ("simple")
+        [np.ndarray]: the feature index of the countries, see feature_index
+    """
+    geometry = join_countries(load_geometry(path), ob)
+    variants = {
+        "full": encode(geometry),
+        "simple": encode(simplify(geometry, 0.5)),
+    }
+    return variants, feature_index(geometry, ob["country"].cat.categories)
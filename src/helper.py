@@ -1,6 +1,10 @@
 # utilities/helper functions for dashboard
 
+from dataclasses import dataclass, replace
+
+import numpy as np
 import pandas as pd
+import store
 
 
 def sex_selection(input):
@@ -8,22 +12,129 @@ def sex_selection(input):
     return ["Male", "Female"] if input == "Both" else [input]
 
 
+def highlight_selection(input):
+    """Return Highlight Country Input Variable as a List"""
+    if input is None:
+        return []
+    return [input] if type(input) == str else list(input)
+
+
 # read-in obesity data
-file = "data/processed/obesity-combo.csv"
-ob = pd.read_csv(file)
+ob = store.load_obesity()
+
+# variables for which rates (as a function of population) are calculated
+rate_vars = ["primedu", "smoke", "unemployed", "obese"]
+
+# dimensions retained in the rate cube
+cube_keys = ["country", "year", "sex", "region", "income", "none"]
+
+
+def make_cube(data, valuevars=rate_vars):
+    """Pre-Aggregates Value and Population Totals for Rate Calculation
+
+    Params:
+        data [pd.DataFrame]: The obesity dataset.
+        valuevars [list]: A list detailing the names of the quantitative
+            variables to pre-aggregate.
+
+    Returns:
+        [pd.DataFrame]: A pandas data frame keyed by country, year, sex,
+            region, income and none, holding for each value variable the
+            summed value (carrying the same column name) and the summed
+            population of the rows where that value is available (suffixed
+            with "_pop"). Missing values contribute zero to both totals.
+    """
+    totals = {}
+    for var in valuevars:
+        avail = data[var].notna()
+        totals[var] = data[var].where(avail, 0)
+        totals[var + "_pop"] = data["pop"].where(avail, 0)
+
+    cube = (
+        pd.concat([data[cube_keys], pd.DataFrame(totals)], axis=1)
+        .groupby(cube_keys, dropna=False, sort=False, observed=True)
+        .sum()
+        .reset_index()
+    )
+    return cube
+
+
+# pre-aggregated totals answering make_rate_data for the obesity dataset
+cube = make_cube(ob)
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    """Structured Filter for Subsetting the Obesity Data
+
+    Attributes:
+        year (tuple): The first and last year (inclusive) to keep.
+        sex (frozenset): The sexes to keep ('Male' and/or 'Female').
+        region (frozenset): The regions of the world to keep.
+        income (frozenset): The income groups to keep.
+    """
+
+    year: tuple
+    sex: frozenset
+    region: frozenset
+    income: frozenset
+
+
+# dimensions a FilterSpec selects on by set membership
+filter_keys = ["sex", "region", "income"]
+
+
+def make_codes(data):
+    """Encodes the Set-Filtered Dimensions as Categorical Codes
+
+    Params:
+        data [pd.DataFrame]: The obesity dataset or its rate cube.
+
+    Returns:
+        [dict]: A dictionary mapping "year" to the year values and each of
+            sex, region and income to a pd.Categorical of that column.
+    """
+    codes = {key: pd.Categorical(data[key]) for key in filter_keys}
+    codes["year"] = data["year"].to_numpy()
+    return codes
+
+
+# categorical codes of the rate cube, used to build filter masks
+cube_codes = make_codes(cube)
+
+
+def filter_mask(filters, codes):
+    """Builds a Boolean Row Mask From a Filter Spec
+
+    Params:
+        filters [FilterSpec]: The filter to apply.
+        codes [dict]: Categorical codes of the data, as returned by make_codes.
+
+    Returns:
+        [np.ndarray]: A boolean array flagging the rows that pass the filter.
+    """
+    mask = (codes["year"] >= filters.year[0]) & (codes["year"] <= filters.year[1])
+    for key in filter_keys:
+        cat = codes[key]
+        # append a False entry so that missing values (code -1) never match
+        keep = np.append(cat.categories.isin(getattr(filters, key)), False)
+        mask &= keep[cat.codes]
+    return mask
 
 
 def make_rate_data(grp, valuevars, query="none == 'All'", data=ob):
     """Filters, Groups, and Calculates Rates
 
     Params:
-        grp [list]: A list detailing the names of the variables to group by.
+        grp [list]: A list detailing the names of the variables to group by
+            (any of the rate cube keys).
         valuevars [list]: A list detailing the names of the quantitative
             variable summarise and calculate a rate for (as a function of
             population).
-        query [string]: A query string used to subset the data prior to
-            aggregation.
-        data [pd.DataFrame]: The obesity dataset.
+        query [FilterSpec, string]: A filter spec or query string used to
+            subset the data prior to aggregation.
+        data [pd.DataFrame]: The obesity dataset. Rates for the default
+            dataset are answered from the pre-aggregated rate cube.
 
     Returns:
         [pd.DataFrame]: A pandas data frame containing the grouping variables
@@ -32,24 +143,206 @@ def make_rate_data(grp, valuevars, query="none == 'All'", data=ob):
             are return as np.NaN.
 
     """
-    grp_plus = grp + ["none"]
-
-    ratedata = (
-        data.query(query)
-        .loc[:, grp + ["pop"] + valuevars]
-        .melt(id_vars=grp + ["pop"], var_name="variable", value_name="value")
-        .dropna()
-        .groupby(grp + ["variable"])[["pop", "value"]]
+    rate_cube = cube if data is ob else make_cube(data, valuevars)
+    valuevars = sorted(valuevars)
+    popvars = [var + "_pop" for var in valuevars]
+
+    if isinstance(query, FilterSpec):
+        codes = cube_codes if data is ob else make_codes(rate_cube)
+        subset = rate_cube[filter_mask(query, codes)]
+    else:
+        subset = rate_cube.query(query)
+
+    totals = subset.groupby(grp, observed=True)[valuevars + popvars].sum()
+    rates = totals[valuevars] / totals[popvars].where(totals[popvars] > 0).values
+
+    ratedata = rates.dropna(how="all").reset_index()
+    ratedata.columns.name = "variable"
+    return ratedata
+
+
+# the countries of the obesity data, indexing the arrays of country_rates
+countries = cube["country"].cat.categories
+
+
+def country_rates(var, filters):
+    """Calculates a Rate for Every Country Using Vectorized Sums
+
+    Params:
+        var [string]: The name of the value variable to calculate a rate for.
+        filters [FilterSpec]: The filter used to subset the rate cube.
+
+    Returns:
+        [np.ndarray]: The rate of each country, in the order of `countries`.
+            Countries where a rate could not be calculated are np.NaN.
+    """
+    mask = filter_mask(filters, cube_codes)
+    codes = cube["country"].cat.codes.to_numpy()[mask]
+    value = np.bincount(
+        codes, weights=cube[var].to_numpy()[mask], minlength=len(countries)
+    )
+    pop = np.bincount(
+        codes, weights=cube[var + "_pop"].to_numpy()[mask], minlength=len(countries)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(pop > 0, value / pop, np.nan)
+
+
+def make_rate_table(data, valuevars=rate_vars):
+    """Pre-Computes the Rates of Each Country, Year and Sex
+
+    Params:
+        data [pd.DataFrame]: The rate cube.
+        valuevars [list]: A list detailing the names of the value variables
+            to calculate a rate for.
+
+    Returns:
+        [pd.DataFrame]: A pandas data frame keyed by the rate cube keys,
+            holding the rate of each value variable (carrying the same column
+            name) for each sex and for both sexes together (sex 'Both'),
+            sorted by country, year and sex. Rows without any rate are
+            dropped.
+    """
+    valuevars = sorted(valuevars)
+    popvars = [var + "_pop" for var in valuevars]
+    both = (
+        data.groupby(
+            [key for key in cube_keys if key != "sex"],
+            dropna=False,
+            sort=False,
+            observed=True,
+        )[valuevars + popvars]
         .sum()
         .reset_index()
-        .assign(rate=lambda x: x["value"] / x["pop"])
-        .drop(columns=["value", "pop"])
-        .pivot(index=grp, columns="variable", values="rate")
-        .reset_index()
+        .assign(sex="Both")
+    )
+    table = pd.concat([data, both], ignore_index=True)
+    table["sex"] = pd.Categorical(
+        table["sex"], categories=list(data["sex"].cat.categories) + ["Both"]
+    )
+    table[valuevars] = (
+        table[valuevars] / table[popvars].where(table[popvars] > 0).values
     )
+    table = table[cube_keys + valuevars].dropna(subset=valuevars, how="all")
+    return table.sort_values(["country", "year", "sex"], ignore_index=True)
+
+
+# rates of each country, year and sex, answering make_rate_data by country
+rate_table = make_rate_table(cube)
+table_codes = make_codes(rate_table)
+
+
+def group_rates(grouper, filters):
+    """Looks Up the Rates of Each Country and Group in the Rate Table
+
+    Answers make_rate_data(["country", grouper], rate_vars, filters) without
+    aggregating, as each country holds a single region and income group: the
+    rates of a country are those of its row for the year and sex selected, or
+    for both sexes when both are selected but not grouped by.
+
+    Params:
+        grouper [string]: The name of the variable to group the countries by
+            (any of the rate cube keys but country and year).
+        filters [FilterSpec]: The filter used to subset the rate table. Year
+            ranges are aggregated by make_rate_data.
+
+    Returns:
+        [pd.DataFrame]: A pandas data frame as returned by make_rate_data.
+    """
+    if filters.year[0] != filters.year[1]:
+        return make_rate_data(["country", grouper], rate_vars, filters)
+    if grouper != "sex" and len(filters.sex) > 1:
+        filters = replace(filters, sex=frozenset(["Both"]))
+    ratedata = rate_table.loc[
+        filter_mask(filters, table_codes), ["country", grouper] + sorted(rate_vars)
+    ]
+    ratedata = ratedata.reset_index(drop=True)
+    ratedata.columns.name = "variable"
     return ratedata
 
 
+def group_fits(data, grp, xvars, yvar="obese"):
+    """Fits a Least Squares Line of a Variable on Others, Within Each Group
+
+    All groups and variables are fitted at once, from sums of the centered
+    values binned by group and variable.
+
+    Params:
+        data [pd.DataFrame]: The rates, as returned by make_rate_data.
+        grp [string]: The name of the variable grouping the rows.
+        xvars [list]: The names of the variables to fit on.
+        yvar [string]: The name of the variable fitted.
+
+    Returns:
+        [pd.DataFrame]: A pandas data frame keyed by the group and "variable"
+            (the variable fitted on), holding the number of rows where both
+            variables are available ("n"), their correlation ("r"), the
+            "slope" and "intercept" of the line and its ends over the range
+            of the variable ("x1", "y1", "x2", "y2"). Groups where the
+            variable takes a single value are left out.
+    """
+    codes, groups = pd.factorize(data[grp], sort=True)
+    # each (group, variable) pair is a bin, the rows holding a value per bin
+    x = data[xvars].to_numpy(dtype=float)
+    y = np.broadcast_to(data[[yvar]].to_numpy(dtype=float), x.shape)
+    bins = codes[:, None] * len(xvars) + np.arange(len(xvars))
+    avail = np.isfinite(x) & np.isfinite(y) & (codes[:, None] >= 0)
+    bins, x, y = bins[avail], x[avail], y[avail]
+    size = len(groups) * len(xvars)
+
+    n = np.bincount(bins, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = np.bincount(bins, x, size) / n
+        my = np.bincount(bins, y, size) / n
+        dx, dy = x - mx[bins], y - my[bins]
+        xx = np.bincount(bins, dx * dx, size)
+        xy = np.bincount(bins, dx * dy, size)
+        yy = np.bincount(bins, dy * dy, size)
+        slope = xy / xx
+        r = xy / np.sqrt(xx * yy)
+    x1 = np.full(size, np.inf)
+    x2 = np.full(size, -np.inf)
+    np.minimum.at(x1, bins, x)
+    np.maximum.at(x2, bins, x)
+    intercept = my - slope * mx
+
+    fits = pd.DataFrame(
+        {
+            grp: groups.take(np.repeat(np.arange(len(groups)), len(xvars))),
+            "variable": np.tile(xvars, len(groups)),
+            "n": n,
+            "r": r,
+            "slope": slope,
+            "intercept": intercept,
+            "x1": x1,
+            "y1": intercept + slope * x1,
+            "x2": x2,
+            "y2": intercept + slope * x2,
+        }
+    )
+    return fits[x2 > x1].reset_index(drop=True)
+
+
+def gen_filter(year, sex, region, income):
+    """Generates A Filter Spec For Filtering
+
+    Args:
+        year ([list, int]): A two element containing the start and the end of a year range or a single integer indicating a year
+        sex ([str]): One of 'Female', 'Male' or 'Both'
+        region ([list]): A list of all the regions of the world to filter by
+        income ([list]): A list of all the income groups to filter by
+
+    Returns:
+        [FilterSpec]: A filter spec to be passed into make_rate_data
+    """
+    return FilterSpec(
+        year=tuple(year) if type(year) == list else (year, year),
+        sex=frozenset(sex_selection(sex)),
+        region=frozenset(region),
+        income=frozenset(income),
+    )
+
+
 def gen_query_string(year, sex, region, income):
     """Generates A Query String For Filtering
 
@@ -61,6 +354,9 @@ def gen_query_string(year, sex, region, income):
 
     Returns:
         [str]: A query string to be passed into a pandas query
+
+    Note:
+        Kept for compatibility; gen_filter avoids parsing the query string.
     """
 
     filters = {
@@ -71,4 +367,4 @@ def gen_query_string(year, sex, region, income):
     }
 
     query = " & ".join(["{} in {}".format(k, v) for k, v in filters.items()])
-    return query
\ No newline at end of file
+    return query
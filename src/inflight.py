@@ -0,0 +1,69 @@
+# tracking of the callback requests in flight of each browser session, so
+# that the requests a newer one superseded can be dropped
+
+import itertools
+import threading
+
+
+class Superseded(Exception):
+    """Raised in a Request That a Newer One of its Session Superseded"""
+
+
+class RequestTracker:
+    """Tracks the Latest Request of Each Session and Callback
+
+    A request is superseded once a newer request for the same key (a session
+    and a callback) has started. Each thread records the request it serves,
+    which the computations can then check between their stages.
+    """
+
+    def __init__(self):
+        self.superseded = 0
+        self._latest = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self, key):
+        """Record the Start of the Request of the Current Thread
+
+        Args:
+            key ([tuple]): the session and callback of the request
+
+        Returns:
+            [tuple]: the token of the request, to be passed to finish
+        """
+        token = (key, next(self._order))
+        with self._lock:
+            latest = self._latest.setdefault(key, {"order": None, "running": 0})
+            latest["order"] = token[1]
+            latest["running"] += 1
+        self._local.token = token
+        return token
+
+    def finish(self, token):
+        """Record the End of a Request, Forgetting Sessions With None Running"""
+        key, _ = token
+        with self._lock:
+            latest = self._latest[key]
+            latest["running"] -= 1
+            if latest["running"] == 0:
+                del self._latest[key]
+        self._local.token = None
+
+    def check(self):
+        """Raise Superseded if a Newer Request Superseded the Current Thread's
+
+        Threads serving no tracked request, such as the warm-up and the panel
+        pools, are never superseded.
+        """
+        token = getattr(self._local, "token", None)
+        if token is None:
+            return
+        key, order = token
+        with self._lock:
+            superseded = self._latest[key]["order"] != order
+            if superseded:
+                self.superseded += 1
+        if superseded:
+            raise Superseded()
@@ -0,0 +1,280 @@
+# ingestion of the raw WHO obesity estimates into the processed data
+#
+# Usage (from the repository root):
+#   python src/ingest.py           # after a refresh of data/raw/obesity-cleaned.csv
+#   python src/ingest.py --indicators new-indicators.csv   # with new rows
+#   python src/ingest.py --full    # also rebuild every column of the store
+#
+# The WHO estimates are joined on country, year and sex to the World Bank
+# population and indicators of the processed CSV, whose "obese" column (the
+# number of obese people) is recomputed for the rows the raw file holds an
+# estimate for; the other rows are kept as they are. New years or countries
+# need their population: an indicators CSV, keyed by country, year and sex,
+# updates the indicators of the rows it holds and appends the rows the
+# processed CSV lacks. Since only the "obese" column depends on the estimates,
+# new estimates only rewrite its file in the columnar store, unless the rows
+# of the indicators changed.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import store
+
+# raw WHO estimates, and the country names of the WHO and the World Bank
+raw_file = "data/raw/obesity-cleaned.csv"
+ids_file = "data/country-ids.csv"
+
+# the keys of the rows, and the columns describing a country rather than a row,
+# which the rows appended for a known country take from its last row
+keys = ["country", "year", "sex"]
+country_cols = [
+    "iso2c",
+    "iso3c",
+    "region",
+    "capital",
+    "longitude",
+    "latitude",
+    "income",
+    "lending",
+    "none",
+]
+
+# point estimate of values like "0.5 [0.2-1.1]" (percent, credible interval)
+estimate_pattern = r"^\s*(\d+(?:\.\d+)?)\s*\[[^\]]*\]\s*$"
+
+
+def parse_rates(raw=raw_file):
+    """Parses the Raw WHO Estimates Into Obesity Rates
+
+    Args:
+        raw ([str]): path of the raw WHO CSV
+
+    Returns:
+        [pd.DataFrame]: the obesity rate ("rate", a fraction) of each WHO
+                        country, year and sex (Male or Female), NaN where
+                        there is no data
+    """
+    df = pd.read_csv(raw, index_col=0, dtype={"Obesity (%)": str})
+    df = df[df["Sex"] != "Both sexes"]
+    estimate = df["Obesity (%)"].str.extract(estimate_pattern, expand=False)
+    return pd.DataFrame(
+        {
+            "country": df["Country"].to_numpy(),
+            "year": df["Year"].to_numpy(),
+            "sex": df["Sex"].to_numpy(),
+            "rate": estimate.astype(float).to_numpy() / 100,
+        }
+    )
+
+
+def world_bank_names(countries, known, ids=ids_file):
+    """Maps WHO Country Names to the World Bank Names of the Indicators
+
+    Args:
+        countries ([pd.Series]): WHO country names
+        known ([list]): the World Bank country names of the indicators, which
+            names missing from the ids file are kept as when they match
+        ids ([str]): path of the CSV of country names and ids
+
+    Returns:
+        [pd.Series]: the World Bank names, NaN for unknown countries
+    """
+    ids = pd.read_csv(ids).dropna(subset=["obesity", "world_bank"])
+    names = pd.Series(ids["world_bank"].to_numpy(), index=ids["obesity"].to_numpy())
+    return countries.map(names).fillna(countries.where(countries.isin(known)))
+
+
+def row_indexer(index_rows, rows):
+    """Return the Position of Each Row in Other Rows, by Country, Year and Sex
+
+    Args:
+        index_rows ([pd.DataFrame]): the rows to look up, without duplicates
+        rows ([pd.DataFrame]): the rows looked up
+
+    Returns:
+        [np.ndarray]: the position of each of rows in index_rows, -1 if absent
+    """
+    index = pd.MultiIndex.from_arrays(
+        [np.asarray(index_rows[col], dtype=object) for col in keys]
+    )
+    return index.get_indexer(
+        pd.MultiIndex.from_arrays([np.asarray(rows[col], dtype=object) for col in keys])
+    )
+
+
+def obese_counts(data, rates):
+    """Computes the Number of Obese People in Each Row of the Indicators
+
+    Args:
+        data ([pd.DataFrame]): the indicators, with country, year, sex and pop
+        rates ([pd.DataFrame]): the obesity rates, with World Bank country names
+
+    Returns:
+        [tuple]: the rate times the population of each row, NaN where the rate
+                 is unknown, and whether the raw file holds an estimate for
+                 the row
+    """
+    rates = rates.dropna().drop_duplicates(keys)
+    rows = row_indexer(rates, data)
+    estimated = rows >= 0
+    rate = np.where(estimated, rates["rate"].to_numpy()[rows], np.nan)
+    return rate * data["pop"].to_numpy(dtype=float), estimated
+
+
+def merge_indicators(data, indicators):
+    """Updates and Appends the Rows of an Indicators CSV
+
+    Args:
+        data ([pd.DataFrame]): the processed data
+        indicators ([pd.DataFrame]): indicators keyed by country, year and
+            sex, holding any of the columns of the data but "obese"
+
+    Returns:
+        [tuple]: the data with the indicators of its rows updated where the
+                 indicators CSV holds a value and its new rows appended,
+                 sorted by country, year and sex (the rows of the data keep
+                 their order), and the number of rows left out as they have
+                 no population
+    """
+    cols = [col for col in indicators.columns if col in data and col != "obese"]
+    indicators = indicators[cols].drop_duplicates(keys, keep="last")
+    rows = row_indexer(data, indicators)
+    data = data.copy()
+    for col in set(cols) - set(keys):
+        known = (rows >= 0) & indicators[col].notna().to_numpy()
+        data.loc[data.index[rows[known]], col] = indicators[col].to_numpy()[known]
+
+    new = indicators[rows < 0].reindex(columns=data.columns)
+    skipped = int(new["pop"].isna().sum())
+    new = new[new["pop"].notna()]
+    last = data.drop_duplicates("country", keep="last").set_index("country")
+    for col in country_cols:
+        new[col] = new[col].fillna(new["country"].map(last[col]))
+    new = new.assign(order=new["sex"].map({"Male": 0, "Female": 1}))
+    new = new.sort_values(["country", "year", "order"]).drop(columns="order")
+    merged = pd.concat([data, new], ignore_index=True)
+    return merged.astype(data.dtypes.to_dict()), skipped
+
+
+def write_csv(data, csv, rewrite):
+    """Writes the Processed CSV Atomically, Keeping the Text of Unchanged Rows
+
+    Args:
+        data ([pd.DataFrame]): the processed data, the rows of the CSV first
+        csv ([str]): path of the processed CSV
+        rewrite ([np.ndarray]): whether each row of the CSV is written anew
+    """
+    with open(csv, newline="") as f:
+        lines = f.readlines()
+    new = rewrite.nonzero()[0].tolist() + list(range(len(rewrite), len(data)))
+    rows = data.iloc[new].copy()
+    # whole numbers were written without a decimal point
+    for col in rows.columns[rows.dtypes == float]:
+        rows[col] = (
+            rows[col].astype(str).str.removesuffix(".0").where(rows[col].notna())
+        )
+    text = rows.to_csv(index=False, header=False, na_rep="NA")
+    for row, line in zip(new, text.splitlines(keepends=True)):
+        if row < len(rewrite):
+            lines[row + 1] = line
+        else:
+            lines.append(line)
+    tmp = "{}.{}".format(csv, os.getpid())
+    with open(tmp, "w", newline="") as f:
+        f.writelines(lines)
+    os.replace(tmp, csv)
+
+
+def ingest(
+    raw=raw_file, csv=store.csv_file, path=store.store_dir, full=False, indicators=None
+):
+
+    """Updates the Processed CSV and the Columnar Store From the Raw Estimates
+
+    Args:
+        raw ([str]): path of the raw WHO CSV
+        csv ([str]): path of the processed CSV, whose indicators are kept
+        path ([str]): directory of the columnar store
+        full ([bool]): rebuild every column of the store
+        indicators ([str]): path of a CSV of indicators updating and adding
+            rows of the processed CSV
+
+    Returns:
+        [dict]: counts of the rows with an obesity rate, of the rows whose
+                rate changed, of the rows added, of the estimates and
+                indicator rows left out (unknown country, no indicator row or
+                no population) and of the WHO countries left out
+    """
+    data = pd.read_csv(csv, float_precision="round_trip")
+    rows = len(data)
+    updated = np.zeros(rows, dtype=bool)
+    skipped = 0
+    if indicators:
+        before = data
+        data, skipped = merge_indicators(
+            data, pd.read_csv(indicators, float_precision="round_trip")
+        )
+        head = data.head(rows)
+        updated = ~(head.eq(before) | (head.isna() & before.isna())).all(axis=1)
+        updated = updated.to_numpy()
+    rates = parse_rates(raw)
+    who = rates["country"]
+    rates["country"] = world_bank_names(who, data["country"].unique())
+    obese, estimated = obese_counts(data, rates)
+
+    # estimates of no row of the indicators
+    skipped += int((rates["rate"].notna() & (row_indexer(data, rates) < 0)).sum())
+
+    # beyond the precision of the CSV, a rate has not changed; the rows
+    # without an estimate keep theirs
+    old = data["obese"].to_numpy(dtype=float)
+    changed = estimated & ~np.isclose(obese, old, rtol=1e-12, atol=0, equal_nan=True)
+    data.loc[changed, "obese"] = obese[changed]
+    if changed.any() or updated.any() or len(data) > rows:
+        write_csv(data, csv, changed[:rows] | updated)
+
+    # the rows of the store are those of the CSV without the aggregates
+    stored = store.drop_aggregates(data)
+    if full or not store.matches(stored, path, skip=["obese"]):
+        store.build(csv, path)
+    elif changed.any():
+        store.write_column(path, "obese", stored["obese"].to_numpy())
+
+    return {
+        "rows": int(np.isfinite(data["obese"].to_numpy(dtype=float)).sum()),
+        "changed": int(changed.sum()),
+        "added": len(data) - rows,
+        "skipped": skipped,
+        "unknown countries": int(who[rates["country"].isna()].nunique()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest the WHO estimates.")
+    parser.add_argument("--raw", default=raw_file, help="raw WHO CSV")
+    parser.add_argument("--csv", default=store.csv_file, help="processed CSV")
+    parser.add_argument("--store", default=store.store_dir, help="store directory")
+    parser.add_argument(
+        "--indicators", help="CSV of indicators updating and adding rows"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="rebuild every column of the store"
+    )
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    counts = ingest(args.raw, args.csv, args.store, args.full, args.indicators)
+    print(
+        ", ".join("{} {}".format(n, name) for name, n in counts.items()),
+        "in {:.2f} s".format(time.time() - start),
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,672 @@
+# load tests of the chart callbacks against a locally launched dashboard
+#
+# Usage (from the repository root):
+#   python src/loadtest.py --configs 1x1 2x4 4x8 --users 1 4 16 --duration 30
+#   python src/loadtest.py --url http://127.0.0.1:8050 --sessions recorded.jsonl
+#
+# Each configuration (workers x threads) starts gunicorn as in the Procfile,
+# with the OBESITY_* settings of the environment, and virtual users are added
+# to it in stages. A user loads the page, which fires the chart callbacks, then
+# replays a session of input changes: a dropdown change waits for the charts,
+# then the user thinks a while; a drag of a year slider fires a callback every
+# few tens of milliseconds without waiting, as the browser does. Sessions are
+# synthetic, or recorded as JSON lines, each holding the new values of the
+# inputs that change (by component id), and optionally the "think" seconds
+# before the next line and "wait": false for the steps of a drag.
+#
+# Latency percentiles are those of the charts served (200), superseded
+# requests (204) are counted apart, and the memory is the peak over the stage
+# of the largest worker RSS and of the PSS of all the server processes, which
+# counts the pages the workers share once.
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+# seconds a starting server has to answer its first page
+start_timeout = 180
+
+# seconds a callback request may take before it counts as an error
+request_timeout = 60
+
+# headers of the callback requests, as sent by the browser
+headers = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "Accept-Encoding": "br, gzip",
+}
+
+# relative frequency of each kind of user action in synthetic sessions
+action_weights = {
+    "year": 0.35,
+    "year_range": 0.1,
+    "sex": 0.1,
+    "region": 0.1,
+    "income": 0.1,
+    "highlight_country": 0.05,
+    "regressor": 0.1,
+    "grouper": 0.1,
+}
+
+
+def parse_config(text):
+    """Return the Workers and Threads of a Configuration Written as 4x8"""
+    workers, threads = text.lower().split("x")
+    return int(workers), int(threads)
+
+
+def free_port():
+    """Return a Local TCP Port No Process Listens On"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Connections:
+    """Keep-Alive Connections to the Server, One per Request in Flight
+
+    Args:
+        url ([str]): the base url of the server
+    """
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.free = []
+        self.lock = threading.Lock()
+
+    def request(self, method, path, body=None, encoding=headers["Accept-Encoding"]):
+        """Send a Request, by Default Accepting the Encodings of the Browser
+
+        Like the browser, a request that fails on a kept-alive connection the
+        server has since closed is sent again on a new connection.
+
+        Returns:
+            [tuple]: the status and body of the response
+        """
+        with self.lock:
+            conn = self.free.pop() if self.free else None
+        while True:
+            reused = conn is not None
+            if not reused:
+                conn = http.client.HTTPConnection(
+                    self.host, self.port, timeout=request_timeout
+                )
+            try:
+                conn.request(
+                    method,
+                    self.prefix + path,
+                    body,
+                    dict(headers, **{"Accept-Encoding": encoding}),
+                )
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                if not reused:
+                    raise
+                conn = None
+            except Exception:
+                conn.close()
+                raise
+        with self.lock:
+            self.free.append(conn)
+        return response.status, data
+
+    def get_json(self, path):
+        """Return the Decoded JSON Response to a GET Request"""
+        status, data = self.request("GET", path, encoding="identity")
+        if status != 200:
+            raise RuntimeError("GET {} answered {}".format(path, status))
+        return json.loads(data)
+
+    def close(self):
+        with self.lock:
+            for conn in self.free:
+                conn.close()
+            self.free = []
+
+
+def layout_props(layout, props=None):
+    """Collects the Properties of the Layout Components, by (id, property)"""
+    props = {} if props is None else props
+    if isinstance(layout, list):
+        for item in layout:
+            layout_props(item, props)
+    elif isinstance(layout, dict):
+        attrs = layout.get("props", {})
+        if "id" in attrs:
+            for name, value in attrs.items():
+                props[attrs["id"], name] = value
+        layout_props(attrs.get("children"), props)
+    return props
+
+
+def chart_callbacks(dependencies):
+    """Return the Server Callbacks the Inputs Fire, With Their Outputs Parsed
+
+    The callbacks of buttons, such as the year playback, are left out.
+    """
+    callbacks = []
+    for callback in dependencies:
+        clicked = any(dep["property"] == "n_clicks" for dep in callback["inputs"])
+        if callback.get("clientside_function") or clicked:
+            continue
+        output = callback["output"]
+        if output.startswith(".."):
+            outputs = [
+                dict(zip(["id", "property"], out.split(".")))
+                for out in output[2:-2].split("...")
+            ]
+        else:
+            outputs = dict(zip(["id", "property"], output.split(".")))
+        callbacks.append(dict(callback, outputs=outputs))
+    return callbacks
+
+
+def callback_body(callback, values, changed):
+    """Return the JSON Body of a Callback Request
+
+    Args:
+        callback ([dict]): the callback, as returned by chart_callbacks
+        values ([dict]): the current property values, by (id, property)
+        changed ([list]): the (id, property) that fired the callback
+
+    Returns:
+        [bytes]: the body posted by the browser to /_dash-update-component
+    """
+
+    def with_values(deps):
+        return [
+            dict(dep, value=values.get((dep["id"], dep["property"]))) for dep in deps
+        ]
+
+    return json.dumps(
+        {
+            "output": callback["output"],
+            "outputs": callback["outputs"],
+            "inputs": with_values(callback["inputs"]),
+            "state": with_values(callback["state"]),
+            "changedPropIds": ["{}.{}".format(*key) for key in changed],
+        }
+    ).encode()
+
+
+def synthetic_session(props, rng, think, drag_interval):
+    """Yields the Steps of an Endless Random Session
+
+    Args:
+        props ([dict]): the properties of the layout, see layout_props
+        rng ([np.random.Generator]): the random generator of the user
+        think ([float]): the mean think time between actions (seconds)
+        drag_interval ([float]): the time between the steps of a drag (seconds)
+
+    Yields:
+        [dict]: the new value of each changed input by id, "think" seconds
+                and "wait" for the responses before thinking
+    """
+
+    def options(name):
+        return [option["value"] for option in props["input_" + name, "options"]]
+
+    def subset(values, largest):
+        n = rng.integers(1, max(1, min(largest, len(values))) + 1)
+        return [values[i] for i in sorted(rng.choice(len(values), n, replace=False))]
+
+    first, last = props["input_year", "min"], props["input_year", "max"]
+    year = props["input_year", "value"]
+    year_range = list(props["input_year_range", "value"])
+    kinds = list(action_weights)
+    weights = np.array(list(action_weights.values()))
+    while True:
+        kind = kinds[rng.choice(len(kinds), p=weights / weights.sum())]
+        pause = float(rng.gamma(2, think / 2))
+        if kind in ["year", "year_range"]:
+            # a drag walks the slider a year at a time to where it is released
+            start = year if kind == "year" else year_range[0]
+            end = int(
+                rng.integers(first, (last if kind == "year" else year_range[1]) + 1)
+            )
+            step = 1 if end >= start else -1
+            path = list(range(start + step, end + step, step)) or [start]
+            for i, value in enumerate(path):
+                done = i == len(path) - 1
+                if kind == "year":
+                    year = value
+                    change = {"input_year": value}
+                else:
+                    year_range = [value, year_range[1]]
+                    change = {"input_year_range": list(year_range)}
+                yield dict(change, think=pause if done else drag_interval, wait=done)
+        elif kind in ["region", "income"]:
+            values = options(kind)
+            value = values if rng.random() < 0.3 else subset(values, len(values) - 1)
+            yield {"input_" + kind: value, "think": pause, "wait": True}
+        elif kind == "highlight_country":
+            value = subset(options(kind), 3)
+            yield {"input_" + kind: value, "think": pause, "wait": True}
+        else:
+            value = options(kind)[rng.integers(len(options(kind)))]
+            yield {"input_" + kind: value, "think": pause, "wait": True}
+
+
+def recorded_session(steps, think):
+    """Yields the Recorded Steps Over and Over, Thinking by Default Between Them"""
+    while True:
+        for step in steps:
+            yield dict({"think": think, "wait": True}, **step)
+
+
+class Results:
+    """The Outcome of Each Callback Request, Tagged With the Load Stage"""
+
+    def __init__(self):
+        self.stage = None
+        self.records = []
+        self.lock = threading.Lock()
+
+    def add(self, latency, status, nbytes):
+        with self.lock:
+            self.records.append((self.stage, latency, status, nbytes))
+
+    def summary(self, stage, duration):
+        """Return the Throughput, Latency and Error Rate of a Stage
+
+        Args:
+            stage ([int]): the number of users of the stage
+            duration ([float]): the length of the stage (seconds)
+
+        Returns:
+            [dict]: the request counts, the responses per second, the latency
+                    percentiles of the charts served (ms) and the error rate
+        """
+        with self.lock:
+            records = [r for r in self.records if r[0] == stage]
+        status = np.array([r[2] for r in records])
+        served = np.array([r[1] for r in records if r[2] == 200]) * 1000
+        errors = int(np.sum((status != 200) & (status != 204)))
+        p50, p95, p99 = (
+            np.percentile(served, [50, 95, 99]) if len(served) else [np.nan] * 3
+        )
+        return {
+            "requests": len(records),
+            "served": len(served),
+            "superseded": int(np.sum(status == 204)),
+            "errors": errors,
+            "error_rate": round(errors / max(len(records), 1), 4),
+            "rps": round((len(records) - errors) / duration, 2),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "kib": round(float(np.mean([r[3] for r in records] or [0])) / 1024, 1),
+        }
+
+
+class VirtualUser(threading.Thread):
+    """A Browser Session Replaying Steps Against the Chart Callbacks
+
+    Args:
+        url ([str]): the base url of the server
+        callbacks ([list]): the callbacks fired by the inputs, see chart_callbacks
+        session ([function]): called with the layout properties and a random
+            generator, returns the steps to replay
+        results ([Results]): where the outcome of each request goes
+        stop ([threading.Event]): set to end the session
+        seed ([int]): the seed of the random generator of the user
+        delay ([float]): seconds to wait before loading the page
+    """
+
+    def __init__(self, url, callbacks, session, results, stop, seed, delay):
+        super().__init__(daemon=True)
+        self.connections = Connections(url)
+        self.callbacks = callbacks
+        self.session = session
+        self.results = results
+        self.stop = stop
+        self.rng = np.random.default_rng(seed)
+        self.delay = delay
+        self.pending = []
+
+    def fire(self, values, changed):
+        """Posts the Callbacks Fired by a Change, Each From its Own Thread"""
+        for callback in self.callbacks:
+            fired = [(dep["id"], dep["property"]) for dep in callback["inputs"]]
+            if changed and not set(fired) & set(changed):
+                continue
+            body = callback_body(callback, values, changed)
+            thread = threading.Thread(target=self.post, args=(body,), daemon=True)
+            thread.start()
+            self.pending.append(thread)
+
+    def post(self, body):
+        start = time.perf_counter()
+        try:
+            status, data = self.connections.request(
+                "POST", "/_dash-update-component", body
+            )
+        except Exception:
+            status, data = 0, b""
+        self.results.add(time.perf_counter() - start, status, len(data))
+
+    def wait(self):
+        """Waits for the Responses to the Requests in Flight"""
+        for thread in self.pending:
+            thread.join()
+        self.pending = []
+
+    def run(self):
+        if self.stop.wait(self.delay):
+            return
+        try:
+            props = layout_props(self.connections.get_json("/_dash-layout"))
+        except Exception:
+            self.results.add(0, 0, 0)
+            return
+        # the page fires every callback when it loads
+        self.fire(props, [])
+        self.wait()
+        for step in self.session(props, self.rng):
+            if self.stop.is_set():
+                break
+            changed = [(id, "value") for id in step if id not in ["think", "wait"]]
+            for key in changed:
+                props[key] = step[key[0]]
+            self.fire(props, changed)
+            if step["wait"]:
+                self.wait()
+            if self.stop.wait(step["think"]):
+                break
+        self.wait()
+        self.connections.close()
+
+
+def server_pids(pid):
+    """Return the pid of a Process and of its Children, Read From /proc"""
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                # the parent pid follows the parenthesized command name
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def memory_kib(pid, field):
+    """Return a Memory Field of /proc/<pid>/smaps_rollup (KiB), 0 if Unknown"""
+    try:
+        with open("/proc/{}/smaps_rollup".format(pid)) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the Memory of a Server Every Second, Keeping the Peaks
+
+    Args:
+        pid ([int]): the pid of the gunicorn master
+    """
+
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.stopped = threading.Event()
+        self.reset()
+
+    def reset(self):
+        self.rss_kib, self.pss_kib = 0, 0
+
+    def sample(self):
+        pids = server_pids(self.pid)
+        workers = [memory_kib(pid, "Rss") for pid in pids[1:]]
+        self.rss_kib = max([self.rss_kib] + workers)
+        self.pss_kib = max(self.pss_kib, sum(memory_kib(pid, "Pss") for pid in pids))
+
+    def run(self):
+        while not self.stopped.wait(1):
+            self.sample()
+
+    def peaks(self):
+        """Return the Peak Worker RSS and Server PSS Since the Last Reset (MiB)"""
+        self.sample()
+        peaks = {
+            "worker_rss_mib": round(self.rss_kib / 1024, 1),
+            "server_pss_mib": round(self.pss_kib / 1024, 1),
+        }
+        self.reset()
+        return peaks
+
+
+def start_server(workers, threads, port, log):
+    """Starts gunicorn as in the Procfile, Returning Once it Serves the Page
+
+    Args:
+        workers ([int]): the number of worker processes
+        threads ([int]): the number of threads of each worker
+        port ([int]): the local port to listen on
+        log ([file]): where the server output goes
+
+    Returns:
+        [subprocess.Popen]: the gunicorn master
+    """
+    process = subprocess.Popen(
+        [
+            "gunicorn",
+            "src.app:server",
+            "--pythonpath=./src",
+            "--config",
+            "gunicorn.conf.py",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+            "--timeout",
+            str(request_timeout),
+            "--bind",
+            "127.0.0.1:{}".format(port),
+        ],
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    connections = Connections("http://127.0.0.1:{}".format(port))
+    deadline = time.time() + start_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if connections.request("GET", "/")[0] == 200:
+                connections.close()
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    stop_server(process)
+    log.seek(0)
+    raise RuntimeError("the server did not start:\n" + log.read().decode()[-2000:])
+
+
+def stop_server(process):
+    """Stops gunicorn Gracefully, Killing it if it Does Not Exit"""
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_stages(url, session, stages, duration, ramp, seed, sampler=None):
+    """Adds Virtual Users in Stages and Summarizes the Load of Each
+
+    Args:
+        url ([str]): the base url of the server
+        session ([function]): the session of the users, see VirtualUser
+        stages ([list]): the number of users of each stage, increasing
+        duration ([float]): the length of each stage (seconds)
+        ramp ([float]): the seconds over which the users of a stage are added
+        seed ([int]): the seed of the first user, the next ones counting up
+        sampler ([MemorySampler]): the memory of the server, if launched
+
+    Returns:
+        [list]: the summary of each stage, see Results.summary
+    """
+    connections = Connections(url)
+    callbacks = chart_callbacks(connections.get_json("/_dash-dependencies"))
+    connections.close()
+
+    results, stop, users, summaries = Results(), threading.Event(), [], []
+    for n in stages:
+        results.stage = n
+        new = n - len(users)
+        for i in range(new):
+            user = VirtualUser(
+                url,
+                callbacks,
+                session,
+                results,
+                stop,
+                seed + len(users),
+                ramp * i / max(new, 1),
+            )
+            user.start()
+            users.append(user)
+        if sampler:
+            sampler.reset()
+        time.sleep(duration)
+        summary = dict(users=n, **results.summary(n, duration))
+        if sampler:
+            summary.update(sampler.peaks())
+        summaries.append(summary)
+        print(
+            "  {users:>4} users  {rps:>7.2f} req/s  p50 {p50_ms:>8.1f} ms"
+            "  p95 {p95_ms:>8.1f} ms  p99 {p99_ms:>8.1f} ms  errors {error_rate:>6.1%}"
+            "  superseded {superseded:>5}".format(**summary)
+            + (
+                "  worker rss {worker_rss_mib:>7.1f} MiB"
+                "  server pss {server_pss_mib:>7.1f} MiB".format(**summary)
+                if sampler
+                else ""
+            )
+        )
+    stop.set()
+    for user in users:
+        user.join(request_timeout)
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the dashboard.")
+    parser.add_argument(
+        "--configs",
+        nargs="*",
+        default=["1x1", "2x4"],
+        help="gunicorn workers x threads to launch, e.g. 4x8",
+    )
+    parser.add_argument("--url", help="test a running server instead of launching")
+    parser.add_argument(
+        "--users",
+        type=int,
+        nargs="*",
+        default=[1, 4, 16],
+        help="concurrent users of each stage",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="seconds of each stage"
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=5, help="seconds over which users are added"
+    )
+    parser.add_argument(
+        "--think", type=float, default=3, help="mean seconds between user actions"
+    )
+    parser.add_argument(
+        "--drag-interval",
+        type=float,
+        default=0.08,
+        help="seconds between the callbacks of a slider drag",
+    )
+    parser.add_argument("--sessions", help="JSON lines of recorded session steps")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first user")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.sessions:
+        with open(args.sessions) as f:
+            steps = [json.loads(line) for line in f if line.strip()]
+
+        def session(props, rng):
+            return recorded_session(steps, args.think)
+
+    else:
+
+        def session(props, rng):
+            return synthetic_session(props, rng, args.think, args.drag_interval)
+
+    stages = sorted(set(args.users))
+    results = {}
+    if args.url:
+        print(args.url)
+        results[args.url] = run_stages(
+            args.url, session, stages, args.duration, args.ramp, args.seed
+        )
+    for config in [] if args.url else args.configs:
+        workers, threads = parse_config(config)
+        port = free_port()
+        print("{} workers x {} threads".format(workers, threads))
+        with tempfile.TemporaryFile() as log:
+            process = start_server(workers, threads, port, log)
+            sampler = MemorySampler(process.pid)
+            sampler.start()
+            try:
+                results[config] = run_stages(
+                    "http://127.0.0.1:{}".format(port),
+                    session,
+                    stages,
+                    args.duration,
+                    args.ramp,
+                    args.seed,
+                    sampler,
+                )
+            finally:
+                sampler.stopped.set()
+                stop_server(process)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "env": {
+                        k: v for k, v in os.environ.items() if k.startswith("OBESITY_")
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    failed = any(stage["errors"] for stages in results.values() for stage in stages)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
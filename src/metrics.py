@@ -0,0 +1,148 @@
+# timing instrumentation of the plot callbacks, in Prometheus text format
+#
+# Each gunicorn worker keeps metrics of its own, and a scrape of /metrics is
+# answered by whichever worker takes it, so successive scrapes may see
+# different workers: the counters then seem to jump or reset, and the numbers
+# of a box are only exact when it runs a single worker
+
+import contextlib
+import cProfile
+import os
+import random
+import threading
+import time
+
+import config
+
+
+class Histogram:
+    """A Prometheus-Style Histogram With Labels
+
+    Args:
+        name ([str]): the metric name
+        help ([str]): the metric description
+        buckets ([list]): the upper bounds of the buckets, in increasing order
+    """
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record a Value Under the Given Labels"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(
+                key, {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["count"] += 1
+            series["sum"] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Context Manager Recording its Wall Time in Seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        """Return the Histogram in the Prometheus Text Exposition Format"""
+        lines = [
+            "# HELP {} {}".format(self.name, self.help),
+            "# TYPE {} histogram".format(self.name),
+        ]
+        with self._lock:
+            series = sorted(
+                (k, dict(v, buckets=list(v["buckets"])))
+                for k, v in self._series.items()
+            )
+        for key, values in series:
+            labels = "".join('{}="{}",'.format(k, v) for k, v in key)
+            bounds = [str(b) for b in self.buckets] + ["+Inf"]
+            counts = values["buckets"] + [values["count"]]
+            for bound, n in zip(bounds, counts):
+                lines.append(
+                    '{}_bucket{{{}le="{}"}} {}'.format(self.name, labels, bound, n)
+                )
+            labels = labels.rstrip(",")
+            lines.append("{}_sum{{{}}} {}".format(self.name, labels, values["sum"]))
+            lines.append("{}_count{{{}}} {}".format(self.name, labels, values["count"]))
+        return lines
+
+
+# wall time of each stage of the plot callbacks
+stage_seconds = Histogram(
+    "obesity_stage_seconds",
+    "Wall time of each stage of the plot callbacks, in seconds.",
+    [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+
+# size of the chart html returned by the plot callbacks
+payload_bytes = Histogram(
+    "obesity_payload_bytes",
+    "Size of the chart html returned by the plot callbacks, in bytes.",
+    [2**10, 2**12, 2**14, 2**16, 2**18, 2**20, 2**22],
+)
+
+
+def gauge(name, help, value):
+    """Return a Gauge in the Prometheus Text Exposition Format"""
+    return [
+        "# HELP {} {}".format(name, help),
+        "# TYPE {} gauge".format(name),
+        "{} {}".format(name, value),
+    ]
+
+
+def counter(name, help, value):
+    """Return a Counter in the Prometheus Text Exposition Format"""
+    return [
+        "# HELP {}_total {}".format(name, help),
+        "# TYPE {}_total counter".format(name),
+        "{}_total {}".format(name, value),
+    ]
+
+
+def render(*extra):
+    """Return the Exposition of All Metrics, Followed by Any Extra Lines"""
+    lines = stage_seconds.render() + payload_bytes.render()
+    for more in extra:
+        lines += more
+    return "\n".join(lines) + "\n"
+
+
+@contextlib.contextmanager
+def profiled(name):
+    """Context Manager Profiling a Sample of the Calls With cProfile
+
+    A share of config.profile_rate of the calls is profiled, each writing its
+    stats to a file in config.profile_dir that can be read with pstats or
+    snakeviz.
+
+    Args:
+        name ([str]): the name of the profiled callback, used in file names
+    """
+    if config.profile_rate <= 0 or random.random() >= config.profile_rate:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(config.profile_dir, exist_ok=True)
+        profiler.dump_stats(
+            os.path.join(
+                config.profile_dir,
+                "{}-{}-{}.prof".format(name, os.getpid(), time.time_ns()),
+            )
+        )
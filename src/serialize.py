@@ -0,0 +1,144 @@
+# compact JSON encoding of the chart data, column by column
+
+import contextlib
+import json
+import threading
+
+import altair as alt
+import numpy as np
+import pandas as pd
+from altair.vegalite.data import default_data_transformer
+
+# decimals kept of the rates, well below the 0.1% precision shown by the charts
+digits = 4
+
+# the data transformer of the charts each thread renders, see rendering
+_rendering = threading.local()
+
+
+def encode_column(values):
+    """Return the JSON Text of Each Value of a Column
+
+    Args:
+        values ([pd.Series]): the column
+
+    Returns:
+        [np.ndarray]: an object array holding the JSON text of each value,
+                      "null" for the missing ones
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # each category is encoded once, missing values having the code -1
+        labels = [json.dumps(str(c)) for c in values.cat.categories] + ["null"]
+        return np.array(labels, dtype=object)[values.cat.codes.to_numpy()]
+    if pd.api.types.is_bool_dtype(values.dtype):
+        return np.where(values.to_numpy(), "true", "false").astype(object)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy().astype(str).astype(object)
+    if pd.api.types.is_float_dtype(values.dtype):
+        numbers = np.round(values.to_numpy(dtype=float), digits)
+        text = numbers.astype(str).astype(object)
+        text[~np.isfinite(numbers)] = "null"
+        return text
+    return np.array(
+        [json.dumps(None if pd.isna(v) else str(v)) for v in values], dtype=object
+    )
+
+
+def to_json(df):
+    """Encode a Data Frame as the JSON Records of a Vega-Lite Dataset
+
+    The columns are encoded as whole arrays and the records assembled from
+    them, rather than converting and sanitizing the values one by one.
+
+    Args:
+        df ([pd.DataFrame]): the data, whose index is left out
+
+    Returns:
+        [str]: the JSON array of the records
+    """
+    if df.empty:
+        return "[]"
+    rows = "{"
+    for i, name in enumerate(df.columns):
+        key = ("" if i == 0 else ",") + json.dumps(str(name)) + ":"
+        rows = rows + key + encode_column(df[name])
+    return "[" + ",".join(rows + "}") + "]"
+
+
+def wrap(body):
+    """Return the Placeholder String Standing for Encoded Data in a Spec"""
+    return "\x00" + body + "\x00"
+
+
+def unwrap(value):
+    """Return the Encoded Data a Placeholder String Stands For"""
+    return value.strip("\x00")
+
+
+def splice(text):
+    """Replaces the Placeholder Strings of a JSON Text by the Encoded Data
+
+    Args:
+        text ([str]): JSON text, or a document embedding it, in which the
+                      placeholder strings are escaped string literals
+
+    Returns:
+        [str]: the text with the data in place of the placeholders
+    """
+    start, end = '"\\u0000', '\\u0000"'
+    parts, last = [], 0
+    i = text.find(start)
+    while i >= 0:
+        j = text.index(end, i) + len(end)
+        parts += [text[last:i], unwrap(json.loads(text[i:j]))]
+        last = j
+        i = text.find(start, j)
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def to_inline_json(data):
+    """Altair Data Transformer Inlining Data Through the Column Encoder
+
+    The data is held by a placeholder string until the spec is rendered and
+    its placeholders spliced.
+
+    Args:
+        data ([pd.DataFrame]): the data of a chart
+
+    Returns:
+        [dict]: a Vega-Lite inline data model
+    """
+    return {"values": wrap(to_json(data))}
+
+
+@contextlib.contextmanager
+def rendering(transformer=to_inline_json):
+    """Context Manager Encoding the Data of the Charts the Current Thread Renders
+
+    Within it, the charts the current thread converts to a spec or html have
+    their data encoded by a transformer, by default to_inline_json, whose
+    placeholders are then to be spliced. The other threads, and the calls
+    outside it, inline the data as Altair does.
+
+    Args:
+        transformer ([function]): the Altair data transformer to apply
+    """
+    previous = getattr(_rendering, "transformer", None)
+    _rendering.transformer = transformer
+    try:
+        yield
+    finally:
+        _rendering.transformer = previous
+
+
+def to_rendered(data):
+    """Altair Data Transformer Applying the One of the Current Thread, see rendering"""
+    transformer = getattr(_rendering, "transformer", None)
+    if transformer is None:
+        return default_data_transformer(data, max_rows=None)
+    return transformer(data)
+
+
+alt.data_transformers.register("inline_json", to_inline_json)
+alt.data_transformers.register("rendering", to_rendered)
@@ -0,0 +1,196 @@
+# columnar binary store of the processed obesity data
+
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# processed obesity data and the columnar store built from it
+csv_file = "data/processed/obesity-combo.csv"
+store_dir = "data/processed/obesity-combo"
+
+# text columns, stored as categorical codes
+categorical_cols = [
+    "country",
+    "sex",
+    "iso2c",
+    "iso3c",
+    "region",
+    "capital",
+    "income",
+    "lending",
+    "none",
+]
+
+
+def drop_aggregates(df):
+    """Return the Obesity Data Without the "Aggregates" Region"""
+    return df[df["region"] != "Aggregates"].reset_index(drop=True)
+
+
+def build(csv=csv_file, out=store_dir):
+    """Converts the Processed CSV Into the Columnar Store
+
+    Each column is written as a NumPy array file; text columns are written
+    as integer category codes, with their categories kept in meta.json.
+    The "Aggregates" region is dropped so that the store can be memory-mapped
+    as is.
+
+    Args:
+        csv ([str]): path of the processed obesity CSV
+        out ([str]): path of the store, a link to its current version
+    """
+    # parse floats exactly, so that the columns ingest.py updates in place
+    # match a full build
+    df = drop_aggregates(pd.read_csv(csv, float_precision="round_trip"))
+
+    # write a new version of the store and point the store path at it, so
+    # that processes which have the current version memory-mapped never see
+    # a file being rewritten, and loads never find the store missing
+    version = "{}.v{}-{}".format(out, time.time_ns(), os.getpid())
+    os.makedirs(version)
+    meta = {"columns": list(df.columns), "categories": {}}
+    for col in df.columns:
+        values = df[col]
+        if col in categorical_cols:
+            cat = pd.Categorical(values)
+            meta["categories"][col] = [str(c) for c in cat.categories]
+            values = cat.codes
+        np.save(os.path.join(version, col + ".npy"), np.asarray(values))
+    with open(os.path.join(version, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    swap(version, out)
+
+
+def swap(version, out):
+    """Points the Store Path at a Version of the Store, Atomically
+
+    The store path is a symbolic link, replaced in one rename. The previous
+    version is kept for the loads that resolved the link before the swap;
+    older versions are removed.
+
+    Args:
+        version ([str]): directory of the new version of the store
+        out ([str]): path of the store
+    """
+    if os.path.isdir(out) and not os.path.islink(out):
+        # a store built before the versions, replaced once
+        shutil.rmtree(out)
+    link = "{}.link-{}".format(out, os.getpid())
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, out)
+    current = os.path.join(os.path.dirname(out), os.readlink(out))
+    versions = sorted(glob.glob(glob.escape(out) + ".v*"))
+    for old in versions[:-2]:
+        if old != current:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def write_column(path, col, values):
+    """Replaces the File of a Numeric Column of the Store
+
+    The new file is written aside and renamed over the old one, so processes
+    which have the old file memory-mapped keep reading it; meta.json is
+    touched so that the store is not older than the CSV it was updated from.
+
+    Args:
+        path ([str]): directory of the store
+        col ([str]): the column
+        values ([np.ndarray]): the new values of the column
+    """
+    tmp = os.path.join(path, "{}.{}.npy".format(col, os.getpid()))
+    np.save(tmp, np.asarray(values))
+    os.replace(tmp, os.path.join(path, col + ".npy"))
+    os.utime(os.path.join(path, "meta.json"))
+
+
+def load(path=store_dir, mmap_mode="r"):
+    """Reads the Columnar Store
+
+    By default the column files are memory-mapped read-only, so that the
+    processes serving the dashboard share the pages of one copy of the data
+    rather than each materializing their own.
+
+    Args:
+        path ([str]): directory of the store
+        mmap_mode ([str]): memory-map mode passed to np.load, or None to read
+            the columns into memory
+
+    Returns:
+        [pd.DataFrame]: The obesity dataset, with categorical text columns.
+    """
+    # read every file from the same version, should the store be swapped
+    path = os.path.realpath(path)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {}
+    for col in meta["columns"]:
+        values = np.load(os.path.join(path, col + ".npy"), mmap_mode=mmap_mode)
+        if col in meta["categories"]:
+            # the codes were written from a categorical of these categories,
+            # so checking them would only read every page of the file
+            values = pd.Categorical.from_codes(
+                values, meta["categories"][col], validate=False
+            )
+        columns[col] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def is_stale(csv=csv_file, path=store_dir):
+    """Return True if the Store is Missing or Older Than the CSV"""
+    meta = os.path.join(path, "meta.json")
+    return not os.path.exists(meta) or os.path.getmtime(meta) < os.path.getmtime(csv)
+
+
+def matches(df, path=store_dir, skip=()):
+    """Return True if the Store Holds the Same Rows and Columns as a Data Frame
+
+    Args:
+        df ([pd.DataFrame]): the data, without the "Aggregates" region
+        path ([str]): directory of the store
+        skip ([list]): columns whose values are not compared
+
+    Returns:
+        [bool]: whether the store exists and holds the data
+    """
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return False
+    current = load(path)
+    if list(current.columns) != list(df.columns) or len(current) != len(df):
+        return False
+    return all(
+        current[col].astype(str).equals(df[col].astype(str))
+        for col in df.columns
+        if col not in skip
+    )
+
+
+def load_obesity(csv=csv_file, path=store_dir):
+    """Loads the Obesity Data Used by the Dashboard
+
+    The columnar store is (re)built from the CSV when it is missing or stale.
+    Should the store not be writable, the CSV is read directly instead.
+
+    Args:
+        csv ([str]): path of the processed obesity CSV
+        path ([str]): directory of the columnar store
+
+    Returns:
+        [pd.DataFrame]: The obesity dataset without the "Aggregates" region.
+    """
+    try:
+        if is_stale(csv, path):
+            build(csv, path)
+        return load(path)
+    except OSError:
+        ob = drop_aggregates(pd.read_csv(csv, float_precision="round_trip"))
+        return ob.astype({col: "category" for col in categorical_cols})
+
+
+if __name__ == "__main__":
+    build(*sys.argv[1:])
@@ -0,0 +1,344 @@
+# validated chart spec templates, patched with data and labels per request
+
+import json
+
+import altair as alt
+import jinja2
+from altair.utils.html import spec_to_html
+import config
+
+# page of a spec whose params follow the messages posted to its window, each
+# holding new values of some of the params by name; values posted before the
+# view is ready are applied once it is
+listen_template = jinja2.Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <style>
+    #{{ output_div }}.vega-embed {
+      width: 100%;
+      display: flex;
+    }
+  </style>
+  <script type="text/javascript" src="{{ base_url }}/vega@{{ vega_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-lite@{{ vegalite_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-embed@{{ vegaembed_version }}"></script>
+</head>
+<body>
+  <div id="{{ output_div }}"></div>
+  <script>
+    var spec = {{ spec }};
+    var embedOpt = {{ embed_options }};
+    var names = (spec.params || []).map(function (param) { return param.name; });
+    var view = null;
+    var pending = {};
+
+    function update() {
+      Object.keys(pending).forEach(function (name) {
+        view.signal(name, pending[name]);
+      });
+      pending = {};
+      view.runAsync();
+    }
+
+    // only the dashboard page, which the frame shares its origin with,
+    // posts the inputs
+    window.addEventListener("message", function (event) {
+      if (event.origin !== window.origin) {
+        return;
+      }
+      names.forEach(function (name) {
+        if (event.data && name in event.data) {
+          pending[name] = event.data[name];
+        }
+      });
+      if (view) {
+        update();
+      }
+    });
+
+    vegaEmbed("#{{ output_div }}", spec, embedOpt)
+      .then(function (result) {
+        view = result.view;
+        update();
+      })
+      .catch(function (error) {
+        document.getElementById("{{ output_div }}").innerHTML = (
+          '<div style="color:red;">JavaScript Error: ' + error.message + '</div>'
+        );
+        throw error;
+      });
+  </script>
+</body>
+</html>
+"""
+)
+
+# page kept by the browser to show the specs posted to its window, each
+# message holding a "spec"
+shell_template = jinja2.Template(
+    """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <style>
+    #vis.vega-embed {
+      width: 100%;
+      display: flex;
+    }
+  </style>
+  <script type="text/javascript" src="{{ base_url }}/vega@{{ vega_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-lite@{{ vegalite_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-embed@{{ vegaembed_version }}"></script>
+</head>
+<body>
+  <div id="vis"></div>
+  <script>
+    var shown = Promise.resolve(null);
+
+    // the specs are embedded in turn, each finalizing the view it replaces;
+    // only the dashboard page, which the frame shares its origin with, posts
+    // them
+    window.addEventListener("message", function (event) {
+      if (event.origin !== window.origin || !event.data || !event.data.spec) {
+        return;
+      }
+      shown = shown.then(function (result) {
+        if (result) {
+          result.finalize();
+        }
+        return vegaEmbed("#vis", event.data.spec).catch(function (error) {
+          document.getElementById("vis").innerHTML = (
+            '<div style="color:red;">JavaScript Error: ' + error.message + '</div>'
+          );
+          return null;
+        });
+      });
+    });
+  </script>
+</body>
+</html>
+"""
+)
+
+# milliseconds each value is shown for when a page plays through a param
+play_interval = 500
+
+# page of a spec played through the values of its param bound to a range
+# input, which it steps up at an interval from when it loads until it reaches
+# the end, or is paused
+play_template = jinja2.Environment().from_string(
+    """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="UTF-8">
+  <style>
+    #{{ output_div }}.vega-embed {
+      width: 100%;
+      display: flex;
+    }
+  </style>
+  <script type="text/javascript" src="{{ base_url }}/vega@{{ vega_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-lite@{{ vegalite_version }}"></script>
+  <script type="text/javascript" src="{{ base_url }}/vega-embed@{{ vegaembed_version }}"></script>
+</head>
+<body>
+  <button id="play" type="button">Pause</button>
+  <div id="{{ output_div }}"></div>
+  <script>
+    var spec = {{ spec }};
+    var embedOpt = {{ embed_options }};
+    var param = spec.params.filter(function (param) {
+      return param.bind && param.bind.input === "range";
+    })[0];
+    var name = param.name;
+    var bind = param.bind;
+    var button = document.getElementById("play");
+    var view = null;
+    var timer = null;
+
+    function pause() {
+      clearInterval(timer);
+      timer = null;
+      button.textContent = "Play";
+    }
+
+    function step() {
+      var value = view.signal(name);
+      if (value >= bind.max) {
+        pause();
+      } else {
+        view.signal(name, Math.min(value + (bind.step || 1), bind.max)).runAsync();
+      }
+    }
+
+    function play() {
+      if (view.signal(name) >= bind.max) {
+        view.signal(name, bind.min).runAsync();
+      }
+      timer = setInterval(step, {{ play_interval }});
+      button.textContent = "Pause";
+    }
+
+    button.addEventListener("click", function () {
+      if (view) {
+        timer ? pause() : play();
+      }
+    });
+
+    vegaEmbed("#{{ output_div }}", spec, embedOpt)
+      .then(function (result) {
+        view = result.view;
+        play();
+      })
+      .catch(function (error) {
+        document.getElementById("{{ output_div }}").innerHTML = (
+          '<div style="color:red;">JavaScript Error: ' + error.message + '</div>'
+        );
+        throw error;
+      });
+  </script>
+</body>
+</html>
+""",
+    globals={"play_interval": play_interval},
+)
+
+
+def slot(name):
+    """Return the Placeholder String Marking a Template Slot"""
+    return "\x00{}\x00".format(name)
+
+
+def find_slots(spec, path=()):
+    """Yields the Path and Name of Each Slot in a Vega-Lite Spec
+
+    A slot is either a placeholder string or a list holding one placeholder
+    string, which is replaced by a whole list.
+    """
+    if isinstance(spec, dict):
+        items = spec.items()
+    elif isinstance(spec, list):
+        if len(spec) == 1 and isinstance(spec[0], str) and spec[0].startswith("\x00"):
+            yield path, spec[0].strip("\x00")
+            return
+        items = enumerate(spec)
+    else:
+        if isinstance(spec, str) and spec.startswith("\x00"):
+            yield path, spec.strip("\x00")
+        return
+    for key, value in items:
+        yield from find_slots(value, path + (key,))
+
+
+def rename_data(spec, old, new):
+    """Renames the References to a Named Dataset, in Place"""
+    if isinstance(spec, dict):
+        if spec.get("name") == old and len(spec) == 1:
+            spec["name"] = new
+        for value in spec.values():
+            rename_data(value, old, new)
+    elif isinstance(spec, list):
+        for value in spec:
+            rename_data(value, old, new)
+
+
+def dataset_name(chart):
+    """Return the Name of the Single Inline Dataset of a Chart"""
+    with alt.data_transformers.enable("default", max_rows=None):
+        (name,) = chart.to_dict(validate=False)["datasets"]
+    return name
+
+
+class SpecTemplate:
+    """A Vega-Lite Spec, Validated Once, With Slots for its Data and Labels
+
+    The spec is only valid for the kind of value it was validated with, so a
+    label slot takes a string, number or boolean, and a list slot a list of
+    those; an expression or any other object raises a TypeError.
+
+    Args:
+        chart ([altair chart]): a chart built with slot(name) strings in place
+            of its variable labels and [slot(name)] in place of its variable
+            lists, possibly combining several charts
+        parts ([dict]): the charts holding each inline dataset of the chart, by
+            the name under which the dataset is passed
+    """
+
+    def __init__(self, chart, parts):
+        names = {dataset_name(part): name for name, part in parts.items()}
+        # the data is inlined whatever the active transformer, to be renamed
+        with alt.data_transformers.enable("default", max_rows=None):
+            spec = chart.to_dict()
+        for old in spec.pop("datasets", {}):
+            rename_data(spec, old, names[old])
+        self.names = list(parts)
+        self.slots = list(find_slots(spec))
+        self._json = json.dumps(spec)
+
+    def render(self, datasets, **labels):
+        """Fill in the Template
+
+        Args:
+            datasets ([dict]): the records of each dataset of the chart, by name
+            labels: the value of each slot, by name
+
+        Returns:
+            [dict]: the Vega-Lite spec of the chart
+        """
+        spec = json.loads(self._json)
+        for path, name in self.slots:
+            target = spec
+            for key in path[:-1]:
+                target = target[key]
+            value = labels[name]
+            is_list = isinstance(target[path[-1]], list)
+            values = value if is_list else [value]
+            if not isinstance(values, (list, tuple)) or not all(
+                isinstance(item, (str, int, float, bool)) for item in values
+            ):
+                raise TypeError(
+                    "slot {} takes a {}, not {!r}".format(
+                        name, "list" if is_list else "label", value
+                    )
+                )
+            target[path[-1]] = list(value) if is_list else value
+        spec["datasets"] = {name: datasets[name] for name in self.names}
+        return spec
+
+
+def spec_html(spec, listen=False, play=False):
+    """Return the Standalone Html Document Embedding a Vega-Lite Spec
+
+    Args:
+        spec ([dict]): the Vega-Lite spec
+        listen ([bool]): let the messages posted to the page set the params of
+            the spec, see listen_template
+        play ([bool]): play the page through the values of the param of the
+            spec bound to a range input, see play_template
+    """
+    template = "standard"
+    if listen:
+        template = listen_template
+    elif play:
+        template = play_template
+    return spec_to_html(
+        spec,
+        mode="vega-lite",
+        vega_version=alt.VEGA_VERSION,
+        vegaembed_version=alt.VEGAEMBED_VERSION,
+        vegalite_version=alt.VEGALITE_VERSION,
+        base_url=config.vega_url,
+        template=template,
+    )
+
+
+def shell_html():
+    """Return the Page Showing the Specs Posted to it, see shell_template"""
+    return shell_template.render(
+        base_url=config.vega_url,
+        vega_version=alt.VEGA_VERSION,
+        vegalite_version=alt.VEGALITE_VERSION,
+        vegaembed_version=alt.VEGAEMBED_VERSION,
+    )
@@ -0,0 +1,9 @@
+# the modules of the dashboard are run from the repository root, with src on
+# the path, as by the Procfile
+
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root)
+sys.path.insert(0, os.path.join(root, "src"))
@@ -0,0 +1,433 @@
+# the dashboard app, imported with the default settings
+
+import gzip
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import BrokenExecutor
+
+import altair as alt
+import jsonschema
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import compression
+import geo
+import serialize
+from cache import freeze
+
+
+def view_key(func, view):
+    """Return the Cache Key of a Callback Rendering a View"""
+    ((called, *args),) = [call for call in app.view_calls(view) if call[0] is func]
+    return (called.__name__,) + freeze(args)
+
+
+def schema_errors(spec):
+    """Return the Vega-Lite Schema Errors of a Rendered Spec, Its Data Left Out"""
+    spec = dict(spec, datasets={name: [] for name in spec.get("datasets", {})})
+    validator = jsonschema.Draft7Validator(alt.vegalite.load_schema())
+    return [error.message for error in validator.iter_errors(spec)]
+
+
+@pytest.fixture
+def empty_cache():
+    app.chart_cache.clear()
+    yield app.chart_cache
+    app.chart_cache.clear()
+
+
+def test_import_renders_no_view():
+    assert view_key(app.plot_all, app.default_view) not in app.chart_cache
+
+
+# the split layout, each frame wired to the inputs it takes
+split_script = """
+import inspect
+import app
+for callback in app.app.callback_map.values():
+    inputs = [input["id"] for input in callback["inputs"]]
+    params = inspect.signature(callback["callback"]).parameters
+    assert inputs == ["input_" + name for name in params], inputs
+print(sorted(c["callback"].__name__ for c in app.app.callback_map.values()))
+"""
+
+
+def test_split_frames_follow_only_their_inputs():
+    env = dict(os.environ, OBESITY_LAYOUT="split", PYTHONPATH="src")
+    result = subprocess.run(
+        [sys.executable, "-c", split_script],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    frames = ["frame_bar", "frame_factor", "frame_map", "frame_time"]
+    assert result.stdout.strip() == str(frames)
+
+
+def test_map_data_matches_the_rates_merged_with_the_geometry():
+    geometry = geo.join_countries(geo.load_geometry(), app.he.ob)
+    features = pd.DataFrame(
+        [f["properties"] for f in geometry["features"]], columns=["id", "country"]
+    )
+    view = app.default_view
+    filters = app.he.gen_filter(1990, "Male", view["region"][:3], view["income"])
+    rates = app.he.make_rate_data(["country"], ["obese"], filters)
+    rates["country"] = rates["country"].astype(str)
+    expected = features.merge(rates, on="country").dropna().sort_values("id")
+    served = app.map_data(filters)
+    assert len(served) > 50
+    assert served["id"].tolist() == expected["id"].tolist()
+    assert served["obese"].tolist() == pytest.approx(expected["obese"].tolist())
+
+
+def test_highlight_change_reuses_the_time_data(empty_cache, monkeypatch):
+    view = dict(app.default_view)
+    first = app.plot_all(*view.values())
+    calls = []
+    rate_data = app.he.make_rate_data
+    monkeypatch.setattr(
+        app.he,
+        "make_rate_data",
+        lambda *args: calls.append(args) or rate_data(*args),
+    )
+    hits = empty_cache.hits
+    view["highlight_country"] = "Chile"
+    assert app.plot_all(*view.values()) != first
+    assert calls == []
+    assert empty_cache.hits > hits
+
+
+def test_start_warm_up(empty_cache):
+    assert app.start_warm_up("off") is None
+    assert len(empty_cache) == 0
+    app.start_warm_up("sync")
+    assert view_key(app.plot_all, app.default_view) in empty_cache
+    empty_cache.clear()
+    app.start_warm_up("background").join()
+    assert view_key(app.plot_all, app.default_view) in empty_cache
+
+
+# a preloading gunicorn master: import the app, warm it up, then serve
+preload_script = """
+import app
+app.start_warm_up()
+view = dict(app.default_view, year=2000, sex="Male")
+html = app.plot_all(*view.values())
+assert html.startswith("<!DOCTYPE html>")
+assert os.getpid() in app.panel_pools
+print("ok")
+"""
+
+
+def test_thread_pool_after_import():
+    env = dict(
+        os.environ,
+        OBESITY_PANEL_POOL="thread",
+        OBESITY_WARM_UP="sync",
+        PYTHONPATH="src",
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", "import os\n" + preload_script],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ok"
+
+
+def test_no_pool_while_loading_or_warming(monkeypatch):
+    monkeypatch.setattr(app.config, "panel_pool", "thread")
+    monkeypatch.setattr(app, "loading", True)
+    assert app.panel_pool() is None
+    monkeypatch.setattr(app, "loading", False)
+    app.serial_panels.active = True
+    try:
+        assert app.panel_pool() is None
+    finally:
+        app.serial_panels.active = False
+    assert app.panel_pool() is not None
+
+
+def test_slow_pool_falls_back_to_building_in_turn(monkeypatch):
+    monkeypatch.setattr(app.config, "panel_pool", "thread")
+    monkeypatch.setattr(app.config, "panel_timeout", 0.2)
+    release = threading.Event()
+    threads = set()
+
+    def panel(i):
+        threads.add(threading.current_thread())
+        if threading.current_thread() is not threading.main_thread():
+            release.wait(5)
+        return i
+
+    start = time.monotonic()
+    assert app.build_panels([(panel, i) for i in range(3)]) == [0, 1, 2]
+    assert time.monotonic() - start < 2
+    assert threading.main_thread() in threads
+    release.set()
+
+
+def test_broken_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(app.config, "panel_pool", "thread")
+    pool = app.panel_pool()
+    pool.shutdown()
+    monkeypatch.setattr(
+        pool, "submit", lambda *args: (_ for _ in ()).throw(BrokenExecutor())
+    )
+    assert app.build_panels([(abs, -1), (abs, -2)]) == [1, 2]
+    assert app.panel_pool() is not pool
+
+
+def test_inputs_are_posted_to_the_page_origin():
+    assert "postMessage(values, window.location.origin)" in app.client_post
+
+
+def client_view(cube, where, view, groupby):
+    """Return the Obesity Rates of the Client Transforms, Computed in Pandas"""
+    keep = (
+        where
+        & ((view["sex"] == "Both") | (cube["sex"] == view["sex"]))
+        & cube["region"].isin(view["region"])
+        & cube["income"].isin(view["income"])
+    )
+    sums = cube[keep].groupby(groupby, observed=True)[["obese", "obese_pop"]].sum()
+    rates = (sums["obese"] / sums["obese_pop"]).where(sums["obese_pop"] > 0)
+    return rates.dropna()
+
+
+def test_client_rates_match_the_server_data():
+    view = dict(
+        app.default_view,
+        year=2000,
+        year_range=[1990, 2010],
+        sex="Female",
+        region=app.default_view["region"][:4],
+        income=app.default_view["income"][1:],
+    )
+    args = (view["sex"], view["region"], view["income"])
+    cube = app.client_cube()
+
+    year = app.he.gen_filter(view["year"], *args)
+    rates = client_view(cube, cube["year"] == view["year"], view, ["country"])
+    # the client map looks the geometry up by country name
+    names = np.append(np.array(app.he.countries, dtype=object), None)[app.geo_index]
+    served = app.map_data(year)
+    mapped = rates[rates.index.isin(names)]
+    assert sorted(names[served["id"]]) == sorted(mapped.index)
+    assert served["obese"].tolist() == pytest.approx(
+        mapped[names[served["id"]]].tolist()
+    )
+
+    top = rates.sort_values(ascending=False).head(app.top_n)
+    bars = app.bar_data(year)
+    assert bars["country"].tolist() == top.index.tolist()
+    assert bars["obese"].tolist() == pytest.approx(top.tolist())
+
+    in_range = cube["year"].between(*view["year_range"])
+    rates = client_view(cube, in_range, view, ["country", "year"])
+    times = app.time_data(app.he.gen_filter(view["year_range"], *args)).dropna()
+    times = times.set_index(["country", "year"])["obese"]
+    assert times.index.tolist() == rates.index.tolist()
+    assert times.tolist() == pytest.approx(rates.tolist())
+
+
+def test_client_templates_render_valid_specs(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.config, "dataset_dir", str(tmp_path))
+    template = app.build_client_templates()["smoke", "income"]
+    view = app.default_view
+    spec = template.render(
+        {},
+        input_year=view["year"],
+        input_year_range=view["year_range"],
+        input_sex=view["sex"],
+        input_region=view["region"],
+        input_income=view["income"],
+        input_highlight_country=[view["highlight_country"]],
+    )
+    assert schema_errors(spec) == []
+    charts = [spec]
+    titles = []
+    while charts:
+        chart = charts.pop()
+        titles.append(chart.get("title", {}).get("text"))
+        charts.extend(chart.get("vconcat", []) + chart.get("layer", []))
+    assert {"expr": "[\"Obesity Rates\", '' + input_year]"} in titles
+    assert {"expr": "[\"Top 10 Countries\", '' + input_year]"} in titles
+
+
+def test_specs_are_posted_to_the_page_origin():
+    assert "postMessage({spec: spec}, window.location.origin)" in app.delta_apply
+
+
+def test_superseded_request_stops_between_panels(empty_cache, monkeypatch):
+    view = dict(app.default_view, year=2001)
+    newer = []
+
+    def supersede():
+        thread = threading.Thread(
+            target=lambda: newer.append(app.in_flight.start(("page", "plot_all")))
+        )
+        thread.start()
+        thread.join()
+
+    def unreachable():
+        pytest.fail("built after the request was superseded")
+
+    monkeypatch.setattr(app.config, "panel_pool", "off")
+    monkeypatch.setattr(
+        app, "combo_panels", lambda *view: [(supersede,), (unreachable,)]
+    )
+    callback = app.skip_superseded(app.plot_all)
+    with pytest.raises(app.PreventUpdate):
+        callback(*view.values(), "page")
+    app.in_flight.finish(newer[0])
+    assert view_key(app.plot_all, view) not in empty_cache
+
+
+def test_shared_computations_are_never_superseded():
+    checked = []
+    newer = []
+
+    @app.memoize(app.LRUCache(1000, sizeof=len))
+    def shared():
+        thread = threading.Thread(
+            target=lambda: newer.append(app.in_flight.start(("page", "shared")))
+        )
+        thread.start()
+        thread.join()
+        app.check_superseded()
+        checked.append(True)
+        return "done"
+
+    token = app.in_flight.start(("page", "shared"))
+    try:
+        assert shared() == "done" and checked
+        with pytest.raises(app.inflight.Superseded):
+            app.check_superseded()
+    finally:
+        app.in_flight.finish(newer[0])
+        app.in_flight.finish(token)
+
+
+def test_playback_data_matches_the_map_and_bar_plot():
+    view = app.default_view
+    filters = app.he.gen_filter(
+        app.playback_years, "Both", view["region"], view["income"]
+    )
+    areas, bars = app.playback_data(filters)
+    year = app.he.gen_filter(2000, "Both", view["region"], view["income"])
+    expected = app.map_data(year).set_index("id")["obese"]
+    played = areas.set_index("id")["2000"].dropna()
+    assert played.index.tolist() == expected.index.tolist()
+    assert played.to_numpy() == pytest.approx(expected.to_numpy())
+    assert bars["rank"].max() == app.top_n
+    top = bars[bars["year"] == 2000].sort_values("rank")["country"].tolist()
+    assert top == app.bar_data(year)["country"].tolist()
+
+
+def test_playback_template_reuses_the_map_and_bar_charts():
+    template = app.build_playback_template()
+    view = app.default_view
+    filters = app.he.gen_filter(
+        app.playback_years, "Male", view["region"], view["income"]
+    )
+    areas, bars = app.playback_data(filters)
+    spec = template.render({"map": areas, "bar": bars})
+    assert schema_errors(spec) == []
+    map_spec, bar_spec = spec["vconcat"]
+    assert map_spec["transform"][0]["lookup"] == "properties.id"
+    assert map_spec["transform"][-1] == {
+        "calculate": "datum['' + playback_year]",
+        "as": "obese",
+    }
+    assert map_spec["mark"]["type"] == "geoshape"
+    assert bar_spec["mark"]["type"] == "bar"
+    assert "playback_year" in [param["name"] for param in spec["params"]]
+
+
+def apply_delta(delta, last):
+    """Return the Spec and Datasets a Page Holds After a Delta, as delta_apply
+
+    Returns None when the page misses a dataset and asks for all of them.
+    """
+    message = json.loads(delta)
+    spec = message["spec"]
+    held = {}
+    for name, key in spec["datasets"].items():
+        held[key] = message["data"][key] if key in message["data"] else last.get(key)
+        if held[key] is None:
+            return None
+    spec["datasets"] = {name: held[key] for name, key in spec["datasets"].items()}
+    return spec, held
+
+
+def test_delta_sends_only_the_datasets_the_page_misses(empty_cache):
+    args = list(app.default_view.values())
+    spec, held = apply_delta(app.plot_delta(*args, 0, []), {})
+    expected = app.combo_spec(*args)
+    expected["datasets"] = {
+        name: json.loads(serialize.unwrap(value))
+        for name, value in expected["datasets"].items()
+    }
+    assert spec == expected
+
+    # the time series data is unchanged by the year, so it is left out
+    args[0] = 2000
+    delta = app.plot_delta(*args, 0, list(held))
+    sent = json.loads(delta)["data"]
+    assert held.keys() - sent.keys()
+    assert not held.keys() & sent.keys()
+    assert apply_delta(delta, held) is not None
+
+    # a page that lost its datasets asks again, holding none
+    assert apply_delta(delta, {}) is None
+    spec, _ = apply_delta(app.plot_delta(*args, 1, []), {})
+    assert spec["datasets"].keys() == app.combo_spec(*args)["datasets"].keys()
+
+
+def test_callback_responses_are_compressed():
+    encoding = "br" if compression.brotli is not None else "gzip"
+    view = app.default_view
+    inputs = [
+        {"id": "input_" + name, "property": "value", "value": view[name]}
+        for name in view
+    ]
+    response = app.server.test_client().post(
+        "/_dash-update-component",
+        json={
+            "output": "combo_plot.srcDoc",
+            "outputs": {"id": "combo_plot", "property": "srcDoc"},
+            "inputs": inputs,
+            "changedPropIds": ["input_year.value"],
+        },
+        headers={"Accept-Encoding": encoding},
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == encoding
+    if encoding == "br":
+        body = compression.brotli.decompress(response.data)
+    else:
+        body = gzip.decompress(response.data)
+    assert len(response.data) < len(body)
+    assert "<!DOCTYPE html>" in json.loads(body)["response"]["combo_plot"]["srcDoc"]
+
+
+def test_serves_local_vega_scripts(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.config, "vega_dir", str(tmp_path))
+    (tmp_path / "vega@6.js").write_text("var vega = {};")
+    client = app.server.test_client()
+    response = client.get("/vega/vega@6", headers={"Accept-Encoding": "identity"})
+    assert response.data == b"var vega = {};"
+    assert response.mimetype == "application/javascript"
+    assert client.get("/vega/vega-lite@6").status_code == 404
+    assert client.get("/vega/other@6").status_code == 404
@@ -0,0 +1,38 @@
+# the benchmark harness and its committed baseline
+
+import json
+
+import app
+import bench
+import helper as he
+import serialize
+
+
+def test_nbytes_measures_the_served_payload():
+    filters = he.gen_filter(2016, "Both", bench.regions, bench.incomes)
+    chart = app.plot_bar(filters, 2016)
+    assert bench.nbytes(chart) == len(app.chart_html(chart, "bar").encode())
+    data = app.bar_data(filters)
+    assert bench.nbytes(data) == len(serialize.to_json(data).encode())
+    assert bench.nbytes("<p>é</p>") == 9
+    assert bench.nbytes(filters) == 0
+
+
+def test_compare_flags_regressions_past_threshold_and_noise():
+    baseline = {"a": {"p50_ms": 10, "p95_ms": 20, "alloc_kib": 100, "bytes": 1000}}
+    results = {
+        "a": {"p50_ms": 13, "p95_ms": 20.05, "alloc_kib": 102, "bytes": 2000},
+        "b": {"p50_ms": 99, "p95_ms": 99, "alloc_kib": 99, "bytes": 99},
+    }
+    assert bench.compare(results, baseline, 0.25) == [
+        "a: p50_ms 10 -> 13 (+30%)",
+        "a: bytes 1000 -> 2000 (+100%)",
+    ]
+
+
+def test_baseline_covers_every_benchmark():
+    with open(bench.baseline_file) as f:
+        baseline = json.load(f)["results"]
+    assert set(baseline) == set(bench.benchmarks(bench.scenarios()))
+    for result in baseline.values():
+        assert set(bench.noise) <= set(result)
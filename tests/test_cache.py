@@ -0,0 +1,109 @@
+# the bounded result cache and its memoizing decorator
+
+import threading
+
+from cache import LRUCache, SingleFlight, freeze, memoize, sharing
+
+
+def test_freeze():
+    assert freeze([1, [2, 3]]) == (1, (2, 3))
+    assert freeze({"b", "a"}) == frozenset(["a", "b"])
+    assert hash(freeze(["Canada", [1975, 2016]])) is not None
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(30, sizeof=len)
+    cache.put("a", "x" * 10)
+    cache.put("b", "x" * 10)
+    cache.put("c", "x" * 10)
+    assert cache.get("a") is not None
+    cache.put("d", "x" * 10)
+    assert "b" not in cache
+    assert [key in cache for key in "acd"] == [True, True, True]
+    assert cache.nbytes == 30
+
+
+def test_skips_values_above_ceiling():
+    cache = LRUCache(10, sizeof=len)
+    cache.put("a", "x" * 11)
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_replacing_a_value_updates_size():
+    cache = LRUCache(100, sizeof=len)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 20)
+    assert len(cache) == 1 and cache.nbytes == 20
+
+
+def test_counts_hits_and_misses():
+    cache = LRUCache(100, sizeof=len)
+    cache.get("a")
+    cache.put("a", "x")
+    cache.get("a")
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_memoize_keys_on_frozen_arguments():
+    cache = LRUCache(1000, sizeof=len)
+    calls = []
+
+    @memoize(cache)
+    def render(year, regions):
+        calls.append((year, regions))
+        return "{} {}".format(year, sorted(regions))
+
+    assert render(2016, ["Europe", "Asia"]) == render(2016, ["Europe", "Asia"])
+    assert len(calls) == 1
+    render(2015, ["Europe", "Asia"])
+    assert len(calls) == 2
+    assert ("render", 2016, ("Europe", "Asia")) in cache
+
+
+def run_leader(flights, key, release):
+    """Start a Call Holding a Key Until Released, Return its Thread"""
+    started = threading.Event()
+
+    def leader():
+        started.set()
+        release.wait(5)
+        return "leader"
+
+    thread = threading.Thread(target=flights.do, args=(key, leader))
+    thread.start()
+    started.wait(5)
+    return thread
+
+
+def test_single_flight_shares_a_running_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    thread = run_leader(flights, "k", release)
+    results = []
+    waiter = threading.Thread(
+        target=lambda: results.append(flights.do("k", lambda: "waiter"))
+    )
+    waiter.start()
+    release.set()
+    thread.join()
+    waiter.join()
+    assert results == ["leader"] and flights.shared == 1
+
+
+def test_single_flight_waits_at_most_the_timeout():
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    thread = run_leader(flights, "k", release)
+    assert flights.do("k", lambda: "waiter") == "waiter"
+    assert flights.timeouts == 1
+    release.set()
+    thread.join()
+
+
+def test_single_flight_marks_the_shared_computation():
+    flights = SingleFlight()
+    assert not sharing()
+    assert flights.do("k", sharing)
+    assert not sharing()
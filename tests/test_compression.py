@@ -0,0 +1,62 @@
+# compression of the immutable responses
+
+import gzip
+
+import flask
+import pytest
+
+import compression
+
+body = b'{"values": [' + b"1, " * 1000 + b"1]}"
+
+
+@pytest.fixture
+def server():
+    server = flask.Flask(__name__)
+
+    @server.route("/data")
+    def data():
+        return compression.immutable_response(body, "abc", "application/json")
+
+    compression.compressed_cache.clear()
+    yield server.test_client()
+    compression.compressed_cache.clear()
+
+
+def test_gzip_response(server):
+    response = server.get("/data", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == '"abc-gzip"'
+    assert gzip.decompress(response.data) == body
+    assert len(response.data) < len(body)
+
+
+def test_identity_response(server):
+    response = server.get("/data", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"abc"'
+    assert response.data == body
+
+
+def test_compressed_once(server):
+    hits = compression.compressed_cache.hits
+    server.get("/data", headers={"Accept-Encoding": "gzip"})
+    server.get("/data", headers={"Accept-Encoding": "gzip"})
+    assert compression.compressed_cache.hits == hits + 1
+    assert list(compression.compressed_cache._entries) == [("abc", "gzip")]
+
+
+def test_not_modified(server):
+    response = server.get(
+        "/data", headers={"Accept-Encoding": "gzip", "If-None-Match": '"abc-gzip"'}
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_brotli_response(server):
+    response = server.get("/data", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert compression.brotli.decompress(response.data) == body
@@ -0,0 +1,87 @@
+# the content-addressed datasets shared on disk by the workers
+
+import os
+import threading
+import time
+
+import pytest
+
+import config
+import datasets
+
+
+@pytest.fixture(autouse=True)
+def dataset_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "dataset_dir", str(tmp_path / "datasets"))
+    datasets.dataset_cache.clear()
+    return tmp_path / "datasets"
+
+
+def test_put_and_get(dataset_dir):
+    name = datasets.put_dataset('[{"a":1}]')
+    assert name == datasets.content_name('[{"a":1}]')
+    assert (dataset_dir / (name + ".json")).read_bytes() == b'[{"a":1}]'
+    datasets.dataset_cache.clear()
+    assert datasets.get_dataset(name) == b'[{"a":1}]'
+    assert datasets.get_dataset("data-0") is None
+
+
+def test_concurrent_writes_of_a_new_dataset(dataset_dir):
+    body = "[" + ",".join('{"a":%d}' % i for i in range(20000)) + "]"
+    errors = []
+
+    def put():
+        try:
+            # each thread misses the memory cache, as in separate workers
+            datasets.dataset_cache.clear()
+            datasets.put_dataset(body)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=put) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(dataset_dir) == [datasets.content_name(body) + ".json"]
+    path = dataset_dir / os.listdir(dataset_dir)[0]
+    assert path.read_text() == body
+
+
+def test_prunes_least_recently_used(dataset_dir, monkeypatch):
+    # room for two datasets of 102 bytes
+    monkeypatch.setattr(config, "dataset_dir_mb", 250 / 2**20)
+    bodies = ["[" + str(i) * 100 + "]" for i in range(3)]
+    names = [datasets.put_dataset(body) for body in bodies[:2]]
+    for name in names:
+        os.utime(datasets.dataset_path(name), (time.time() - 100,) * 2)
+    # serving the first dataset again marks it as recently used
+    datasets.put_dataset(bodies[0])
+    names.append(datasets.put_dataset(bodies[2]))
+    stored = {f[: -len(".json")] for f in os.listdir(dataset_dir)}
+    assert stored == {names[0], names[2]}
+
+
+def test_missing_file_is_not_found(dataset_dir):
+    name = datasets.put_dataset("[1]")
+    datasets.dataset_cache.clear()
+    os.remove(datasets.dataset_path(name))
+    assert datasets.get_dataset(name) is None
+
+
+def test_fetching_keeps_a_dataset_stored_at_start_up(dataset_dir, monkeypatch):
+    monkeypatch.setattr(config, "dataset_dir_mb", 250 / 2**20)
+    bodies = ["[" + str(i) * 100 + "]" for i in range(3)]
+    names = [datasets.put_dataset(body) for body in bodies[:2]]
+    for name in names:
+        os.utime(datasets.dataset_path(name), (time.time() - 100,) * 2)
+    # fetching the first dataset, from memory, marks its file as recently used
+    assert datasets.get_dataset(names[0]) == bodies[0].encode()
+    datasets.put_dataset(bodies[2])
+    assert os.path.exists(datasets.dataset_path(names[0]))
+    assert not os.path.exists(datasets.dataset_path(names[1]))
+    # a file pruned by another worker is written back from memory
+    os.remove(datasets.dataset_path(names[0]))
+    datasets.get_dataset(names[0])
+    assert os.path.exists(datasets.dataset_path(names[0]))
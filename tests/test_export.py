@@ -0,0 +1,108 @@
+# the offline export and the static serving of its pages
+
+import gzip
+import json
+import os
+
+import pytest
+
+import app
+
+
+@pytest.fixture(scope="module")
+def export():
+    # export.py sets the rendering modes of the app it imports in os.environ
+    environ = dict(os.environ)
+    import export
+
+    yield export
+    os.environ.clear()
+    os.environ.update(environ)
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.config, "export_dir", str(tmp_path))
+    monkeypatch.setattr(app, "manifest", {})
+    return tmp_path
+
+
+def test_view_key_normalizes_selections():
+    key = app.view_key("frame_time", [[2016, 1975], "Both", ["b", "a"], None, "x"])
+    assert key == app.view_key(
+        "frame_time", [[1975, 2016], ["Both"], ("a", "b"), [], ["x"]]
+    )
+    assert json.loads(key) == [
+        "frame_time",
+        [1975, 2016],
+        ["Both"],
+        ["a", "b"],
+        [],
+        ["x"],
+    ]
+
+
+def test_exported_calls_match_the_layout(export):
+    view = dict(app.default_view, highlight_country=["Canada"])
+    todo = export.calls(export.views(range(2016, 2017), 0))
+    for func, *args in app.view_calls(view):
+        name, *exported = todo[app.view_key(func.__name__, args)]
+        assert name == func.__name__
+        assert app.view_key(name, exported) == app.view_key(name, args)
+
+
+def test_write_page(tmp_path):
+    name = app.write_page(str(tmp_path), "<html></html>")
+    path = tmp_path / (name + ".html.gz")
+    assert gzip.decompress(path.read_bytes()) == b"<html></html>"
+    assert app.write_page(str(tmp_path), "<html></html>") == name
+    assert os.listdir(tmp_path) == [name + ".html.gz"]
+
+
+def test_static_callback_renders_missing_views(exported, monkeypatch):
+    calls = []
+
+    def frame_fake(year, region):
+        calls.append((year, region))
+        return "<html>{} {}</html>".format(year, region)
+
+    callback = app.static_callback(frame_fake)
+    url = callback(2000, ["b", "a"])
+    name = app.manifest[app.view_key("frame_fake", [2000, ["a", "b"]])]
+    assert url == app.config.export_url + name + ".html"
+    assert (exported / (name + ".html.gz")).exists()
+    assert callback(2000, ["a", "b"]) == url
+    assert calls == [(2000, ["b", "a"])]
+
+    monkeypatch.setattr(app.config, "static_fallback", "missing")
+    assert callback(2001, ["a"]) == app.config.export_url + "missing.html"
+    assert len(calls) == 1
+
+
+def test_static_callback_serves_exported_pages(exported):
+    app.manifest[app.view_key("frame_fake", [2000])] = "0123abcd"
+
+    def frame_fake(year):
+        pytest.fail("rendered")
+
+    callback = app.static_callback(frame_fake)
+    assert callback(2000) == app.config.export_url + "0123abcd.html"
+
+
+def test_rendered_views_are_shared_by_the_workers(exported, monkeypatch):
+    def frame_fake(year):
+        return "<html>{}</html>".format(year)
+
+    url = app.static_callback(frame_fake)(2000)
+    # another worker, which loaded the manifest before the view was rendered
+    monkeypatch.setattr(app, "manifest", {})
+
+    def frame_other(year):
+        pytest.fail("rendered again")
+
+    frame_other.__name__ = "frame_fake"
+    assert app.static_callback(frame_other)(2000) == url
+    name = url[len(app.config.export_url) : -len(".html")]
+    (exported / "manifest.json").write_text('{"a": "0123abcd"}')
+    manifest = app.load_manifest()
+    assert manifest == {"a": "0123abcd", app.view_key("frame_fake", [2000]): name}
@@ -0,0 +1,63 @@
+# the bundled world geometry and its join to the obesity countries
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import geo
+import helper as he
+
+
+@pytest.fixture(scope="module")
+def geometry():
+    return geo.join_countries(geo.load_geometry(), he.ob)
+
+
+def test_features_are_numbered(geometry):
+    ids = [f["properties"]["id"] for f in geometry["features"]]
+    assert ids == list(range(len(ids)))
+
+
+def test_draws_every_country_of_the_original_map(geometry):
+    # the original map looked the countries up by the numeric id of the
+    # world-110m features, which country-ids.csv gives for each country
+    ids = pd.read_csv("data/country-ids.csv")
+    drawn = set(ids.loc[ids["id"].notna(), "world_bank"]) & set(he.countries)
+    joined = {f["properties"]["country"] for f in geometry["features"]}
+    assert drawn - joined == set()
+
+
+def test_unmatched_features_hold_no_obesity_country(geometry):
+    unmatched = [
+        f["properties"]["name"]
+        for f in geometry["features"]
+        if f["properties"]["country"] is None
+    ]
+    assert len(unmatched) == 9
+    assert not set(unmatched) & set(he.countries)
+
+
+def test_feature_index(geometry):
+    index = geo.feature_index(geometry, he.countries)
+    for feature, i in zip(geometry["features"], index):
+        country = feature["properties"]["country"]
+        assert (i == -1) if country is None else (he.countries[i] == country)
+
+
+def test_simplify_ring_keeps_it_closed():
+    angles = np.linspace(0, 2 * np.pi, 200)
+    ring = np.c_[np.cos(angles), np.sin(angles)].tolist()
+    ring[-1] = ring[0]
+    simple = geo.simplify_ring(ring, 0.05)
+    assert 4 <= len(simple) < len(ring)
+    assert simple[0] == simple[-1]
+    # a ring with nothing to drop is kept whole
+    square = [[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]
+    assert geo.simplify_ring(square, 0.5) == square
+
+
+def test_variants(geometry):
+    variants, index = geo.make_variants(he.ob)
+    assert set(variants) == {"full", "simple"}
+    assert len(variants["simple"][0]) < len(variants["full"][0])
+    assert len(index) == len(geometry["features"])
@@ -0,0 +1,163 @@
+# the rate cube and filter specs against the aggregation they replaced
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import helper as he
+
+
+def baseline_rate_data(grp, valuevars, query, data):
+    """The Original make_rate_data, Aggregating the Processed Rows"""
+    return (
+        data.query(query)
+        .loc[:, grp + ["pop"] + valuevars]
+        .melt(id_vars=grp + ["pop"], var_name="variable", value_name="value")
+        .dropna()
+        .groupby(grp + ["variable"])[["pop", "value"]]
+        .sum()
+        .reset_index()
+        .assign(rate=lambda x: x["value"] / x["pop"])
+        .drop(columns=["value", "pop"])
+        .pivot(index=grp, columns="variable", values="rate")
+        .reset_index()
+    )
+
+
+@pytest.fixture(scope="module")
+def processed():
+    """The Processed CSV as the Dashboard First Read it"""
+    return pd.read_csv("data/processed/obesity-combo.csv")
+
+
+regions = ["East Asia & Pacific", "Europe & Central Asia", "Sub-Saharan Africa"]
+incomes = ["High income", "Low income"]
+
+# inputs of the dashboard, as passed to gen_query_string and gen_filter
+inputs = [
+    (2016, "Both", regions, incomes),
+    (1990, "Male", regions[:1], incomes),
+    ([1975, 2016], "Female", regions, incomes[1:]),
+    ([2000, 2005], "Both", regions[1:], incomes),
+]
+
+# groupings and value variables of the charts
+groupings = [
+    (["country"], ["obese"]),
+    (["country", "year"], ["obese"]),
+    (["country", "income"], he.rate_vars),
+    (["country", "sex"], he.rate_vars),
+    (["country", "none"], he.rate_vars),
+]
+
+
+def assert_rates_equal(result, expected):
+    result = result.reset_index(drop=True)
+    expected = expected.reset_index(drop=True)
+    # value columns without any rate are kept as NaN rather than dropped
+    assert set(expected.columns) <= set(result.columns)
+    missing = result.columns.difference(expected.columns)
+    assert result[missing].isna().all().all()
+    expected = expected.reindex(columns=result.columns)
+    keys = [col for col in expected.columns if col not in he.rate_vars]
+    for col in keys:
+        assert result[col].astype(str).tolist() == expected[col].astype(str).tolist()
+    for col in expected.columns.difference(keys):
+        np.testing.assert_allclose(result[col], expected[col], rtol=1e-9)
+
+
+@pytest.mark.parametrize("grp, valuevars", groupings)
+@pytest.mark.parametrize("year, sex, region, income", inputs)
+def test_query_matches_baseline(processed, grp, valuevars, year, sex, region, income):
+    query = he.gen_query_string(year, sex, region, income)
+    assert_rates_equal(
+        he.make_rate_data(grp, valuevars, query),
+        baseline_rate_data(grp, valuevars, query, processed),
+    )
+
+
+def test_default_query_matches_baseline(processed):
+    query = "none == 'All' & region != 'Aggregates'"
+    assert_rates_equal(
+        he.make_rate_data(["country"], ["obese"]),
+        baseline_rate_data(["country"], ["obese"], query, processed),
+    )
+
+
+@pytest.mark.parametrize("grp, valuevars", groupings)
+@pytest.mark.parametrize("year, sex, region, income", inputs)
+def test_filter_spec_matches_query(grp, valuevars, year, sex, region, income):
+    query = he.gen_query_string(year, sex, region, income)
+    filters = he.gen_filter(year, sex, region, income)
+    assert_rates_equal(
+        he.make_rate_data(grp, valuevars, filters),
+        he.make_rate_data(grp, valuevars, query),
+    )
+
+
+def test_gen_filter():
+    filters = he.gen_filter([1990, 2000], "Both", ["South Asia"], ["Low income"])
+    assert filters == he.FilterSpec(
+        year=(1990, 2000),
+        sex=frozenset(["Male", "Female"]),
+        region=frozenset(["South Asia"]),
+        income=frozenset(["Low income"]),
+    )
+    assert he.gen_filter(2016, "Male", [], []).year == (2016, 2016)
+    # hashable, so that it can key the chart cache
+    assert hash(filters) == hash(
+        he.gen_filter([1990, 2000], "Both", ["South Asia"], ["Low income"])
+    )
+
+
+def test_filter_mask_skips_missing_values():
+    filters = he.gen_filter([1975, 2016], "Both", regions, incomes)
+    mask = he.filter_mask(filters, he.cube_codes)
+    kept = he.cube[mask]
+    assert kept["region"].notna().all() and kept["income"].notna().all()
+    assert kept["year"].between(1975, 2016).all()
+    assert len(kept) == len(
+        he.cube.query(he.gen_query_string([1975, 2016], "Both", regions, incomes))
+    )
+
+
+def sort_rates(data, keys):
+    data = data.assign(**{key: data[key].astype(str) for key in keys})
+    return data.sort_values(keys, ignore_index=True)
+
+
+@pytest.mark.parametrize("grouper", ["none", "income", "region", "sex"])
+@pytest.mark.parametrize("year, sex, region, income", inputs)
+def test_group_rates_matches_make_rate_data(grouper, year, sex, region, income):
+    filters = he.gen_filter(year, sex, region, income)
+    keys = ["country", grouper]
+    assert_rates_equal(
+        sort_rates(he.group_rates(grouper, filters), keys),
+        sort_rates(he.make_rate_data(keys, he.rate_vars, filters), keys),
+    )
+
+
+def test_group_fits_matches_polyfit():
+    filters = he.gen_filter(2016, "Both", regions, incomes)
+    data = he.group_rates("region", filters)
+    xvars = ["smoke", "primedu", "unemployed"]
+    fits = he.group_fits(data, "region", xvars).set_index(["region", "variable"])
+    for (group, var), fit in fits.iterrows():
+        rows = data[data["region"] == group][[var, "obese"]].dropna()
+        slope, intercept = np.polyfit(rows[var], rows["obese"], 1)
+        assert fit["n"] == len(rows)
+        np.testing.assert_allclose(
+            [fit["slope"], fit["intercept"], fit["r"]],
+            [slope, intercept, rows[var].corr(rows["obese"])],
+            rtol=1e-6,
+        )
+        assert (fit["x1"], fit["x2"]) == (rows[var].min(), rows[var].max())
+        np.testing.assert_allclose(fit["y2"], intercept + slope * rows[var].max())
+    # each group where a variable takes several values is fitted
+    expected = {
+        (group, var)
+        for group, rows in data.groupby("region", observed=True)
+        for var in xvars
+        if rows[[var, "obese"]].dropna()[var].nunique() > 1
+    }
+    assert set(fits.index) == expected
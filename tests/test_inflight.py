@@ -0,0 +1,53 @@
+# tracking of the requests in flight of each session
+
+import threading
+
+import pytest
+
+from inflight import RequestTracker, Superseded
+
+
+def start_newer(tracker, key):
+    """Start a Request in Another Thread, Return its Token"""
+    tokens = []
+    thread = threading.Thread(target=lambda: tokens.append(tracker.start(key)))
+    thread.start()
+    thread.join()
+    return tokens[0]
+
+
+def test_newer_request_supersedes():
+    tracker = RequestTracker()
+    first = tracker.start(("page", "plot_all"))
+    tracker.check()
+    newer = start_newer(tracker, ("page", "plot_all"))
+    with pytest.raises(Superseded):
+        tracker.check()
+    assert tracker.superseded == 1
+    tracker.finish(newer)
+    tracker.finish(first)
+
+
+def test_other_sessions_and_callbacks_do_not_supersede():
+    tracker = RequestTracker()
+    token = tracker.start(("page", "plot_all"))
+    start_newer(tracker, ("other", "plot_all"))
+    start_newer(tracker, ("page", "plot_time"))
+    tracker.check()
+    tracker.finish(token)
+
+
+def test_untracked_threads_are_never_superseded():
+    tracker = RequestTracker()
+    tracker.check()
+    token = tracker.start(("page", "plot_all"))
+    tracker.finish(token)
+    tracker.check()
+
+
+def test_finished_sessions_are_forgotten():
+    tracker = RequestTracker()
+    tokens = [tracker.start(("page", "plot_all")) for _ in range(2)]
+    for token in tokens:
+        tracker.finish(token)
+    assert tracker._latest == {}
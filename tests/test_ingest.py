@@ -0,0 +1,108 @@
+# ingestion of the raw WHO estimates, on small raw and processed files
+
+import pandas as pd
+import pytest
+
+import ingest
+import store
+
+header = (
+    "country,year,sex,iso2c,iso3c,region,capital,longitude,latitude,income,"
+    "lending,lifexp,pop,primedu,smoke,unemployed,obese,none\n"
+)
+processed = [
+    "Aland,2000,Male,AL,ALA,North,Mariehamn,19.9,60.1,High income,NA,70.5,1000,NA,20,NA,50,All\n",
+    "Aland,2000,Female,AL,ALA,North,Mariehamn,19.9,60.1,High income,NA,75.5,1200,NA,15,NA,60.300000000000004,All\n",
+    "Bland,2000,Male,BL,BLA,South,Bton,10.5,-5.25,Low income,IDA,50.1,2000,300,NA,4.5,123.45,All\n",
+    "Bland,2000,Female,BL,BLA,South,Bton,10.5,-5.25,Low income,IDA,52.1,2100,250,NA,4.5,234.5,All\n",
+]
+raw = """,Country,Year,Obesity (%),Sex
+0,Aland,2000,11.0 [5.0-17.0],Both sexes
+1,Aland,2000,10.0 [5.0-15.0],Male
+2,Aland,2000,No data,Female
+3,Aland,2001,20.0 [10.0-30.0],Male
+4,Aland,2002,1.0 [0.5-1.5],Male
+5,Nowhere,2000,5.0 [2.0-8.0],Male
+"""
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {
+        "raw": tmp_path / "raw.csv",
+        "csv": tmp_path / "combo.csv",
+        "path": tmp_path / "combo",
+    }
+    paths["raw"].write_text(raw)
+    paths["csv"].write_text(header + "".join(processed))
+    return {name: str(path) for name, path in paths.items()}
+
+
+def lines(path):
+    with open(path) as f:
+        return f.readlines()
+
+
+def test_rows_without_estimate_are_kept(files):
+    counts = ingest.ingest(**files)
+    # Aland 2001 and 2002 have no indicators, Nowhere is unknown
+    assert counts == {
+        "rows": 4,
+        "changed": 1,
+        "added": 0,
+        "skipped": 3,
+        "unknown countries": 1,
+    }
+    text = lines(files["csv"])
+    assert text[1] == processed[0].replace(",50,All", ",100,All")
+    assert text[2:] == processed[1:]
+    assert store.load(files["path"])["obese"].tolist() == [
+        100,
+        60.300000000000004,
+        123.45,
+        234.5,
+    ]
+
+
+def test_unchanged_estimates_write_nothing(files):
+    ingest.ingest(**files)
+    before = lines(files["csv"])
+    counts = ingest.ingest(**files)
+    assert counts["changed"] == 0 and counts["added"] == 0
+    assert lines(files["csv"]) == before
+
+
+def test_indicators_add_and_update_rows(files, tmp_path):
+    indicators = tmp_path / "indicators.csv"
+    pd.DataFrame(
+        {
+            "country": ["Aland", "Aland", "Aland", "Bland", "Cland"],
+            "year": [2001, 2001, 2000, 2000, 2000],
+            "sex": ["Female", "Male", "Male", "Female", "Male"],
+            "pop": [1300, 1100, None, 2200, None],
+            "smoke": [None, 21.5, 19.0, None, 3.0],
+        }
+    ).to_csv(indicators, index=False)
+
+    counts = ingest.ingest(**files, indicators=str(indicators))
+    assert counts["added"] == 2
+    # Aland 2002 and Nowhere have no indicators, Cland no population
+    assert counts["skipped"] == 3
+    text = lines(files["csv"])
+    assert text[1] == processed[0].replace(",20,NA,50,", ",19,NA,100,")
+    assert text[2:4] == processed[1:3]
+    assert text[4] == processed[3].replace(",2100,", ",2200,")
+    assert text[5:] == [
+        "Aland,2001,Male,AL,ALA,North,Mariehamn,19.9,60.1,High income,NA,NA,1100,NA,21.5,NA,220,All\n",
+        "Aland,2001,Female,AL,ALA,North,Mariehamn,19.9,60.1,High income,NA,NA,1300,NA,NA,NA,NA,All\n",
+    ]
+
+    df = store.load(files["path"])
+    assert len(df) == 6
+    assert df["pop"].dtype == "int64"
+    assert df.iloc[4][["country", "year", "sex", "none"]].tolist() == [
+        "Aland",
+        2001,
+        "Male",
+        "All",
+    ]
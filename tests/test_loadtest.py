@@ -0,0 +1,95 @@
+# the helpers of the load-test harness, against the dashboard's own layout
+
+import json
+
+import numpy as np
+import pytest
+
+import app
+import loadtest
+
+
+@pytest.fixture(scope="module")
+def page():
+    client = app.server.test_client()
+    layout = json.loads(client.get("/_dash-layout").data)
+    dependencies = json.loads(client.get("/_dash-dependencies").data)
+    return loadtest.layout_props(layout), dependencies
+
+
+def test_parse_config():
+    assert loadtest.parse_config("4x8") == (4, 8)
+    assert loadtest.parse_config("1X1") == (1, 1)
+
+
+def test_layout_props(page):
+    props, _ = page
+    assert props["input_year", "value"] == app.default_view["year"]
+    assert props["input_regressor", "value"] == app.default_view["regressor"]
+
+
+def test_chart_callbacks_fire_like_the_browser(page):
+    props, dependencies = page
+    callbacks = loadtest.chart_callbacks(dependencies)
+    assert callbacks and all(
+        not callback.get("clientside_function") for callback in callbacks
+    )
+    callback = callbacks[0]
+    body = json.loads(
+        loadtest.callback_body(callback, props, [("input_year", "value")])
+    )
+    assert body["output"] == callback["output"]
+    assert body["changedPropIds"] == ["input_year.value"]
+    inputs = {dep["id"]: dep["value"] for dep in body["inputs"]}
+    assert inputs["input_year"] == app.default_view["year"]
+
+    response = app.server.test_client().post(
+        "/_dash-update-component",
+        data=loadtest.callback_body(callback, props, []),
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 200
+    app.chart_cache.clear()
+
+
+def test_synthetic_session_changes_inputs_within_their_options(page):
+    props, _ = page
+    session = loadtest.synthetic_session(props, np.random.default_rng(0), 1.0, 0.05)
+    for _, step in zip(range(200), session):
+        changed = [key for key in step if key not in ["think", "wait"]]
+        assert len(changed) == 1 and step["think"] >= 0
+        (id,) = changed
+        if id == "input_year":
+            assert props["input_year", "min"] <= step[id] <= props["input_year", "max"]
+        elif id != "input_year_range":
+            options = [option["value"] for option in props[id, "options"]]
+            values = step[id] if isinstance(step[id], list) else [step[id]]
+            assert set(values) <= set(options)
+        if not step["wait"]:
+            assert step["think"] == 0.05
+
+
+def test_recorded_session_repeats():
+    steps = [{"input_year": 2000}, {"input_sex": "Male", "think": 0}]
+    session = loadtest.recorded_session(steps, 2.0)
+    assert [next(session) for _ in range(3)] == [
+        {"input_year": 2000, "think": 2.0, "wait": True},
+        {"input_sex": "Male", "think": 0, "wait": True},
+        {"input_year": 2000, "think": 2.0, "wait": True},
+    ]
+
+
+def test_results_summary():
+    results = loadtest.Results()
+    results.stage = 4
+    for latency, status in [(0.1, 200), (0.2, 200), (0.3, 204), (1.0, 0)]:
+        results.add(latency, status, 2048)
+    results.stage = 8
+    results.add(0.5, 200, 0)
+    summary = results.summary(4, 2.0)
+    assert summary["requests"] == 4
+    assert (summary["served"], summary["superseded"], summary["errors"]) == (2, 1, 1)
+    assert summary["error_rate"] == 0.25
+    assert summary["rps"] == 1.5
+    assert summary["p50_ms"] == 150.0
+    assert summary["kib"] == 2.0
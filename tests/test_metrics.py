@@ -0,0 +1,61 @@
+# the callback timings exposed at /metrics
+
+import os
+
+import config
+import metrics
+
+
+def test_histogram_counts_cumulative_buckets():
+    hist = metrics.Histogram("test_seconds", "Test.", [0.1, 1])
+    for value in [0.05, 0.5, 5]:
+        hist.observe(value, stage="chart")
+    hist.observe(0.5, stage="template")
+    lines = hist.render()
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+    assert 'test_seconds_bucket{stage="chart",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="chart",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="chart",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{stage="chart"} 5.55' in lines
+    assert 'test_seconds_count{stage="template"} 1' in lines
+
+
+def test_time_records_even_on_error():
+    hist = metrics.Histogram("test_seconds", "Test.", [1])
+    try:
+        with hist.time(stage="chart"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert 'test_seconds_count{stage="chart"} 1' in hist.render()
+
+
+def test_render_appends_gauges():
+    text = metrics.render(metrics.gauge("test_hits", "Hits.", 3))
+    assert text.endswith("# TYPE test_hits gauge\ntest_hits 3\n")
+    assert "# TYPE obesity_stage_seconds histogram" in text
+
+
+def test_counters_are_totals():
+    lines = metrics.counter("test_hits", "Hits.", 3)
+    assert lines == [
+        "# HELP test_hits_total Hits.",
+        "# TYPE test_hits_total counter",
+        "test_hits_total 3",
+    ]
+
+
+def test_profiled_writes_a_sample(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "profile_dir", str(tmp_path))
+
+    @metrics.profiled("render")
+    def render():
+        return sum(range(1000))
+
+    monkeypatch.setattr(config, "profile_rate", 0)
+    assert render() == 499500
+    assert os.listdir(tmp_path) == []
+    monkeypatch.setattr(config, "profile_rate", 1)
+    render()
+    (name,) = os.listdir(tmp_path)
+    assert name.startswith("render-") and name.endswith(".prof")
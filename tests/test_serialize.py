@@ -0,0 +1,83 @@
+# the column-wise JSON encoding of the chart data
+
+import json
+import threading
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import serialize
+
+# the charts are converted with the transformer the dashboard enables
+alt.data_transformers.enable("rendering")
+
+frame = pd.DataFrame(
+    {
+        "country": pd.Categorical(["Canada", None, "Chile"]),
+        "year": [1975, 1976, 1977],
+        "obese": [0.123456789, np.nan, 0.5],
+        "flag": [True, False, True],
+        "name": ["a", None, 'quote"d'],
+    }
+)
+
+
+def test_to_json_matches_records():
+    expected = [
+        {"country": "Canada", "year": 1975, "obese": 0.1235, "flag": True, "name": "a"},
+        {"country": None, "year": 1976, "obese": None, "flag": False, "name": None},
+        {
+            "country": "Chile",
+            "year": 1977,
+            "obese": 0.5,
+            "flag": True,
+            "name": 'quote"d',
+        },
+    ]
+    assert json.loads(serialize.to_json(frame)) == expected
+    assert serialize.to_json(frame.iloc[:0]) == "[]"
+
+
+def test_splice_replaces_placeholders():
+    spec = {"datasets": {"a": serialize.wrap("[1,2]"), "b": serialize.wrap("[]")}}
+    text = json.dumps(spec)
+    assert json.loads(serialize.splice(text)) == {"datasets": {"a": [1, 2], "b": []}}
+    assert serialize.unwrap(serialize.wrap("[3]")) == "[3]"
+    # documents without placeholders are left as they are
+    assert serialize.splice('{"a": "b"}') == '{"a": "b"}'
+
+
+def chart_values(chart):
+    (values,) = chart.to_dict()["datasets"].values()
+    return values
+
+
+def test_rendering_only_encodes_within_the_context():
+    chart = alt.Chart(frame[["year", "obese"]]).mark_point()
+    # outside the context the data is inlined as altair does
+    assert chart_values(chart)[0] == {"year": 1975, "obese": 0.123456789}
+    with serialize.rendering():
+        encoded = chart_values(chart)
+    assert encoded == serialize.wrap(serialize.to_json(frame[["year", "obese"]]))
+    assert isinstance(chart_values(chart), list)
+
+
+def test_rendering_is_local_to_its_thread():
+    chart = alt.Chart(frame[["year"]]).mark_point()
+    inside, outside = threading.Event(), threading.Event()
+    seen = []
+
+    def other():
+        inside.wait()
+        seen.append(chart_values(chart))
+        outside.set()
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    with serialize.rendering():
+        inside.set()
+        outside.wait()
+        assert isinstance(chart_values(chart), str)
+    thread.join()
+    assert seen == [[{"year": 1975}, {"year": 1976}, {"year": 1977}]]
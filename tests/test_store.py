@@ -0,0 +1,97 @@
+# the memory-mapped columnar store of the processed data
+
+import mmap
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import store
+
+
+def mapped(values):
+    """Return True if an Array is a View of a Memory-Mapped File"""
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = getattr(values, "base", None)
+    return False
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "combo.csv"
+    pd.read_csv(store.csv_file, nrows=600).to_csv(path, index=False)
+    return str(path)
+
+
+def test_build_and_load(csv, tmp_path):
+    out = str(tmp_path / "combo")
+    store.build(csv, out)
+    df = store.load(out)
+    expected = store.drop_aggregates(pd.read_csv(csv, float_precision="round_trip"))
+    assert list(df.columns) == list(expected.columns)
+    for col in df.columns:
+        assert df[col].astype(str).tolist() == expected[col].astype(str).tolist()
+    assert isinstance(df["country"].dtype, pd.CategoricalDtype)
+    assert store.matches(expected, out)
+
+
+def test_columns_stay_mapped(csv, tmp_path):
+    out = str(tmp_path / "combo")
+    store.build(csv, out)
+    df = store.load(out)
+    for col in df.columns:
+        values = df[col].array
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            values = values._codes
+        assert mapped(np.asarray(values)), col
+
+
+def test_rebuild_swaps_versions(csv, tmp_path):
+    out = str(tmp_path / "combo")
+    store.build(csv, out)
+    before = store.load(out)
+    first = os.path.realpath(out)
+    for _ in range(3):
+        store.build(csv, out)
+    assert os.path.islink(out)
+    assert os.path.realpath(out) != first
+    # the current and previous versions are kept
+    versions = [name for name in os.listdir(tmp_path) if name.startswith("combo.v")]
+    assert len(versions) == 2
+    # frames loaded earlier keep reading their mapped files
+    assert before["year"].sum() == store.load(out)["year"].sum()
+
+
+def test_replaces_a_store_built_without_versions(csv, tmp_path):
+    out = str(tmp_path / "combo")
+    os.makedirs(out)
+    open(os.path.join(out, "meta.json"), "w").close()
+    store.build(csv, out)
+    assert os.path.islink(out)
+    assert len(store.load(out)) > 0
+
+
+def test_loads_never_miss_the_store(csv, tmp_path):
+    out = str(tmp_path / "combo")
+    store.build(csv, out)
+    errors = []
+    done = threading.Event()
+
+    def load():
+        while not done.is_set():
+            try:
+                store.load(out)
+            except Exception as error:
+                errors.append(error)
+
+    thread = threading.Thread(target=load)
+    thread.start()
+    for _ in range(20):
+        store.build(csv, out)
+    done.set()
+    thread.join()
+    assert errors == []
@@ -0,0 +1,86 @@
+# the chart spec templates filled in per request
+
+import json
+
+import altair as alt
+import pandas as pd
+import pytest
+
+import templates
+
+
+def bar(data, title, values):
+    return (
+        alt.Chart(data, title=title)
+        .mark_bar()
+        .encode(
+            x="obese:Q",
+            y="country:N",
+            color=alt.Color("country:N", legend=alt.Legend(values=values)),
+        )
+    )
+
+
+def named(spec, name):
+    """Renames the Single Inline Dataset of a Spec"""
+    spec = json.loads(json.dumps(spec))
+    ((old, values),) = spec.pop("datasets").items()
+    templates.rename_data(spec, old, name)
+    spec["datasets"] = {name: values}
+    return spec
+
+
+def test_render_matches_the_chart():
+    default = pd.DataFrame({"country": ["Canada"], "obese": [0.3]})
+    chart = bar(default, templates.slot("title"), [templates.slot("highlight")])
+    template = templates.SpecTemplate(chart, {"bar": chart})
+    assert sorted(name for _, name in template.slots) == ["highlight", "title"]
+
+    df = pd.DataFrame({"country": ["Chile", "Peru"], "obese": [0.25, 0.2]})
+    records = df.to_dict("records")
+    spec = template.render({"bar": records}, title="2016", highlight=["Chile", "Peru"])
+    with alt.data_transformers.enable("default"):
+        expected = bar(df, "2016", ["Chile", "Peru"]).to_dict()
+    assert spec == named(expected, "bar")
+
+
+def test_render_takes_only_the_validated_kind_of_value():
+    default = pd.DataFrame({"country": ["Canada"], "obese": [0.3]})
+    chart = bar(default, templates.slot("title"), [templates.slot("highlight")])
+    template = templates.SpecTemplate(chart, {"bar": chart})
+    records = default.to_dict("records")
+    with pytest.raises(TypeError):
+        template.render({"bar": records}, title={"expr": "'' + year"}, highlight=[])
+    with pytest.raises(TypeError):
+        template.render({"bar": records}, title=["2016"], highlight=[])
+    with pytest.raises(TypeError):
+        template.render({"bar": records}, title="2016", highlight="Chile")
+    with pytest.raises(TypeError):
+        template.render({"bar": records}, title="2016", highlight=[{"a": 1}])
+
+
+def test_find_slots():
+    spec = {"a": [templates.slot("x")], "b": {"c": templates.slot("y")}, "d": [1]}
+    assert list(templates.find_slots(spec)) == [(("a",), "x"), (("b", "c"), "y")]
+
+
+def test_spec_html_pages():
+    spec = {"mark": "point", "params": [{"name": "input_year", "value": 2016}]}
+    assert "vegaEmbed" in templates.spec_html(spec)
+    listen = templates.spec_html(spec, listen=True)
+    assert 'addEventListener("message"' in listen
+    assert "event.origin !== window.origin" in listen
+    assert 'id="play"' in templates.spec_html(spec, play=True)
+    shell = templates.shell_html()
+    assert 'addEventListener("message"' in shell
+    assert "event.origin !== window.origin" in shell
+
+
+def test_pages_load_the_scripts_from_the_vega_url(monkeypatch):
+    monkeypatch.setattr(templates.config, "vega_url", "/vega")
+    spec = {"mark": "point"}
+    script = '"/vega/vega-lite@{}"'.format(alt.VEGALITE_VERSION)
+    for html in [templates.spec_html(spec), templates.spec_html(spec, listen=True)]:
+        assert script in html
+        assert "cdn.jsdelivr.net" not in html
+    assert script in templates.shell_html()